@@ -0,0 +1,53 @@
+"""
+Agent link - receives DJ Agent decisions from the WS server.
+Connects as a 'cv' client (the server routes agent messages there) and
+hands each decision payload to a callback, reconnecting with backoff.
+"""
+
+import asyncio
+import json
+import threading
+from typing import Callable
+import websockets
+
+DecisionHandler = Callable[[dict], None]
+
+
+async def listen(on_decision: DecisionHandler, url: str, name: str):
+    """
+    Call `on_decision(data)` for every agent_decision message, forever.
+
+    Args:
+        on_decision: Receives the decision payload ({actions, audioState})
+        url: WS server URL
+        name: Log prefix
+    """
+    attempt = 0
+    while True:
+        try:
+            async with websockets.connect(f"{url}?type=cv") as ws:
+                print(f"[{name}] Connected to {url}")
+                attempt = 0
+                async for raw in ws:
+                    try:
+                        msg = json.loads(raw)
+                    except (TypeError, ValueError):
+                        continue
+                    if msg.get('source') == 'agent' and msg.get('type') == 'agent_decision':
+                        on_decision(msg.get('data') or {})
+        except (OSError, websockets.WebSocketException) as e:
+            delay = min(30.0, 0.5 * 2 ** attempt)
+            attempt += 1
+            print(f"[{name}] WS error ({e}); reconnecting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+def start_listener(on_decision: DecisionHandler, url: str, name: str) -> threading.Thread:
+    """Run listen() on a daemon thread with its own event loop."""
+    thread = threading.Thread(
+        target=lambda: asyncio.run(listen(on_decision, url, name)),
+        name=f"{name} agent link",
+        daemon=True,
+    )
+    thread.start()
+    return thread
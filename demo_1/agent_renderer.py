@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Agent Renderer - turns DJ Agent decisions into sound.
+
+Subscribes to agent decisions on the WS server and applies them to a live
+block-based signal chain:
+    procedural groove (bpm/energy/genre) -> lowpass -> highpass
+    -> reverb + tempo-synced delay sends -> bar-quantized buildup/drop
+
+Usage:
+    python agent_renderer.py                 # live: listen to the agent and play
+    python agent_renderer.py --bench 120     # offline render benchmark
+    python agent_renderer.py --bench 60 --wav out.wav
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import time
+import wave
+import numpy as np
+import agent_link
+import config
+from audio_output import BlockOutput
+from dsp import Biquad, CombReverb, DropScheduler, FeedbackDelay, ParamSmoother
+
+# Root note (Hz) and bass pattern (beat offsets that get a bass hit) per genre
+GENRE_VOICING = {
+    'house': (55.0, (0.5, 1.5, 2.5, 3.5)),
+    'techno': (49.0, (0.25, 0.75, 1.25, 1.75, 2.25, 2.75, 3.25, 3.75)),
+    'dnb': (58.27, (0.0, 1.5, 2.5)),
+    'lofi': (65.41, (0.0, 2.0, 2.75)),
+    'ambient': (43.65, (0.0,)),
+}
+
+
+class GrooveSynth:
+    """Procedural kick/hat/bass groove rendered from the beat clock."""
+
+    def __init__(self, sample_rate: int, block_size: int):
+        self.sample_rate = sample_rate
+        self._ramp = np.arange(block_size, dtype=np.float64)
+        self._rng = np.random.default_rng(7)
+        self._noise = self._rng.uniform(-1, 1, sample_rate).astype(np.float32)
+        self._noise_pos = 0
+        self._bass_phase = 0.0
+
+    def _noise_block(self, frames: int) -> np.ndarray:
+        if self._noise_pos + frames > len(self._noise):
+            self._noise_pos = 0
+        out = self._noise[self._noise_pos:self._noise_pos + frames]
+        self._noise_pos += frames
+        return out
+
+    def render(self, out: np.ndarray, beat: float, bpm: float, energy: float,
+               genre: str, kick_gain: float = 1.0, riser: float = 0.0) -> float:
+        """
+        Fill `out` (frames, 2) with the groove starting at beat position `beat`.
+
+        Returns:
+            Beat position after the block
+        """
+        frames = len(out)
+        beats_per_sample = bpm / 60.0 / self.sample_rate
+        beats = beat + self._ramp[:frames] * beats_per_sample
+        seconds_per_beat = 60.0 / bpm
+
+        # Kick: pitch-swept sine on every beat
+        t = (beats % 1.0) * seconds_per_beat
+        kick = np.sin(2 * np.pi * (45 * t + 4.0 * (1 - np.exp(-t * 35)))) * np.exp(-t * 9)
+
+        # Hats: offbeat noise bursts, busier with energy
+        hat_div = 4 if energy > 0.6 else 2
+        ht = ((beats * hat_div) % 1.0) * seconds_per_beat / hat_div
+        noise = self._noise_block(frames)
+        hat = noise * np.exp(-ht * 60) * (0.15 + 0.25 * energy)
+
+        # Bass: saw on the genre pattern
+        root, pattern = GENRE_VOICING.get(genre, GENRE_VOICING['house'])
+        phase = self._bass_phase + self._ramp[:frames] * (root / self.sample_rate)
+        self._bass_phase = float(phase[-1] + root / self.sample_rate) % 1.0
+        saw = 2 * (phase % 1.0) - 1
+        bar_pos = beats % 4.0
+        bass_env = np.zeros(frames)
+        for hit in pattern:
+            since = (bar_pos - hit) % 4.0
+            bass_env = np.maximum(bass_env, np.where(since < 0.45, np.exp(-since * 4), 0))
+        bass = saw * bass_env * (0.2 + 0.25 * energy)
+
+        mono = kick * (0.8 * kick_gain) + bass + riser * noise * 0.3
+        out[:, 0] = mono + hat
+        out[:, 1] = mono + np.roll(hat, 7)
+        return beat + frames * beats_per_sample
+
+
+class RenderStats:
+    """Per-block render timing against the real-time deadline."""
+
+    def __init__(self, block_size: int, sample_rate: int):
+        self.deadline_s = block_size / sample_rate
+        self.blocks = 0
+        self.deadline_misses = 0
+        self.max_render_s = 0.0
+        self.total_render_s = 0.0
+
+    def record(self, render_s: float):
+        self.blocks += 1
+        self.total_render_s += render_s
+        self.max_render_s = max(self.max_render_s, render_s)
+        if render_s > self.deadline_s:
+            self.deadline_misses += 1
+
+    def summary(self) -> dict:
+        avg = self.total_render_s / self.blocks if self.blocks else 0.0
+        return {
+            'blocks': self.blocks,
+            'deadline_ms': round(self.deadline_s * 1000, 3),
+            'avg_render_ms': round(avg * 1000, 3),
+            'max_render_ms': round(self.max_render_s * 1000, 3),
+            'dsp_load': round(avg / self.deadline_s, 3),
+            'deadline_misses': self.deadline_misses,
+        }
+
+
+class AgentRenderer:
+    """Applies agent actions to the signal chain and renders audio blocks."""
+
+    def __init__(self, sample_rate: int = config.SAMPLE_RATE,
+                 block_size: int = config.AUDIO_BUFFER):
+        """
+        Args:
+            sample_rate: Output sample rate
+            block_size: Frames per rendered block
+        """
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+
+        # Musical state (mirrors the agent's audioState)
+        self.bpm = 128.0
+        self.energy = 0.5
+        self.genre = 'house'
+        self.beat = 0.0
+
+        self.synth = GrooveSynth(sample_rate, block_size)
+        self.lowpass = Biquad('lowpass', 18000, sample_rate)
+        self.highpass = Biquad('highpass', 20, sample_rate)
+        self.reverb = CombReverb(sample_rate, block_size)
+        self.delay = FeedbackDelay(2 * sample_rate, self._delay_samples(), 0.35, block_size)
+        self.reverb_send = ParamSmoother(0.0, 0.2, sample_rate)
+        self.delay_send = ParamSmoother(0.0, 0.2, sample_rate)
+        self.level = ParamSmoother(0.5, 0.5, sample_rate)
+        self.drops = DropScheduler()
+        self._filter_target = ('lowpass', 18000.0)
+
+        self.stats = RenderStats(block_size, sample_rate)
+
+    def _delay_samples(self) -> int:
+        """Dotted-eighth delay at the current tempo."""
+        return int(0.75 * 60.0 / self.bpm * self.sample_rate)
+
+    def apply_message(self, data: dict):
+        """Apply an `agent_decision` payload: {actions, audioState}."""
+        for action in data.get('actions', []):
+            self.apply_action(action)
+        # audioState is the agent's post-action truth for bpm/energy/genre
+        state = data.get('audioState') or {}
+        if 'bpm' in state:
+            self.bpm = float(min(180, max(80, state['bpm'])))
+        if 'energy' in state:
+            self.energy = float(min(1, max(0, state['energy'])))
+        if state.get('genre'):
+            self.genre = state['genre']
+
+    def apply_action(self, action: dict):
+        """Apply one agent action to the signal chain."""
+        action_type = action.get('type')
+        value = action.get('value')
+
+        if action_type == 'adjust_bpm':
+            self.bpm = float(min(180, max(80, self.bpm + value)))
+        elif action_type == 'adjust_energy':
+            self.energy = float(min(1, max(0, self.energy + value)))
+        elif action_type == 'switch_genre':
+            self.genre = value
+        elif action_type == 'set_filter' and isinstance(value, dict):
+            kind = value.get('type', 'lowpass')
+            freq = float(min(18000, max(100, value.get('frequency', 18000))))
+            self._filter_target = (kind, freq)
+            # The other filter opens up so only one shapes the sound
+            if kind == 'highpass':
+                self.highpass.set_frequency(freq)
+                self.lowpass.set_frequency(18000)
+            else:
+                self.lowpass.set_frequency(freq)
+                self.highpass.set_frequency(20)
+        elif action_type == 'change_fx' and isinstance(value, dict):
+            amount = float(min(1, max(0, value.get('amount', 0))))
+            if value.get('type') == 'delay':
+                self.delay_send.target = amount
+            else:
+                self.reverb_send.target = amount
+        elif action_type == 'trigger_drop':
+            bars = value.get('buildup_bars', 8) if isinstance(value, dict) else 8
+            self.drops.schedule(self.beat, int(bars))
+
+    def render(self, out: np.ndarray):
+        """Render one block into `out` (frames, 2) float32."""
+        start = time.perf_counter()
+        frames = len(out)
+
+        phase, amount = self.drops.state(self.beat)
+        kick_gain, riser = 1.0, 0.0
+        if phase == 'buildup':
+            # Sweep the highpass up, fade in a noise riser, thin the kick out
+            self.highpass.set_frequency(20 + 1500 * amount ** 2)
+            riser = amount ** 2
+            kick_gain = 1.0 - 0.8 * amount
+        elif phase == 'drop':
+            kick_gain = 1.3
+            kind, freq = self._filter_target
+            self.highpass.set_frequency(freq if kind == 'highpass' else 20)
+
+        self.beat = self.synth.render(out, self.beat, self.bpm, self.energy,
+                                      self.genre, kick_gain, riser)
+
+        self.lowpass.process(out)
+        self.highpass.process(out)
+
+        self.delay.set_delay(self._delay_samples())
+        reverb_amount = self.reverb_send.step(frames)
+        delay_amount = self.delay_send.step(frames)
+        if reverb_amount > 1e-3:
+            out += self.reverb.process(out) * reverb_amount
+        if delay_amount > 1e-3:
+            out += self.delay.process(out) * delay_amount
+
+        self.level.target = 0.35 + 0.4 * self.energy
+        out *= self.level.step(frames)
+        np.clip(out, -1.0, 1.0, out=out)
+
+        self.stats.record(time.perf_counter() - start)
+
+
+async def listen(renderer: AgentRenderer, url: str):
+    """Apply agent decisions from the WS server, reconnecting with backoff."""
+    def on_decision(data: dict):
+        renderer.apply_message(data)
+        print(f"[Renderer] {len(data.get('actions', []))} action(s) | "
+              f"bpm={renderer.bpm:.0f} energy={renderer.energy:.2f} "
+              f"genre={renderer.genre} | {renderer.stats.summary()}")
+
+    await agent_link.listen(on_decision, url, 'Renderer')
+
+
+def benchmark(seconds: float, wav_path: str = None) -> dict:
+    """Render `seconds` of audio offline with a scripted action sequence."""
+    renderer = AgentRenderer()
+    block = np.zeros((renderer.block_size, 2), dtype=np.float32)
+    blocks = int(math.ceil(seconds * renderer.sample_rate / renderer.block_size))
+    script = [
+        (0.0, {'type': 'change_fx', 'value': {'type': 'reverb', 'amount': 0.4}}),
+        (2.0, {'type': 'set_filter', 'value': {'type': 'lowpass', 'frequency': 800}}),
+        (6.0, {'type': 'set_filter', 'value': {'type': 'lowpass', 'frequency': 18000}}),
+        (8.0, {'type': 'trigger_drop', 'value': {'buildup_bars': 4}}),
+        (12.0, {'type': 'change_fx', 'value': {'type': 'delay', 'amount': 0.5}}),
+        (16.0, {'type': 'adjust_bpm', 'value': 8}),
+        (20.0, {'type': 'switch_genre', 'value': 'techno'}),
+        (24.0, {'type': 'set_filter', 'value': {'type': 'highpass', 'frequency': 600}}),
+    ]
+    script_len = 30.0
+
+    block_s = renderer.block_size / renderer.sample_rate
+    pcm = [] if wav_path else None
+    start = time.perf_counter()
+    for i in range(blocks):
+        # Replay the script every script_len seconds
+        t0 = (i * block_s) % script_len
+        t1 = t0 + block_s
+        for at, action in script:
+            if t0 <= at < t1 or t0 <= at + script_len < t1:
+                renderer.apply_action(action)
+        renderer.render(block)
+        if pcm is not None:
+            pcm.append((block * 32767).astype(np.int16))
+    elapsed = time.perf_counter() - start
+
+    if pcm is not None:
+        with wave.open(wav_path, 'wb') as f:
+            f.setnchannels(2)
+            f.setsampwidth(2)
+            f.setframerate(renderer.sample_rate)
+            f.writeframes(np.concatenate(pcm).tobytes())
+
+    rendered = blocks * renderer.block_size / renderer.sample_rate
+    return {
+        'rendered_s': round(rendered, 2),
+        'elapsed_s': round(elapsed, 3),
+        'realtime_x': round(rendered / elapsed, 1),
+        **renderer.stats.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render DJ Agent decisions to audio")
+    parser.add_argument('--url', default=config.AGENT_WS_URL, help="WS server URL")
+    parser.add_argument('--bench', type=float, metavar='SECONDS',
+                        help="render offline and report speed instead of playing")
+    parser.add_argument('--wav', help="with --bench, also write the render to a WAV file")
+    args = parser.parse_args()
+
+    if args.bench:
+        print(json.dumps(benchmark(args.bench, args.wav), indent=2))
+        return
+
+    renderer = AgentRenderer()
+    output = BlockOutput(renderer.render, renderer.sample_rate, renderer.block_size)
+    output.start()
+    print(f"[Renderer] Playing via {output.backend} "
+          f"({renderer.block_size} frames @ {renderer.sample_rate} Hz)")
+    try:
+        asyncio.run(listen(renderer, args.url))
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        output.stop()
+        print(f"[Renderer] {renderer.stats.summary()} | underruns={output.underruns}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""
+Real-time spectrum/level feed for visuals.
+
+The audio callback copies each output block into a mono ring buffer (a
+preallocated side tap: no locks, no allocation). A separate thread reads
+the newest window at ANALYSIS_RATE_HZ, computes log-spaced FFT band
+energies, RMS/peak and an onset flag, and publishes compact binary frames
+to the WS server as a 'cv' client. Its CPU time is measured per frame and
+held under ANALYSIS_CPU_BUDGET by shrinking the FFT, then the frame rate.
+
+Frame layout (little-endian, 17 + bands bytes):
+    magic b'AF' | version u8 | flags u8 (bit0 onset, bit1 degraded)
+    | seq u32 | t_ms u32 | rms u16 | peak u16 | band count u8 | bands u8[]
+rms/peak are linear full scale * 65535; bands are dBFS mapped from
+[ANALYSIS_FLOOR_DB, 0] to [0, 255].
+"""
+
+import asyncio
+import collections
+import struct
+import threading
+import time
+from typing import Optional
+import numpy as np
+import websockets
+import config
+
+FRAME_MAGIC = b'AF'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<2sBBIIHHB')
+FLAG_ONSET = 0x01
+FLAG_DEGRADED = 0x02
+
+# FFT sizes to fall back through when over budget (largest first)
+FFT_SIZES = (2048, 1024, 512)
+
+
+def encode_frame(seq: int, t_ms: int, rms: float, peak: float, bands: np.ndarray,
+                 onset: bool, degraded: bool = False) -> bytes:
+    """Pack one analysis frame (bands are 0-1)."""
+    flags = (FLAG_ONSET if onset else 0) | (FLAG_DEGRADED if degraded else 0)
+    header = FRAME_HEADER.pack(
+        FRAME_MAGIC, FRAME_VERSION, flags, seq & 0xFFFFFFFF, t_ms & 0xFFFFFFFF,
+        int(min(1.0, rms) * 65535), int(min(1.0, peak) * 65535), len(bands),
+    )
+    return header + (np.clip(bands, 0.0, 1.0) * 255).astype(np.uint8).tobytes()
+
+
+def decode_frame(data: bytes) -> dict:
+    """Unpack a frame produced by encode_frame (for tests and Python consumers)."""
+    magic, version, flags, seq, t_ms, rms, peak, count = FRAME_HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError("not an analysis frame")
+    bands = np.frombuffer(data, dtype=np.uint8, count=count, offset=FRAME_HEADER.size)
+    return {
+        'seq': seq, 't_ms': t_ms,
+        'rms': rms / 65535, 'peak': peak / 65535,
+        'bands': (bands / 255.0).tolist(),
+        'onset': bool(flags & FLAG_ONSET), 'degraded': bool(flags & FLAG_DEGRADED),
+    }
+
+
+class TapRing:
+    """
+    Single-producer/single-consumer mono ring buffer.
+
+    write() runs in the audio callback; `written` (total frames) is updated
+    after the data, so the reader never sees a position ahead of its samples.
+    """
+
+    def __init__(self, size: int):
+        self.buf = np.zeros(size, dtype=np.float32)
+        self.written = 0
+
+    def write(self, block: np.ndarray):
+        """Append the mono mix of a (frames, 2) block (audio thread)."""
+        n = len(block)
+        size = len(self.buf)
+        start = self.written % size
+        first = min(n, size - start)
+        np.add(block[:first, 0], block[:first, 1], out=self.buf[start:start + first])
+        if first < n:
+            np.add(block[first:, 0], block[first:, 1], out=self.buf[:n - first])
+        self.written += n
+
+    def read_latest(self, out: np.ndarray) -> bool:
+        """
+        Copy the newest len(out) frames into `out` (reader thread).
+
+        Returns:
+            False if not enough audio yet, or the writer lapped the copy
+        """
+        n = len(out)
+        size = len(self.buf)
+        end = self.written
+        if end < n:
+            return False
+        start = (end - n) % size
+        first = min(n, size - start)
+        out[:first] = self.buf[start:start + first]
+        if first < n:
+            out[first:] = self.buf[:n - first]
+        # Torn read: the writer overwrote part of the window while we copied
+        return self.written - end <= size - n
+
+
+class AnalysisTap:
+    """Budgeted band/level/onset analysis of the mix, published over WS."""
+
+    def __init__(self, url: Optional[str] = config.AGENT_WS_URL,
+                 rate_hz: float = config.ANALYSIS_RATE_HZ,
+                 cpu_budget: float = config.ANALYSIS_CPU_BUDGET,
+                 bands: int = config.ANALYSIS_BANDS,
+                 sample_rate: int = config.SAMPLE_RATE):
+        """
+        Args:
+            url: WS server to publish to (None = analyze only)
+            rate_hz: Target frame rate
+            cpu_budget: Max fraction of one core the analysis may use
+            bands: Number of log-spaced bands (40 Hz - 16 kHz)
+            sample_rate: Audio sample rate
+        """
+        self.url = url
+        self.rate_hz = rate_hz
+        self.cpu_budget = cpu_budget
+        self.band_count = bands
+        self.sample_rate = sample_rate
+        self.ring = TapRing(max(FFT_SIZES) * 8)
+
+        self._level = 0  # Index into FFT_SIZES
+        self._decimate = 1  # Analyze every Nth tick once the FFT is at its smallest
+        self._setup_fft()
+        self._prev_bands = np.zeros(bands)
+        self._flux_history = collections.deque(maxlen=int(rate_hz))
+        self._last_onset = -1.0
+        self._cost_ewma = 0.0
+
+        self.latest: Optional[dict] = None  # Last frame's values, for local consumers
+        self.frames = 0
+        self.skipped = 0  # Ticks dropped by decimation
+        self.send_drops = 0  # Frames not sent because the socket was backed up
+        self.over_budget = 0
+        self._thread = None
+        self._running = False
+        self._connected = False
+
+    def _setup_fft(self):
+        """(Re)build window and band bin ranges for the current FFT size."""
+        size = FFT_SIZES[self._level]
+        self._fft_size = size
+        self._window = np.hanning(size).astype(np.float32)
+        self._frame = np.empty(size, dtype=np.float32)
+        freqs = np.fft.rfftfreq(size, 1.0 / self.sample_rate)
+        edges = np.geomspace(40.0, 16000.0, self.band_count + 1)
+        bins = np.searchsorted(freqs, edges)
+        # Every band gets at least one bin, even at small FFT sizes
+        self._band_bins = [(int(lo), int(max(hi, lo + 1))) for lo, hi in zip(bins[:-1], bins[1:])]
+        self._norm = float(self._window.sum() / 2) ** 2
+
+    @property
+    def budget_s(self) -> float:
+        """CPU seconds allowed per analyzed frame."""
+        return self.cpu_budget / self.rate_hz * self._decimate
+
+    def analyze(self) -> Optional[dict]:
+        """Analyze the newest window (analysis thread); None if no audio yet."""
+        cpu_start = time.thread_time()
+        if not self.ring.read_latest(self._frame):
+            return None
+
+        # The ring holds L+R sums; halve for a mono mix in full scale
+        frame = self._frame
+        frame *= 0.5
+        peak = float(np.abs(frame).max())
+        rms = float(np.sqrt(np.dot(frame, frame) / len(frame)))
+
+        frame *= self._window
+        power = np.abs(np.fft.rfft(frame)) ** 2 / self._norm
+        bands = np.array([power[lo:hi].mean() for lo, hi in self._band_bins])
+        bands_db = 10 * np.log10(bands + 1e-12)
+        levels = np.clip(1.0 - bands_db / config.ANALYSIS_FLOOR_DB, 0.0, 1.0)
+
+        # Onset: positive spectral flux over an adaptive threshold, with a
+        # refractory period so one transient fires once
+        flux = float(np.maximum(levels - self._prev_bands, 0.0).sum())
+        self._prev_bands = levels
+        history = self._flux_history
+        now = self.ring.written / self.sample_rate  # Audio clock, not wall clock
+        onset = False
+        if len(history) >= 8:
+            # Median/MAD so earlier onsets in the window don't mask the next one
+            values = np.fromiter(history, dtype=np.float64)
+            median = np.median(values)
+            threshold = median + 3.0 * np.median(np.abs(values - median)) + 0.05
+            onset = flux > threshold and now - self._last_onset > config.ANALYSIS_ONSET_REFRACTORY_S
+            if onset:
+                self._last_onset = now
+        history.append(flux)
+
+        self.frames += 1
+        self._enforce_budget(time.thread_time() - cpu_start)
+        self.latest = {'rms': rms, 'peak': peak, 'bands': levels, 'onset': onset}
+        return self.latest
+
+    def _enforce_budget(self, cost_s: float):
+        """Track CPU cost per frame and step quality down/up to stay in budget."""
+        if self.frames == 1:
+            return  # First frame after a (re)start pays for FFT setup; not representative
+        budget = self.budget_s
+        # Clamp single-frame hiccups (GC, page faults) so only sustained load trips it
+        cost_s = min(cost_s, 2 * budget)
+        self._cost_ewma = cost_s if self.frames == 2 else 0.9 * self._cost_ewma + 0.1 * cost_s
+        if self.frames < 10:
+            return  # Let the average settle before judging it
+        if self._cost_ewma > budget:
+            self.over_budget += 1
+            if self._level < len(FFT_SIZES) - 1:
+                self._level += 1
+                self._setup_fft()
+            else:
+                self._decimate = min(self._decimate * 2, 8)
+            self._cost_ewma = 0.0
+            self.frames = 0
+        elif self._cost_ewma < budget * 0.3 and self.frames > self.rate_hz:
+            # Comfortably under for a second: win back rate first, then resolution
+            if self._decimate > 1:
+                self._decimate //= 2
+            elif self._level > 0:
+                self._level -= 1
+                self._setup_fft()
+            self.frames = 0
+
+    @property
+    def degraded(self) -> bool:
+        return self._level > 0 or self._decimate > 1
+
+    def stats(self) -> dict:
+        """Budget use and quality level, for the UI/perf overlay."""
+        return {
+            'fft_size': self._fft_size,
+            'rate_hz': round(self.rate_hz / self._decimate, 1),
+            'cost_ms': round(self._cost_ewma * 1000, 3),
+            'budget_ms': round(self.budget_s * 1000, 3),
+            'cpu_pct': round(self._cost_ewma * self.rate_hz / self._decimate * 100, 2),
+            'over_budget': self.over_budget,
+            'skipped': self.skipped,
+            'send_drops': self.send_drops,
+            'connected': self._connected,
+        }
+
+    @staticmethod
+    async def _discard_incoming(ws):
+        try:
+            async for _ in ws:
+                pass
+        except websockets.WebSocketException:
+            pass
+
+    async def _run(self):
+        """Fixed-rate analyze + publish loop with WS reconnects."""
+        period = 1.0 / self.rate_hz
+        started = time.perf_counter()
+        next_tick = started
+        seq = 0
+        ws = None
+        attempt = 0
+        retry_at = 0.0
+        while self._running:
+            now = time.perf_counter()
+            if self.url and ws is None and now >= retry_at:
+                try:
+                    ws = await websockets.connect(f"{self.url}?type=cv", max_queue=1)
+                    # The server fans agent messages out to 'cv' clients too; discard them
+                    asyncio.get_running_loop().create_task(self._discard_incoming(ws))
+                    self._connected = True
+                    attempt = 0
+                    print(f"[Analysis] Publishing to {self.url} at {self.rate_hz:.0f} Hz")
+                except (OSError, websockets.WebSocketException):
+                    attempt += 1
+                    retry_at = now + min(30.0, 0.5 * 2 ** attempt)
+
+            seq += 1
+            if seq % self._decimate:
+                self.skipped += 1
+            else:
+                result = self.analyze()
+                if result is not None and ws is not None:
+                    # Stale levels are useless: drop the frame if the socket is backed up
+                    if ws.transport.get_write_buffer_size() > 4 * 1024:
+                        self.send_drops += 1
+                    else:
+                        frame = encode_frame(seq, int((now - started) * 1000), result['rms'],
+                                             result['peak'], result['bands'], result['onset'],
+                                             self.degraded)
+                        try:
+                            await ws.send(frame)
+                        except websockets.WebSocketException:
+                            ws = None
+                            self._connected = False
+
+            next_tick += period
+            delay = next_tick - time.perf_counter()
+            if delay < -period:
+                next_tick = time.perf_counter()  # Fell behind; don't burst to catch up
+            await asyncio.sleep(max(0.0, delay))
+
+        if ws is not None:
+            await ws.close()
+
+    def start(self):
+        """Start the analysis/publish thread."""
+        self._running = True
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._run()),
+                                        name="analysis tap", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
@@ -1,50 +1,202 @@
 """
-Audio engine using pygame mixer.
-Handles track loading, playback, and volume control.
+Audio engine.
+Renders both decks block by block from the decoded PCM cache, with varispeed
+playback (tempo changes are audible), per-stem mixing for stem-folder tracks
+and beat-grid auto-sync.
 """
 
+import time
 import pygame
-import os
-from typing import Optional, Dict
+import numpy as np
+from typing import Optional, Dict, List, Set
 from pathlib import Path
 import config
+from analysis_tap import AnalysisTap
+from audio_output import BlockOutput, BufferTuner
+from control_bus import ControlBus, ControlSlot
+from pcm_cache import load_pcm, load_stems
+from peaks import PeakPyramid, open_peaks
+from sampler import Sampler
+from track_index import TrackIndex, TrackInfo, normalization_gain
+
+
+class StemPlayer:
+    """
+    A loaded track's PCM plus the scratch buffers to render it.
+
+    PCM is (frames, 2, stems) int16; a plain file is a single 'mix' stem.
+    Decks swap whole players when loading, so the audio callback never sees
+    a PCM array and buffers of different shapes.
+    """
+
+    def __init__(self, pcm: np.ndarray, stem_names: List[str], max_block: int,
+                 gain: float = 1.0):
+        """
+        Args:
+            pcm: (frames, 2, stems) int16
+            stem_names: Mixer name per stem
+            max_block: Largest block render() will be asked for
+            gain: Fixed linear gain (loudness normalization), folded into the
+                int16 -> float conversion so it costs nothing per block
+        """
+        self.pcm = pcm
+        self.stem_names = stem_names
+        self.frames = len(pcm)
+        self.gain = gain
+        self._scale = gain / 32768.0
+        stems = len(stem_names)
+
+        # Scratch buffers, so render() never allocates inside the audio callback
+        self._ramp = np.arange(max_block, dtype=np.float64)
+        self._pos = np.empty(max_block, dtype=np.float64)
+        self._floor = np.empty(max_block, dtype=np.float64)
+        self._frac = np.empty((max_block, 1, 1), dtype=np.float32)
+        self._idx = np.empty(max_block, dtype=np.intp)
+        self._a = np.empty((max_block, 2, stems), dtype=np.int16)
+        self._b = np.empty((max_block, 2, stems), dtype=np.int16)
+        self._fa = np.empty((max_block, 2, stems), dtype=np.float32)
+        self._fb = np.empty((max_block, 2, stems), dtype=np.float32)
+        self._mix = np.empty((max_block, 2), dtype=np.float32)
+        self._delta = np.empty((max_block, 2), dtype=np.float32)
+        self._fade = np.empty((max_block, 1), dtype=np.float32)
+        self._gain = np.empty(max_block, dtype=np.float32)
+        self._gain_column = self._gain[:, None]
+        self._g0 = np.empty(stems, dtype=np.float32)
+        self._g1 = np.empty(stems, dtype=np.float32)
+
+    def render(self, out: np.ndarray, position: float, rate: float,
+               stem_slots: List[ControlSlot], volume: ControlSlot) -> float:
+        """
+        Mix len(out) frames into `out` and return the new position.
+
+        One gather reads every stem (linear-interpolating varispeed), then a
+        single matmul applies the per-stem gains, ramped across the block.
+        """
+        n = len(out)
+        pos = self._pos[:n]
+        floor = self._floor[:n]
+        frac = self._frac[:n]
+        idx = self._idx[:n]
+        a, b = self._a[:n], self._b[:n]
+        fa, fb = self._fa[:n], self._fb[:n]
+        mix = self._mix[:n]
+
+        np.multiply(self._ramp[:n], rate, out=pos)
+        pos += position
+        np.floor(pos, out=floor)
+        np.subtract(pos, floor, out=frac[:, 0, 0], casting='same_kind')
+        np.copyto(idx, floor, casting='unsafe')
+        np.take(self.pcm, idx, axis=0, out=a, mode='wrap')
+        idx += 1
+        np.take(self.pcm, idx, axis=0, out=b, mode='wrap')
+
+        np.multiply(a, self._scale, out=fa, casting='same_kind')
+        np.multiply(b, self._scale, out=fb, casting='same_kind')
+        fb -= fa
+        fb *= frac
+        fb += fa
+
+        # Stem gains: start-of-block mix, plus a linear fade of the change
+        for i in range(len(self._g0)):
+            self._g0[i] = stem_slots[i].value
+            self._g1[i] = stem_slots[i].step(n)
+        np.matmul(fb, self._g0, out=mix)
+        self._g1 -= self._g0
+        if self._g1.any():
+            delta = self._delta[:n]
+            np.matmul(fb, self._g1, out=delta)
+            np.multiply(self._ramp[:n, None], 1.0 / n, out=self._fade[:n], casting='same_kind')
+            delta *= self._fade[:n]
+            mix += delta
+
+        volume.ramp(self._gain[:n])
+        mix *= self._gain_column[:n]
+        out += mix
+        return (position + rate * n) % self.frames
 
 
 class Deck:
     """Represents a single DJ deck with track playback."""
 
-    def __init__(self, deck_id: str, channel: pygame.mixer.Channel):
+    def __init__(self, deck_id: str, track_index: Optional[TrackIndex] = None,
+                 max_block: int = config.AUDIO_BUFFER):
         """
         Initialize a deck.
 
         Args:
             deck_id: Identifier ('left' or 'right')
-            channel: Pygame mixer channel for this deck
+            track_index: Analysis index for BPM/key/beat-grid lookups
+            max_block: Largest block render() will be asked for
         """
         self.deck_id = deck_id
-        self.channel = channel
+        self.track_index = track_index
+        self.max_block = max_block
+        self.track_info: Optional[TrackInfo] = None  # Analysis of the loaded track
+        self.peaks: List[Optional[PeakPyramid]] = []  # Waveform pyramid per stem (None = not built)
         self.tracks = config.DECK_TRACKS[deck_id]
         self.current_track_index = 0
-        self.current_sound: Optional[pygame.mixer.Sound] = None
+        self.player: Optional[StemPlayer] = None  # Loaded track audio
         self.current_track_file: str = ""  # Actual loaded filename
-        self.volume = config.DEFAULT_VOLUME
-        self.tempo = 1.0  # 1.0 = normal speed
+        # Volume/tempo/stem-gain targets from the control thread, ramped by render()
+        self.controls = ControlBus({
+            'volume': ControlSlot(config.DEFAULT_VOLUME, config.VOLUME_RAMP_S, max_block=max_block),
+            'tempo': ControlSlot(1.0, config.TEMPO_RAMP_S, max_block=max_block),  # 1.0 = normal speed
+            **{f'stem{i}': ControlSlot(1.0, config.STEM_RAMP_S, max_block=max_block)
+               for i in range(config.MAX_STEMS)},
+        })
+        self._stem_slots = [self.controls[f'stem{i}'] for i in range(config.MAX_STEMS)]
+        self.stem_levels: Dict[str, float] = {}  # Per-stem gain before mute/solo
+        self.muted_stems: Set[str] = set()
+        self.soloed_stems: Set[str] = set()
+        self.sync_tempo: Optional[float] = None  # Set by the audio thread while synced
         self.is_playing = False
+        self.is_paused = False
 
-    def _find_track_file(self, track_name: str) -> Optional[Path]:
+        # Playback state, advanced by render()
+        self.position = 0.0  # In source frames
+        self.rate = 1.0  # Source frames per output frame (tempo + sync correction)
+        self.phase_error: Optional[float] = None  # Beats behind the sync master
+
+    @property
+    def volume(self) -> float:
+        return self.controls['volume'].target
+
+    @property
+    def tempo(self) -> float:
+        """Effective tempo: the sync tempo while following, else the set target."""
+        sync_tempo = self.sync_tempo
+        return sync_tempo if sync_tempo is not None else self.controls['tempo'].target
+
+    @property
+    def stem_names(self) -> List[str]:
+        return self.player.stem_names if self.player else []
+
+    def _find_track(self, track_name: str) -> Optional[List[Path]]:
         """
-        Find track file with any supported extension.
+        Find a track's audio: a folder of stems or a single file.
 
         Args:
-            track_name: Base track name without extension
+            track_name: Folder name, or base file name without extension
 
         Returns:
-            Path to file if found, None otherwise
+            Stem files in mixer order (one entry for a plain file), or None
         """
+        folder = Path(config.MUSIC_DIR) / track_name
+        if folder.is_dir():
+            files = [p for p in folder.iterdir()
+                     if p.suffix.lower() in config.SUPPORTED_EXTENSIONS and p.is_file()]
+            # Known stem names first (drums, bass, ...), then the rest by name
+            rank = {name: i for i, name in enumerate(config.STEM_NAMES)}
+            files.sort(key=lambda p: (rank.get(p.stem.lower(), len(rank)), p.name))
+            if len(files) > config.MAX_STEMS:
+                print(f"{track_name}: using the first {config.MAX_STEMS} of {len(files)} stems")
+            if files:
+                return files[:config.MAX_STEMS]
+
         for ext in config.SUPPORTED_EXTENSIONS:
-            track_path = Path('music') / f"{track_name}{ext}"
+            track_path = Path(config.MUSIC_DIR) / f"{track_name}{ext}"
             if track_path.exists():
-                return track_path
+                return [track_path]
         return None
 
     def load_track(self, index: int) -> bool:
@@ -61,58 +213,160 @@ class Deck:
             return False
 
         track_name = self.tracks[index]
-        track_path = self._find_track_file(track_name)
+        paths = self._find_track(track_name)
 
-        if track_path is None:
-            print(f"Track not found: {track_name} (tried {config.SUPPORTED_EXTENSIONS})")
+        if paths is None:
+            print(f"Track not found: {track_name} (tried a stem folder and {config.SUPPORTED_EXTENSIONS})")
             return False
 
         try:
-            self.current_sound = pygame.mixer.Sound(str(track_path))
+            infos = [self.track_index.lookup(p) if self.track_index else None for p in paths]
+            digests = [info.hash if info else None for info in infos]
+            if paths[0].parent.name == track_name:
+                pcm = load_stems(paths, digests)
+                stem_names = [p.stem.lower() for p in paths]
+                display_name = f"{track_name} [{len(paths)} stems]"
+            else:
+                pcm = load_pcm(paths[0], digests[0])[:, :, None]
+                stem_names = ['mix']
+                display_name = paths[0].name
+            if len(pcm) == 0:
+                raise ValueError("no audio frames")
+
+            self.is_playing = False
+            self.is_paused = False
+            self.position = 0.0
+            # Loudness was measured at index time; playback only applies the gain
+            gain = normalization_gain(infos) if config.NORMALIZE_LOUDNESS else 1.0
+            self.player = StemPlayer(pcm, stem_names, self.max_block, gain)
+            # The grid comes from the first analyzed stem (drums when present)
+            self.track_info = next((info for info in infos if info), None)
+            self.peaks = [open_peaks(digest) for digest in digests]
             self.current_track_index = index
-            self.current_track_file = track_path.name
-            self.channel.set_volume(self.volume)
-            print(f"Loaded: {track_path.name} on deck {self.deck_id}")
+            self.current_track_file = display_name
+            self.stem_levels = {name: 1.0 for name in stem_names}
+            self.muted_stems.clear()
+            self.soloed_stems.clear()
+            self._publish_stem_gains()
+            if self.track_info:
+                print(f"Loaded: {display_name} on deck {self.deck_id} "
+                      f"({self.track_info.bpm:.1f} BPM, {self.track_info.key}, "
+                      f"gain {20 * np.log10(gain):+.1f} dB)")
+            else:
+                print(f"Loaded: {display_name} on deck {self.deck_id} "
+                      f"(not analyzed - run track_index.py)")
             return True
         except Exception as e:
             print(f"Error loading track: {e}")
             return False
 
-    def play(self, loops: int = -1):
-        """Start playback (loops=-1 for infinite loop)."""
-        if self.current_sound:
-            self.channel.play(self.current_sound, loops=loops)
+    def play(self):
+        """Start playback from the beginning (the track loops)."""
+        if self.player is not None:
+            self.position = 0.0
             self.is_playing = True
+            self.is_paused = False
 
     def stop(self):
         """Stop playback."""
-        self.channel.stop()
         self.is_playing = False
+        self.is_paused = False
+        self.position = 0.0
 
     def pause(self):
         """Pause playback."""
-        self.channel.pause()
-        self.is_playing = False
+        if self.is_playing:
+            self.is_playing = False
+            self.is_paused = True
 
     def unpause(self):
         """Resume playback."""
-        self.channel.unpause()
-        self.is_playing = True
+        if self.is_paused:
+            self.is_playing = True
+            self.is_paused = False
 
     def set_volume(self, volume: float):
-        """Set volume (0.0 to 1.0)."""
-        self.volume = max(0.0, min(1.0, volume))
-        self.channel.set_volume(self.volume)
+        """Set volume (0.0 to 1.0); ramped per sample by the audio callback."""
+        self.controls.set('volume', max(0.0, min(1.0, volume)))
 
     def set_tempo(self, tempo: float):
-        """
-        Set tempo/playback speed.
+        """Set tempo/playback speed (varispeed: pitch follows tempo)."""
+        self.controls.set('tempo', max(config.MIN_TEMPO, min(config.MAX_TEMPO, tempo)))
+
+    def _publish_stem_gains(self):
+        """Write each stem's effective gain (level x mute x solo) to its slot."""
+        for i, name in enumerate(self.stem_names):
+            audible = name not in self.muted_stems and (
+                not self.soloed_stems or name in self.soloed_stems)
+            self._stem_slots[i].set(self.stem_levels[name] if audible else 0.0)
+
+    def set_stem_level(self, stem: str, level: float) -> bool:
+        """Set a stem's gain (0.0 to 1.0). Returns False for an unknown stem."""
+        if stem not in self.stem_levels:
+            return False
+        self.stem_levels[stem] = max(0.0, min(1.0, level))
+        self._publish_stem_gains()
+        return True
 
-        Note: Pygame doesn't support real-time tempo change.
-        This stores the value for display purposes.
-        For true tempo control, would need pydub or librosa.
+    def set_stem_mute(self, stem: str, muted: bool) -> bool:
+        """Mute/unmute a stem. Returns False for an unknown stem."""
+        if stem not in self.stem_levels:
+            return False
+        if muted:
+            self.muted_stems.add(stem)
+        else:
+            self.muted_stems.discard(stem)
+        self._publish_stem_gains()
+        return True
+
+    def set_stem_solo(self, stem: str, soloed: bool) -> bool:
+        """Solo/unsolo a stem (several can be soloed). Returns False for an unknown stem."""
+        if stem not in self.stem_levels:
+            return False
+        if soloed:
+            self.soloed_stems.add(stem)
+        else:
+            self.soloed_stems.discard(stem)
+        self._publish_stem_gains()
+        return True
+
+    def get_stem_states(self) -> List[dict]:
+        """Per-stem name, level, muted, soloed and audible flags for the UI."""
+        return [{
+            'name': name,
+            'level': self.stem_levels[name],
+            'muted': name in self.muted_stems,
+            'soloed': name in self.soloed_stems,
+            'audible': name not in self.muted_stems and (
+                not self.soloed_stems or name in self.soloed_stems),
+        } for name in self.stem_names]
+
+    def beat_position(self) -> Optional[float]:
+        """Current beat on the track's grid (None without analysis)."""
+        if self.track_info is None:
+            return None
+        return self.track_info.beat_position(self.position / config.SAMPLE_RATE)
+
+    def render(self, out: np.ndarray):
+        """Mix the next len(out) frames into `out` at `self.rate`."""
+        player = self.player
+        if player is None or not self.is_playing:
+            return
+        self.position = player.render(out, self.position, self.rate,
+                                      self._stem_slots, self.controls['volume'])
+
+    def advance_controls(self, frames: int):
+        """
+        Step the volume/stem ramps as render() would over `frames`, without
+        producing audio (offline fast-forward). Slot steps compose exactly
+        while targets are unchanged, so one call equals many blocks.
         """
-        self.tempo = max(config.MIN_TEMPO, min(config.MAX_TEMPO, tempo))
+        player = self.player
+        if player is None or not self.is_playing:
+            return
+        self.controls['volume'].step(frames)
+        for slot in self._stem_slots[:len(player.stem_names)]:
+            slot.step(frames)
 
     def get_track_name(self) -> str:
         """Get current track filename."""
@@ -136,24 +390,68 @@ class Deck:
 class AudioEngine:
     """Main audio engine managing both decks."""
 
-    def __init__(self):
-        """Initialize pygame mixer and decks."""
-        pygame.mixer.init(
-            frequency=config.SAMPLE_RATE,
-            size=-16,
-            channels=2,
-            buffer=config.AUDIO_BUFFER
-        )
-        pygame.mixer.set_num_channels(4)  # 2 decks + headroom
+    def __init__(self, start_output: bool = True, block_size: Optional[int] = None):
+        """
+        Initialize the mixer, decks and block output.
+
+        Args:
+            start_output: Open the audio device (False for offline rendering)
+            block_size: Largest block render() will be asked for, if above
+                the output's (offline rendering uses big chunks)
+        """
+        # With auto-tune the block size can grow at runtime, so scratch buffers
+        # are sized for the largest candidate
+        self.tuner = None
+        output_block = max_block = config.AUDIO_BUFFER
+        if config.AUDIO_BUFFER_AUTOTUNE and start_output:
+            self.tuner = BufferTuner(config.AUDIO_BUFFER_SIZES, config.AUDIO_TUNE_PATH,
+                                     config.AUDIO_TUNE_MAX_LOAD, config.AUDIO_TUNE_WINDOW_S)
+            output_block = self.tuner.size
+            max_block = max(config.AUDIO_BUFFER_SIZES)
+        if block_size is not None:
+            max_block = max(max_block, block_size)
+
+        if start_output:
+            pygame.mixer.init(
+                frequency=config.SAMPLE_RATE,
+                size=-16,
+                channels=2,
+                buffer=output_block
+            )
+            pygame.mixer.set_num_channels(4)  # Block output + headroom
+
+        # BPM/key/beat-grid/loudness lookups (populated by track_index.py; while
+        # running, a watcher indexes tracks added to the library, e.g. generated ones)
+        self.track_index = TrackIndex()
+        if start_output:
+            self.track_index.start_watcher()
 
         self.decks: Dict[str, Deck] = {
-            'left': Deck('left', pygame.mixer.Channel(0)),
-            'right': Deck('right', pygame.mixer.Channel(1)),
+            'left': Deck('left', self.track_index, max_block),
+            'right': Deck('right', self.track_index, max_block),
         }
 
+        # Auto-sync: the follower deck is phase-locked to the master's beat grid
+        self.sync_enabled = False
+        self.sync_master = 'left'
+
         # Try to load initial tracks
         self._load_initial_tracks()
 
+        # One-shot effects, pre-decoded so triggers never touch the disk
+        self.sampler = Sampler.from_dir(max_block=max_block)
+
+        # Side tap of the mix bus for the visuals' spectrum/level feed
+        self.analysis = AnalysisTap()
+
+        self.output = BlockOutput(self.render, config.SAMPLE_RATE, output_block)
+        self.frames_rendered = 0  # Audio clock: frames produced since startup
+        self._metrics_due = 0.0
+        if start_output:
+            self.output.start()
+            self.sampler.output_latency_s = self.output.latency_s
+            self.analysis.start()
+
     def _load_initial_tracks(self):
         """Attempt to load first track on each deck."""
         for deck in self.decks.values():
@@ -163,10 +461,142 @@ class AudioEngine:
         """Get a deck by ID."""
         return self.decks.get(deck_id)
 
+    def set_sync(self, enabled: bool, master: str = None):
+        """
+        Turn auto-sync on/off.
+
+        Args:
+            enabled: Phase-lock the follower deck to the master
+            master: Deck ID to follow (keeps the current master if None)
+        """
+        if master in self.decks:
+            self.sync_master = master
+        if not enabled:
+            # Hand the follower's synced tempo back to its own control
+            for deck in self.decks.values():
+                if deck.sync_tempo is not None:
+                    deck.set_tempo(deck.sync_tempo)
+                deck.phase_error = None
+        self.sync_enabled = enabled
+
+    def is_sync_follower(self, deck_id: str) -> bool:
+        """True if the deck's tempo is currently driven by auto-sync."""
+        return self.sync_enabled and deck_id != self.sync_master
+
+    def _update_rates(self, frames: int):
+        """
+        Set each deck's playback rate for the next block.
+
+        With sync on, the follower takes the master's effective BPM and its
+        beat phase is pulled onto the master's. Large errors (sync engaged,
+        deck started, loop wrap) are snapped by jumping the play position;
+        small drift is spread over SYNC_CATCHUP_BLOCKS blocks as a clamped
+        rate offset, so corrections are inaudible.
+        """
+        for deck in self.decks.values():
+            deck.rate = deck.controls['tempo'].step(frames)
+        if not self.sync_enabled:
+            for deck in self.decks.values():
+                deck.sync_tempo = None
+            return
+
+        master = self.decks[self.sync_master]
+        for deck_id, follower in self.decks.items():
+            if deck_id == self.sync_master:
+                continue
+            follower.phase_error = None
+            m_info, f_info = master.track_info, follower.track_info
+            if m_info is None or f_info is None or master.player is None or follower.player is None:
+                follower.sync_tempo = None
+                continue
+
+            # Follow the master's ramped rate, not its target, so both glide together
+            follower.sync_tempo = max(config.MIN_TEMPO, min(config.MAX_TEMPO,
+                                      m_info.bpm * master.rate / f_info.bpm))
+            follower.rate = follower.sync_tempo
+            # Keep the ramp anchored here so leaving sync glides from the synced tempo
+            follower.controls['tempo'].value = follower.sync_tempo
+            if not (master.is_playing and follower.is_playing):
+                continue
+
+            error = (master.beat_position() - follower.beat_position() + 0.5) % 1.0 - 0.5
+            error_frames = error * config.SAMPLE_RATE * 60.0 / f_info.bpm
+            if abs(error) > config.SYNC_SNAP_BEATS:
+                follower.position = (follower.position + error_frames) % follower.player.frames
+                error = error_frames = 0.0
+            follower.phase_error = error
+            correction = error_frames / (config.SYNC_CATCHUP_BLOCKS * frames)
+            follower.rate += max(-config.SYNC_MAX_CORRECTION,
+                                 min(config.SYNC_MAX_CORRECTION, correction))
+
+    def beat_clock(self) -> Optional[tuple]:
+        """
+        (current beat, output frames per beat) of the deck that sets the
+        groove: the sync master if playing, else any playing analyzed deck.
+        """
+        master = self.decks[self.sync_master]
+        candidates = [master] + [d for d in self.decks.values() if d is not master]
+        for deck in candidates:
+            if deck.is_playing and deck.track_info is not None and deck.rate > 0:
+                frames_per_beat = config.SAMPLE_RATE * 60.0 / (deck.track_info.bpm * deck.rate)
+                return deck.beat_position(), frames_per_beat
+        return None
+
+    def render(self, out: np.ndarray):
+        """Audio callback: fill `out` (frames, 2) float32 with the deck mix."""
+        out[:] = 0
+        self._update_rates(len(out))
+        beat_clock = self.beat_clock() if self.sampler.has_pending else None
+        for deck in self.decks.values():
+            deck.render(out)
+        self.sampler.render(out, beat_clock)
+        self.analysis.ring.write(out)
+        self.frames_rendered += len(out)
+
+    def advance_controls(self, frames: int):
+        """
+        Move tempo, sync and volume/stem ramps forward by `frames` without
+        rendering audio: offline segments use it to reach the control state
+        a full render would have at their start.
+        """
+        if frames <= 0:
+            return
+        self._update_rates(frames)
+        for deck in self.decks.values():
+            deck.advance_controls(frames)
+        self.frames_rendered += frames
+
+    def update_health(self):
+        """
+        Periodic housekeeping from the UI loop: buffer auto-tune steps and
+        the OpenMetrics textfile export.
+        """
+        if not self.output.is_running:
+            return
+        if self.tuner is not None:
+            block_size = self.tuner.check(self.output.metrics)
+            if block_size:
+                self.output.restart(block_size)
+                self.sampler.output_latency_s = self.output.latency_s
+        now = time.monotonic()
+        if now >= self._metrics_due:
+            self._metrics_due = now + config.METRICS_INTERVAL_S
+            try:
+                self.output.metrics.write_textfile(config.METRICS_PATH)
+            except OSError as e:
+                print(f"Audio metrics export failed: {e}")
+
+    def get_health(self) -> dict:
+        """Output metrics snapshot (render times, DSP load, underruns, fill)."""
+        health = self.output.metrics.snapshot()
+        if self.tuner is not None:
+            health['tuned'] = self.tuner.saved
+        return health
+
     def play_all(self):
         """Start playback on all decks."""
         for deck in self.decks.values():
-            if deck.current_sound:
+            if deck.player is not None:
                 deck.play()
 
     def stop_all(self):
@@ -180,5 +610,8 @@ class AudioEngine:
             deck.set_volume(volume)
 
     def close(self):
-        """Clean up pygame mixer."""
+        """Stop the output and clean up pygame mixer."""
+        self.analysis.stop()
+        self.output.stop()
         pygame.mixer.quit()
+        self.track_index.close()
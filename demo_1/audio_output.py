@@ -0,0 +1,360 @@
+"""
+Block-based audio output.
+Drives a render(out) callback at the device rate, using a real audio
+callback (sounddevice) when available and pygame channel queuing otherwise.
+Every callback is timed into OutputMetrics; BufferTuner picks the smallest
+block size that runs clean on this machine.
+"""
+
+import bisect
+import json
+import os
+import platform
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+import numpy as np
+import pygame
+
+try:
+    import sounddevice
+except (ImportError, OSError):  # OSError: PortAudio library missing
+    sounddevice = None
+
+
+RenderCallback = Callable[[np.ndarray], None]
+
+# Render-time histogram bucket upper bounds (seconds)
+RENDER_BUCKETS_S = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.003, 0.005, 0.0075, 0.01,
+                    0.015, 0.02, 0.05)
+
+
+class OutputMetrics:
+    """
+    Per-callback render timing, DSP load, underruns and buffer fill.
+
+    record() runs in the audio thread and only touches preallocated
+    counters; readers take snapshot() or openmetrics() from any thread.
+    """
+
+    def __init__(self, block_size: int, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.set_block_size(block_size)
+        self.buckets = [0] * (len(RENDER_BUCKETS_S) + 1)  # Last bucket is +Inf
+        self.callbacks = 0
+        self.underruns = 0
+        self.render_sum_s = 0.0
+        self.render_max_s = 0.0
+        self.load = 0.0  # Smoothed render time / block duration
+        self.load_peak = 0.0  # Decaying max of per-callback load
+        self.fill = 0.0  # Output buffering ahead of playback, as a fraction of its capacity
+
+    def set_block_size(self, block_size: int):
+        self.block_size = block_size
+        self.block_s = block_size / self.sample_rate
+
+    def record(self, render_s: float, fill: float):
+        """Account one callback (audio thread)."""
+        self.callbacks += 1
+        self.render_sum_s += render_s
+        if render_s > self.render_max_s:
+            self.render_max_s = render_s
+        self.buckets[bisect.bisect_left(RENDER_BUCKETS_S, render_s)] += 1
+        load = render_s / self.block_s
+        self.load += 0.05 * (load - self.load)
+        self.load_peak = max(load, self.load_peak * 0.995)
+        self.fill = fill
+
+    def percentile_s(self, q: float) -> float:
+        """q-th render time, interpolated within its histogram bucket."""
+        target = q * self.callbacks
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(RENDER_BUCKETS_S, self.buckets):
+            if count and seen + count >= target:
+                return lower + (bound - lower) * (target - seen) / count
+            seen += count
+            lower = bound
+        return self.render_max_s
+
+    def snapshot(self) -> dict:
+        """Current figures for the UI overlay and logs."""
+        return {
+            'block': self.block_size,
+            'block_ms': round(self.block_s * 1000, 2),
+            'callbacks': self.callbacks,
+            'underruns': self.underruns,
+            'dsp_load_pct': round(self.load * 100, 1),
+            'dsp_peak_pct': round(self.load_peak * 100, 1),
+            'render_p50_ms': round(self.percentile_s(0.5) * 1000, 2) if self.callbacks else 0.0,
+            'render_p99_ms': round(self.percentile_s(0.99) * 1000, 2) if self.callbacks else 0.0,
+            'render_max_ms': round(self.render_max_s * 1000, 2),
+            'fill_pct': round(self.fill * 100),
+        }
+
+    def openmetrics(self, prefix: str = 'dj_audio') -> str:
+        """OpenMetrics text exposition of the counters."""
+        lines = [
+            f"# TYPE {prefix}_render_seconds histogram",
+            f"# UNIT {prefix}_render_seconds seconds",
+            f"# HELP {prefix}_render_seconds Time spent in the render callback per block.",
+        ]
+        cumulative = 0
+        for bound, count in zip(RENDER_BUCKETS_S, self.buckets):
+            cumulative += count
+            lines.append(f'{prefix}_render_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines += [
+            f'{prefix}_render_seconds_bucket{{le="+Inf"}} {self.callbacks}',
+            f"{prefix}_render_seconds_count {self.callbacks}",
+            f"{prefix}_render_seconds_sum {self.render_sum_s:.6f}",
+            f"# TYPE {prefix}_underruns counter",
+            f"# HELP {prefix}_underruns Blocks the device played before we delivered them.",
+            f"{prefix}_underruns_total {self.underruns}",
+            f"# TYPE {prefix}_dsp_load gauge",
+            f"# HELP {prefix}_dsp_load Smoothed render time as a fraction of the block duration.",
+            f"{prefix}_dsp_load {self.load:.4f}",
+            f"# TYPE {prefix}_buffer_fill_ratio gauge",
+            f"{prefix}_buffer_fill_ratio {self.fill:.3f}",
+            f"# TYPE {prefix}_block_frames gauge",
+            f"{prefix}_block_frames {self.block_size}",
+            "# EOF",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str, prefix: str = 'dj_audio'):
+        """Write openmetrics() via a temp file so scrapers never read a partial file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(self.openmetrics(prefix))
+        os.replace(tmp, path)
+
+
+class BufferTuner:
+    """
+    Finds the smallest block size that plays clean on this machine.
+
+    Starts from the size last saved for this host (or the smallest
+    candidate) and steps up to the next candidate whenever a window sees an
+    underrun or a smoothed DSP load above max_load. A size that survives
+    `settle_windows` windows is saved for the next run. Never steps down.
+    """
+
+    def __init__(self, sizes: List[int], path: str, max_load: float,
+                 window_s: float, settle_windows: int = 3):
+        """
+        Args:
+            sizes: Candidate block sizes
+            path: JSON file of {host: block size}
+            max_load: Highest acceptable smoothed DSP load (0-1)
+            window_s: Seconds per evaluation window
+            settle_windows: Clean windows before a size is saved
+        """
+        self.sizes = sorted(sizes)
+        self.path = Path(path)
+        self.max_load = max_load
+        self.window_s = window_s
+        self.settle_windows = settle_windows
+        self.host = platform.node() or 'default'
+        self.size = self._load_saved() or self.sizes[0]
+        self.saved = False
+        self._clean_windows = 0
+        self._window_start = None
+        self._window_underruns = None
+
+    def _load_saved(self) -> Optional[int]:
+        try:
+            size = json.loads(self.path.read_text()).get(self.host)
+        except (OSError, ValueError):
+            return None
+        return size if size in self.sizes else None
+
+    def _save(self):
+        try:
+            saved = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            saved = {}
+        saved[self.host] = self.size
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(saved, indent=2))
+        self.saved = True
+
+    def check(self, metrics: OutputMetrics) -> Optional[int]:
+        """
+        Evaluate the current window (call periodically from any non-audio thread).
+
+        Returns:
+            A larger block size to switch to, or None to keep the current one
+        """
+        now = time.monotonic()
+        if self._window_start is None:
+            # Grace window after a (re)start so startup glitches are not counted
+            self._window_start = now + self.window_s
+            self._window_underruns = None
+            return None
+        if now < self._window_start:
+            return None
+        if self._window_underruns is None:
+            self._window_start = now
+            self._window_underruns = metrics.underruns
+            return None
+        if now - self._window_start < self.window_s:
+            return None
+
+        underruns = metrics.underruns - self._window_underruns
+        self._window_start = now
+        self._window_underruns = metrics.underruns
+        if underruns or metrics.load > self.max_load:
+            larger = [s for s in self.sizes if s > self.size]
+            if not larger:
+                return None
+            print(f"Audio: {underruns} underrun(s), DSP load {metrics.load:.0%} at "
+                  f"{self.size} frames; trying {larger[0]}")
+            self.size = larger[0]
+            self._clean_windows = 0
+            self._window_start = None
+            return self.size
+
+        self._clean_windows += 1
+        if self._clean_windows == self.settle_windows:
+            self._save()
+            print(f"Audio: block size {self.size} is stable on {self.host}; saved")
+        return None
+
+
+class BlockOutput:
+    """
+    Pulls float32 (frames, 2) blocks from `render` and plays them.
+
+    The render callback fills the array it is handed in place; it must not
+    keep a reference to it.
+    """
+
+    def __init__(self, render: RenderCallback, sample_rate: int, block_size: int,
+                 channels: int = 2, backend: str = 'auto'):
+        """
+        Args:
+            render: Callback filling a (block_size, channels) float32 array
+            sample_rate: Output sample rate
+            block_size: Frames per block
+            channels: Output channels
+            backend: 'sounddevice', 'pygame' or 'auto'
+        """
+        self.render = render
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.channels = channels
+        if backend == 'auto':
+            backend = 'sounddevice' if sounddevice is not None else 'pygame'
+        self.backend = backend
+
+        self.metrics = OutputMetrics(block_size, sample_rate)
+        self._block = np.zeros((block_size, channels), dtype=np.float32)
+        self._stream = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def underruns(self) -> int:
+        return self.metrics.underruns
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    @property
+    def latency_s(self) -> float:
+        """Estimated time from render() returning to the block being heard."""
+        if self._stream is not None:
+            return float(self._stream.latency)
+        # pygame: the block waits behind the playing one, then in the mixer buffer
+        return 2 * self.block_size / self.sample_rate
+
+    def start(self):
+        """Open the device and start pulling blocks."""
+        self._running = True
+        if self.backend == 'sounddevice':
+            self._stream = sounddevice.OutputStream(
+                samplerate=self.sample_rate,
+                blocksize=self.block_size,
+                channels=self.channels,
+                dtype='float32',
+                callback=self._sounddevice_callback,
+            )
+            self._stream.start()
+        else:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init(frequency=self.sample_rate, size=-16,
+                                  channels=self.channels, buffer=self.block_size)
+            self._thread = threading.Thread(target=self._pygame_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop pulling blocks and release the device."""
+        self._running = False
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def restart(self, block_size: int):
+        """Reopen the output with a different block size (brief gap in playback)."""
+        was_running = self._running
+        self.stop()
+        self.block_size = block_size
+        self.metrics.set_block_size(block_size)
+        self._block = np.zeros((block_size, self.channels), dtype=np.float32)
+        if was_running:
+            self.start()
+
+    def _sounddevice_callback(self, outdata, frames, time_info, status):
+        if status.output_underflow:
+            self.metrics.underruns += 1
+        start = time.perf_counter()
+        self.render(outdata)
+        render_s = time.perf_counter() - start
+        # How far ahead of the DAC this block is queued, against the stream's latency
+        ahead = time_info.outputBufferDacTime - time_info.currentTime
+        latency = self._stream.latency if self._stream is not None else 0.0
+        self.metrics.record(render_s, min(1.0, ahead / latency) if latency > 0 else 0.0)
+
+    def _pygame_loop(self):
+        """
+        Keep one block queued behind the playing one on a dedicated channel.
+
+        Two Sounds are allocated up front and alternate: each block is
+        written into the samples of the one that just finished, so the loop
+        allocates nothing per block. Blocks are still handed over by polling
+        from a Python thread, not a device callback, so this fallback is not
+        glitch-free under load.
+        """
+        channel = pygame.mixer.find_channel(True)
+        block_s = self.block_size / self.sample_rate
+        silence = np.zeros((self.block_size, self.channels), dtype=np.int16)
+        sounds = [pygame.sndarray.make_sound(silence) for _ in range(2)]
+        buffers = [pygame.sndarray.samples(sound) for sound in sounds]  # Views, not copies
+        next_sound = 0
+        started = False
+        while self._running:
+            if channel.get_queue() is None:
+                busy = channel.get_busy()
+                if started and not busy:
+                    self.metrics.underruns += 1
+                start = time.perf_counter()
+                self.render(self._block)
+                # Capacity is two blocks: one playing, one queued
+                self.metrics.record(time.perf_counter() - start, 0.5 if busy else 0.0)
+                np.clip(self._block, -1.0, 1.0, out=self._block)
+                np.multiply(self._block, 32767, out=buffers[next_sound], casting='unsafe')
+                sound = sounds[next_sound]
+                next_sound ^= 1
+                if channel.get_busy():
+                    channel.queue(sound)
+                else:
+                    channel.play(sound)
+                started = True
+            time.sleep(block_s / 4)
@@ -15,6 +15,11 @@ ZONES = {
     'deck_right': (0.65, 0.25, 0.98, 0.85),
     'knob_left': (0.38, 0.35, 0.48, 0.75),
     'knob_right': (0.52, 0.35, 0.62, 0.75),
+    'stems_left': (0.38, 0.82, 0.49, 0.95),  # Stem mute pads (one per stem)
+    'stems_right': (0.51, 0.82, 0.62, 0.95),
+    'fx_pads': (0.38, 0.08, 0.62, 0.20),  # One-shot effect pads (either hand)
+    'wave_left': (0.02, 0.12, 0.35, 0.20),  # Scrolling waveform around the playhead
+    'wave_right': (0.65, 0.12, 0.98, 0.20),
 }
 
 # Gesture thresholds
@@ -25,18 +30,85 @@ KNOB_SENSITIVITY = 1.5  # Multiplier for knob movement
 # Audio settings
 SAMPLE_RATE = 44100
 AUDIO_BUFFER = 512
+# Auto-tune: start at the smallest size (or the last one saved for this
+# machine) and step up on underruns or sustained DSP load above the limit
+AUDIO_BUFFER_AUTOTUNE = False
+AUDIO_BUFFER_SIZES = [128, 256, 512, 1024, 2048]
+AUDIO_TUNE_MAX_LOAD = 0.5
+AUDIO_TUNE_WINDOW_S = 5.0
 MIN_TEMPO = 0.5  # 50% speed
 MAX_TEMPO = 1.5  # 150% speed
 DEFAULT_VOLUME = 0.7
 
+# Auto-sync: errors above SYNC_SNAP_BEATS jump the play position; smaller
+# drift is corrected over SYNC_CATCHUP_BLOCKS blocks, nudging the playback
+# rate by at most SYNC_MAX_CORRECTION
+SYNC_SNAP_BEATS = 0.05
+SYNC_CATCHUP_BLOCKS = 8
+SYNC_MAX_CORRECTION = 0.02
+
+# Control bus: smallest change published, and full-scale ramp times
+CONTROL_EPSILON = 1e-3
+VOLUME_RAMP_S = 0.05
+TEMPO_RAMP_S = 0.5
+STEM_RAMP_S = 0.01
+
+# DJ Agent WebSocket server (agent decisions are routed to 'cv' clients)
+AGENT_WS_URL = 'ws://localhost:8080'
+
+# Mix analysis feed for visuals (published to the WS server as binary frames)
+ANALYSIS_RATE_HZ = 60
+ANALYSIS_BANDS = 8
+ANALYSIS_CPU_BUDGET = 0.05  # Fraction of one core; FFT size, then rate, drop to stay under
+ANALYSIS_FLOOR_DB = -70.0  # Band level mapped to 0
+ANALYSIS_ONSET_REFRACTORY_S = 0.1
+
 # Track assignments (supports .mp3 and .wav)
-# The system will auto-detect which extension exists
+# A name is either a folder of stems (music/track1/drums.wav, bass.wav, ...)
+# or a single file; the system will auto-detect which extension exists
 DECK_TRACKS = {
-    'left': ['track1', 'track2'],   # Will look for .mp3 or .wav
+    'left': ['track1', 'track2'],   # Will look for a folder, then .mp3 or .wav
     'right': ['track3', 'track4'],
 }
 SUPPORTED_EXTENSIONS = ['.wav', '.mp3']  # Order of preference
 
+# Stem folders: known names set the mixer order, other files follow by name
+STEM_NAMES = ['drums', 'bass', 'melody', 'vocals']
+MAX_STEMS = 4
+
+# One-shot effects sampler (see sampler.py)
+EFFECTS_DIR = 'music/effects'
+SAMPLER_VOICES = 8  # Total polyphony
+SAMPLER_VOICES_PER_SAMPLE = 3  # Retriggers beyond this steal the oldest voice
+SAMPLER_GAIN = 0.8
+FX_PAD_QUANTIZE = None  # Beats to quantize pad taps to (None = immediate)
+
+# Library analysis (see track_index.py) and decoded PCM cache
+MUSIC_DIR = 'music'
+CACHE_DIR = 'cache'
+PCM_CACHE_DIR = 'cache/pcm'
+TRACK_INDEX_PATH = 'cache/track_index.sqlite'
+PEAKS_DIR = 'cache/peaks'  # Waveform pyramids (peaks.py), built with the track analysis
+PEAKS_BASE = 256  # Samples per bin at the finest zoom level
+WAVEFORM_WINDOW_S = 8.0  # Seconds shown in a deck's waveform strip
+AUDIO_TUNE_PATH = 'cache/audio_buffer.json'
+METRICS_PATH = 'cache/audio_metrics.prom'  # OpenMetrics textfile, rewritten every METRICS_INTERVAL_S
+METRICS_INTERVAL_S = 5.0
+SESSION_DIR = 'sessions'  # Recorded session timelines (R in main.py)
+TRACK_WATCH_INTERVAL_S = 10.0  # Library rescan period while running (picks up generated tracks)
+TRACK_WATCH_SETTLE_S = 2.0  # Files modified more recently are still being written; skipped
+
+# Loudness normalization: measured once per track (track_index.py), applied
+# by the deck as a fixed gain at load
+NORMALIZE_LOUDNESS = True
+TARGET_LUFS = -14.0
+TRUE_PEAK_CEILING_DB = -1.0  # Gain never lifts a track's true peak above this
+MAX_NORMALIZATION_GAIN_DB = 12.0  # Boost limit for very quiet tracks
+
+# Offline rendering (offline_render.py)
+OFFLINE_BLOCK = 8192  # Frames per render chunk
+OFFLINE_TAIL_S = 10.0  # Rendered past the last event when a timeline has no duration
+
 # Colors (BGR for OpenCV)
 COLORS = {
     'deck_inactive': (100, 100, 100),
@@ -49,6 +121,13 @@ COLORS = {
     'text': (255, 255, 255),
     'tempo_indicator': (0, 200, 255),
     'pinch_active': (0, 255, 0),
+    'stem_on': (0, 200, 120),
+    'stem_muted': (60, 60, 60),
+    'stem_solo': (0, 220, 255),
+    'fx_pad': (255, 80, 200),
+    'perf_warning': (0, 0, 255),
+    'waveform': (200, 160, 60),
+    'playhead': (255, 255, 255),
 }
 
 # UI settings
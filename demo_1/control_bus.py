@@ -0,0 +1,98 @@
+"""
+Control bus between the gesture/UI thread and the audio callback.
+Each parameter is a single-writer/single-reader slot: the control thread
+stores a target, the audio callback reads it once per block and ramps
+toward it. A float attribute store is atomic under the GIL, so neither side
+takes a lock, and the callback never waits on the video loop.
+"""
+
+from typing import Dict
+import numpy as np
+import config
+
+
+class ControlSlot:
+    """
+    One smoothed control parameter.
+
+    `set` is called by the writer thread only; `ramp` / `step` by the audio
+    callback only. Writes within `epsilon` of the current target are
+    dropped, so per-frame gesture updates of an unchanged value cost nothing.
+    """
+
+    __slots__ = ('target', 'value', 'epsilon', 'slew_per_frame',
+                 'writes', 'dropped', '_unit_ramp')
+
+    def __init__(self, value: float, full_scale_s: float,
+                 epsilon: float = config.CONTROL_EPSILON,
+                 max_block: int = config.AUDIO_BUFFER):
+        """
+        Args:
+            value: Initial value
+            full_scale_s: Seconds a 0 -> 1 change takes (slew limit)
+            epsilon: Smallest target change that is published
+            max_block: Largest block ramp() will fill
+        """
+        self.target = float(value)
+        self.value = float(value)  # Audio-side current value
+        self.epsilon = epsilon
+        self.slew_per_frame = 1.0 / max(1.0, full_scale_s * config.SAMPLE_RATE)
+        self.writes = 0
+        self.dropped = 0
+        self._unit_ramp = (np.arange(1, max_block + 1, dtype=np.float32) / max_block)
+
+    def set(self, value: float) -> bool:
+        """Publish a new target (writer thread). Returns False if deduplicated."""
+        if abs(value - self.target) <= self.epsilon:
+            self.dropped += 1
+            return False
+        self.target = float(value)
+        self.writes += 1
+        return True
+
+    def step(self, frames: int) -> float:
+        """Advance the value by one block toward the target (audio thread)."""
+        limit = self.slew_per_frame * frames
+        delta = self.target - self.value
+        self.value += max(-limit, min(limit, delta))
+        return self.value
+
+    def ramp(self, out: np.ndarray) -> bool:
+        """
+        Fill `out` (frames,) with a per-sample linear ramp from the current
+        value to this block's end value (audio thread).
+
+        Returns:
+            False if the value is settled (out is a constant)
+        """
+        start = self.value
+        frames = len(out)
+        end = self.step(frames)
+        if end == start:
+            out.fill(end)
+            return False
+        if frames == len(self._unit_ramp):
+            np.multiply(self._unit_ramp, end - start, out=out)
+        else:
+            np.multiply(self._unit_ramp[:frames], (end - start) * len(self._unit_ramp) / frames,
+                        out=out)
+        out += start
+        return True
+
+
+class ControlBus:
+    """Fixed set of named slots, created up front so neither thread mutates the dict."""
+
+    def __init__(self, slots: Dict[str, ControlSlot]):
+        self.slots = dict(slots)
+
+    def __getitem__(self, name: str) -> ControlSlot:
+        return self.slots[name]
+
+    def set(self, name: str, value: float) -> bool:
+        return self.slots[name].set(value)
+
+    def stats(self) -> dict:
+        """Published vs deduplicated writes per slot."""
+        return {name: {'writes': slot.writes, 'dropped': slot.dropped}
+                for name, slot in self.slots.items()}
@@ -3,9 +3,13 @@ DJ Controller - connects gestures to audio actions.
 Central hub that translates gesture states into audio changes.
 """
 
-from typing import Dict
+import queue
+import time
+from pathlib import Path
+from typing import Dict, Optional
 from gesture_detector import GestureState
 from audio_engine import AudioEngine
+from timeline import SessionRecorder, apply_event, make_event
 import config
 
 
@@ -25,6 +29,35 @@ class DJController:
         self.tempo_left = 1.0
         self.tempo_right = 1.0
 
+        # Agent decisions arrive on the agent-link thread; they are applied
+        # from process_gestures so the deck controls keep a single writer
+        self._agent_actions: "queue.SimpleQueue[dict]" = queue.SimpleQueue()
+
+        # Session recording for offline re-rendering (offline_render.py)
+        self.recorder: Optional[SessionRecorder] = None
+
+    def _apply(self, op: str, deck_id: Optional[str] = None, *args):
+        """Apply an engine operation (see timeline.py), recording it if a session is being recorded."""
+        apply_event(self.audio, make_event(0.0, op, deck_id, args))
+        if self.recorder is not None:
+            self.recorder.record(op, deck_id, args)
+
+    def start_recording(self):
+        """Start recording applied operations, from a snapshot of the current state."""
+        self.recorder = SessionRecorder(self.audio)
+        print("Session recording started")
+
+    def stop_recording(self) -> Optional[Path]:
+        """Stop recording and save the timeline to SESSION_DIR; returns its path."""
+        if self.recorder is None:
+            return None
+        path = self.recorder.save(
+            Path(config.SESSION_DIR) / time.strftime('session-%Y%m%d-%H%M%S.json'))
+        print(f"Session saved: {path} ({self.recorder.elapsed_s:.1f}s, "
+              f"{len(self.recorder.events)} events)")
+        self.recorder = None
+        return path
+
     def process_gestures(self, gesture_states: Dict[str, GestureState]):
         """
         Process gesture states and apply to audio.
@@ -40,6 +73,16 @@ class DJController:
         self._process_knob('left', gesture_states.get('knob_left'))
         self._process_knob('right', gesture_states.get('knob_right'))
 
+        # Process stem pads (mute toggles)
+        self._process_stem_pads('left', gesture_states.get('stems_left'))
+        self._process_stem_pads('right', gesture_states.get('stems_right'))
+
+        # Process effect pads (one-shot triggers)
+        self._process_fx_pads(gesture_states.get('fx_pads_left'))
+        self._process_fx_pads(gesture_states.get('fx_pads_right'))
+
+        self._apply_agent_actions()
+
     def _process_wheel(self, deck_id: str, state: GestureState):
         """Process wheel rotation for tempo control."""
         if state is None:
@@ -49,6 +92,9 @@ class DJController:
         if deck is None:
             return
 
+        if self.audio.is_sync_follower(deck_id):
+            return  # Tempo follows the sync master
+
         if state.is_active and state.delta != 0:
             # Convert rotation to tempo change
             # Positive rotation (clockwise) = speed up
@@ -59,13 +105,13 @@ class DJController:
                     config.MIN_TEMPO,
                     min(config.MAX_TEMPO, self.tempo_left + tempo_delta)
                 )
-                deck.set_tempo(self.tempo_left)
+                self._apply('tempo', deck_id, self.tempo_left)
             else:
                 self.tempo_right = max(
                     config.MIN_TEMPO,
                     min(config.MAX_TEMPO, self.tempo_right + tempo_delta)
                 )
-                deck.set_tempo(self.tempo_right)
+                self._apply('tempo', deck_id, self.tempo_right)
 
     def _process_knob(self, deck_id: str, state: GestureState):
         """Process knob movement for volume control."""
@@ -76,8 +122,71 @@ class DJController:
         if deck is None:
             return
 
-        # Always update volume to match knob value
-        deck.set_volume(state.value)
+        # Publish the knob value every frame; the deck's control slot drops
+        # unchanged values, so this costs nothing while the knob is still
+        self._apply('volume', deck_id, state.value)
+
+    def _process_stem_pads(self, deck_id: str, state: GestureState):
+        """Toggle mute on the stem pad that was tapped."""
+        if state is None or not state.is_active:
+            return
+
+        deck = self.audio.get_deck(deck_id)
+        if deck is None or not deck.stem_names:
+            return
+
+        index = min(int(state.value * len(deck.stem_names)), len(deck.stem_names) - 1)
+        stem = deck.stem_names[index]
+        self._apply('stem_mute', deck_id, stem, stem not in deck.muted_stems)
+
+    def _process_fx_pads(self, state: GestureState):
+        """Trigger the effect under a pad tap."""
+        if state is None or not state.is_active:
+            return
+        count = len(self.audio.sampler.names)
+        if count:
+            self.trigger_effect(min(int(state.value * count), count - 1), config.FX_PAD_QUANTIZE)
+
+    def trigger_effect(self, index: int, quantize: float = None):
+        """
+        Fire a one-shot effect.
+
+        Args:
+            index: Effect number (sorted file order in EFFECTS_DIR)
+            quantize: Beats to quantize the start to (None = immediate)
+        """
+        self._apply('fx', None, index, 1.0, quantize)
+
+    def get_audio_health(self) -> dict:
+        """Output render times, DSP load, underruns and buffer fill for the UI."""
+        return self.audio.get_health()
+
+    def get_sampler_info(self) -> dict:
+        """Effect names and sampler stats (voices, steals, latency) for the UI."""
+        return {'effects': self.audio.sampler.names, **self.audio.sampler.stats()}
+
+    def toggle_stem_solo(self, deck_id: str, index: int):
+        """Toggle solo on a deck's stem by position (keyboard control)."""
+        deck = self.audio.get_deck(deck_id)
+        if deck and index < len(deck.stem_names):
+            stem = deck.stem_names[index]
+            self._apply('stem_solo', deck_id, stem, stem not in deck.soloed_stems)
+
+    def queue_agent_decision(self, data: dict):
+        """Queue an agent decision's actions (safe to call from any thread)."""
+        for action in data.get('actions', []):
+            if isinstance(action, dict):
+                self._agent_actions.put(action)
+
+    def _apply_agent_actions(self):
+        """Apply queued agent actions this controller understands."""
+        while True:
+            try:
+                action = self._agent_actions.get_nowait()
+            except queue.Empty:
+                return
+            if action.get('type') == 'set_stem':
+                self._apply('agent', None, action)
 
     def get_deck_info(self, deck_id: str) -> dict:
         """Get current info for a deck."""
@@ -85,47 +194,64 @@ class DJController:
         if deck is None:
             return {}
 
+        info = deck.track_info
+        stems = deck.get_stem_states()
         return {
             'track': deck.get_track_name(),
             'volume': deck.volume,
             'tempo': deck.tempo,
             'is_playing': deck.is_playing,
+            'bpm': info.bpm * deck.tempo if info else None,
+            'key': info.key if info else None,
+            'synced': self.audio.is_sync_follower(deck_id),
+            'phase_error_ms': (deck.phase_error * 60000.0 / (info.bpm * deck.tempo)
+                               if info and deck.phase_error is not None else None),
+            'stems': stems,
+            'position_s': deck.position / config.SAMPLE_RATE,
+            # Pyramids of the stems you can hear, for the waveform strip
+            'peaks': [p for p, stem in zip(deck.peaks, stems) if p is not None and stem['audible']],
         }
 
     def play_deck(self, deck_id: str):
         """Start playback on a deck."""
-        deck = self.audio.get_deck(deck_id)
-        if deck:
-            deck.play()
+        if self.audio.get_deck(deck_id):
+            self._apply('play', deck_id)
 
     def stop_deck(self, deck_id: str):
         """Stop a deck."""
-        deck = self.audio.get_deck(deck_id)
-        if deck:
-            deck.stop()
+        if self.audio.get_deck(deck_id):
+            self._apply('stop', deck_id)
 
     def toggle_deck(self, deck_id: str):
         """Toggle play/pause on a deck."""
         deck = self.audio.get_deck(deck_id)
         if deck:
             if deck.is_playing:
-                deck.pause()
+                self._apply('pause', deck_id)
             else:
-                if deck.channel.get_busy():
-                    deck.unpause()
+                if deck.is_paused:
+                    self._apply('unpause', deck_id)
                 else:
-                    deck.play()
+                    self._apply('play', deck_id)
+
+    def toggle_sync(self, master: str = 'left'):
+        """Toggle auto-sync of the other deck to `master`."""
+        self._apply('sync', None, not self.audio.sync_enabled, master)
+        if not self.audio.sync_enabled:
+            # Hand the follower's synced tempo back to the wheel
+            self.tempo_left = self.audio.decks['left'].tempo
+            self.tempo_right = self.audio.decks['right'].tempo
+        print(f"Auto-sync {'on' if self.audio.sync_enabled else 'off'} (master: {master})")
 
     def next_track(self, deck_id: str):
         """Switch to next track on a deck."""
-        deck = self.audio.get_deck(deck_id)
-        if deck:
-            deck.next_track()
+        if self.audio.get_deck(deck_id):
+            self._apply('next_track', deck_id)
 
     def play_all(self):
         """Start both decks."""
-        self.audio.play_all()
+        self._apply('play_all')
 
     def stop_all(self):
         """Stop both decks."""
-        self.audio.stop_all()
+        self._apply('stop_all')
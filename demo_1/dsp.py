@@ -0,0 +1,318 @@
+"""
+NumPy DSP building blocks for block-based audio rendering.
+Blocks are float32 arrays shaped (frames, channels).
+"""
+
+import functools
+import math
+import numpy as np
+
+FILTER_BLOCK = 256  # Samples solved per matrix product in biquad_filter
+
+
+class ParamSmoother:
+    """One-pole glide of a control value toward its target."""
+
+    def __init__(self, value: float, time_constant_s: float, sample_rate: int):
+        """
+        Args:
+            value: Initial value (also the initial target)
+            time_constant_s: Time to cover ~63% of a jump
+            sample_rate: Audio sample rate
+        """
+        self.value = value
+        self.target = value
+        self.time_constant_s = time_constant_s
+        self.sample_rate = sample_rate
+
+    def step(self, frames: int) -> float:
+        """Advance by `frames` samples and return the new value."""
+        if self.time_constant_s <= 0:
+            self.value = self.target
+        else:
+            coeff = 1.0 - math.exp(-frames / (self.time_constant_s * self.sample_rate))
+            self.value += (self.target - self.value) * coeff
+        return self.value
+
+
+def biquad_coefficients(kind: str, freq: float, q: float, sample_rate: int):
+    """RBJ cookbook lowpass/highpass coefficients, normalized so a[0] == 1."""
+    freq = min(max(freq, 10.0), sample_rate * 0.49)
+    w0 = 2 * math.pi * freq / sample_rate
+    cos_w0 = math.cos(w0)
+    alpha = math.sin(w0) / (2 * q)
+
+    if kind == 'lowpass':
+        b0 = (1 - cos_w0) / 2
+        b1 = 1 - cos_w0
+    else:
+        b0 = (1 + cos_w0) / 2
+        b1 = -(1 + cos_w0)
+    b2 = b0
+    a0 = 1 + alpha
+    a1 = -2 * cos_w0
+    a2 = 1 - alpha
+    return (np.array([b0 / a0, b1 / a0, b2 / a0]),
+            np.array([1.0, a1 / a0, a2 / a0]))
+
+
+@functools.lru_cache(maxsize=8)
+def _lags(n: int):
+    """Index i - j (clipped at 0) and mask j > i of an n x n Toeplitz matrix."""
+    lag = np.subtract.outer(np.arange(n), np.arange(n))
+    return np.maximum(lag, 0), lag < 0
+
+
+@functools.lru_cache(maxsize=32)
+def _biquad_maps(b: tuple, a: tuple, n: int):
+    """
+    Linear maps of a transposed direct form II biquad over n samples.
+
+    With state s = (z0, z1): y = T @ x + G @ s and s' = P @ x + M @ s,
+    T being the lower-triangular Toeplitz matrix of the impulse response.
+    Every power of the state matrix [[-a1, 1], [-a2, 0]] is made of one
+    scalar sequence u[i] = -a1 u[i-1] - a2 u[i-2], so that recurrence is
+    the only per-sample work (and only when the coefficients change).
+    """
+    b0, b1, b2 = b
+    _, a1, a2 = a
+    u = [0.0, 1.0]  # u[-1], u[0], ... u[n]
+    for _ in range(n):
+        u.append(-a1 * u[-1] - a2 * u[-2])
+    u = np.array(u)
+    B0, B1 = b1 - a1 * b0, b2 - a2 * b0  # Input-to-state vector
+    q = u[1:n + 1] * B0 + u[:n] * B1  # First entry of A^m B, m = 0 .. n-1
+    h = np.concatenate(([b0], q[:n - 1]))  # Impulse response
+    index, upper = _lags(n)
+    T = h[index]
+    T[upper] = 0.0
+    G = np.column_stack((u[1:n + 1], u[:n]))
+    P = np.empty((2, n))
+    P[0] = q[::-1]
+    P[1, :n - 1] = -a2 * q[n - 2::-1]
+    P[1, n - 1] = B1
+    M = np.array([[u[n + 1], u[n]], [-a2 * u[n], -a2 * u[n - 1]]])
+    return T, G, P, M
+
+
+def biquad_filter(b, a, x: np.ndarray, zi: np.ndarray):
+    """
+    Filter `x` along axis 0 through one biquad section.
+
+    Same result and state convention as scipy.signal.lfilter(b, a, x,
+    axis=0, zi=zi): `zi` is the transposed direct form II state, shaped
+    (2,) or (2, channels). Each FILTER_BLOCK samples are solved exactly as
+    matrix products, so only the block-to-block state hand-off loops.
+
+    Returns:
+        (filtered float64 array shaped like x, final state shaped like zi)
+    """
+    a0 = float(a[0])
+    b = tuple(float(v) / a0 for v in b)
+    a = tuple(float(v) / a0 for v in a)
+    frames = len(x)
+    x2 = np.asarray(x, dtype=np.float64).reshape(frames, -1)
+    z = np.asarray(zi, dtype=np.float64).reshape(2, -1).copy()
+    y = np.empty_like(x2)
+    start = 0
+    while start < frames:
+        n = min(FILTER_BLOCK, frames - start)
+        count = (frames - start) // n
+        T, G, P, M = _biquad_maps(b, a, n)
+        blocks = x2[start:start + count * n].reshape(count, n, -1)
+        feed = P @ blocks
+        states = np.empty((count, 2, x2.shape[1]))
+        for k in range(count):
+            states[k] = z
+            z = M @ z + feed[k]
+        y[start:start + count * n] = (T @ blocks + G @ states).reshape(count * n, -1)
+        start += count * n
+    return y.reshape(np.shape(x)), z.reshape(np.shape(zi))
+
+
+def sos_filter(sos: np.ndarray, x: np.ndarray, zi: np.ndarray):
+    """
+    Cascade of biquads, like scipy.signal.sosfilt(sos, x, axis=0, zi=zi).
+
+    Args:
+        sos: (sections, 6) rows of b0, b1, b2, a0, a1, a2
+        zi: (sections, 2[, channels]) state per section
+
+    Returns:
+        (filtered array, final state)
+    """
+    zf = np.empty(np.shape(zi))
+    for i, section in enumerate(sos):
+        x, zf[i] = biquad_filter(section[:3], section[3:], x, zi[i])
+    return x, zf
+
+
+def upsample(x: np.ndarray, factor: int, half_taps: int = 10) -> np.ndarray:
+    """
+    Band-limited integer upsampling of a 1-D signal (Kaiser-windowed sinc,
+    polyphase), like scipy.signal.resample_poly(x, factor, 1).
+    """
+    half = half_taps * factor
+    taps = np.sinc(np.arange(-half, half + 1) / factor) * np.kaiser(2 * half + 1, 5.0)
+    taps *= factor / taps.sum()
+    out = np.empty(len(x) * factor)
+    for phase in range(factor):
+        # Output i*factor+phase = sum over j of x[j] * taps[(i-j)*factor + phase + half]
+        lo = -((phase + half) // factor)
+        hi = (2 * half - phase - half) // factor
+        kernel = taps[phase + half + factor * np.arange(lo, hi + 1)]
+        out[phase::factor] = np.convolve(x, kernel)[-lo:-lo + len(x)]
+    return out
+
+
+class Biquad:
+    """
+    Multi-channel lowpass/highpass biquad with smoothed cutoff.
+
+    The cutoff glides toward its target and coefficients are recomputed every
+    SUB_BLOCK samples, so sweeps are zipper-free and always stable (the
+    frequency is interpolated, not the raw coefficients).
+    """
+
+    SUB_BLOCK = 64
+
+    def __init__(self, kind: str, freq: float, sample_rate: int,
+                 q: float = 0.707, channels: int = 2, smoothing_s: float = 0.03):
+        self.kind = kind
+        self.q = q
+        self.sample_rate = sample_rate
+        self.cutoff = ParamSmoother(freq, smoothing_s, sample_rate)
+        self._zi = np.zeros((2, channels))
+        self._coeff_freq = None
+        self._b, self._a = biquad_coefficients(kind, freq, q, sample_rate)
+
+    def set_frequency(self, freq: float):
+        """Set the cutoff target (Hz); the filter glides there."""
+        self.cutoff.target = freq
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Filter `block` in place and return it."""
+        frames = len(block)
+        for start in range(0, frames, self.SUB_BLOCK):
+            end = min(start + self.SUB_BLOCK, frames)
+            freq = self.cutoff.step(end - start)
+            if self._coeff_freq is None or abs(freq - self._coeff_freq) > 0.01:
+                self._b, self._a = biquad_coefficients(self.kind, freq, self.q, self.sample_rate)
+                self._coeff_freq = freq
+            block[start:end], self._zi = biquad_filter(
+                self._b, self._a, block[start:end], self._zi
+            )
+        return block
+
+
+class FeedbackDelay:
+    """
+    Ring-buffer feedback delay line.
+
+    The delay must be at least one block long, which lets each block be read
+    and written with two slice copies instead of a per-sample loop.
+    """
+
+    def __init__(self, max_delay: int, delay: int, feedback: float,
+                 max_block: int, channels: int = 2):
+        if delay < max_block:
+            raise ValueError(f"delay ({delay}) must be >= block size ({max_block})")
+        self._buf = np.zeros((max_delay, channels), dtype=np.float32)
+        self._out = np.zeros((max_block, channels), dtype=np.float32)
+        self._scratch = np.zeros((max_block, channels), dtype=np.float32)
+        self._pos = 0
+        self.max_block = max_block
+        self.delay = delay
+        self.feedback = feedback
+
+    def set_delay(self, delay: int):
+        self.delay = max(self.max_block, min(len(self._buf) - 1, int(delay)))
+
+    def _read(self, start: int, out: np.ndarray):
+        size = len(self._buf)
+        n = len(out)
+        first = min(n, size - start)
+        out[:first] = self._buf[start:start + first]
+        if first < n:
+            out[first:] = self._buf[:n - first]
+
+    def _write(self, start: int, data: np.ndarray):
+        size = len(self._buf)
+        n = len(data)
+        first = min(n, size - start)
+        self._buf[start:start + first] = data[:first]
+        if first < n:
+            self._buf[:n - first] = data[first:]
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Return the delayed signal for `block` (a view of an internal buffer)."""
+        n = len(block)
+        out = self._out[:n]
+        self._read((self._pos - self.delay) % len(self._buf), out)
+        feed = self._scratch[:n]
+        np.multiply(out, self.feedback, out=feed)
+        feed += block
+        self._write(self._pos, feed)
+        self._pos = (self._pos + n) % len(self._buf)
+        return out
+
+
+class CombReverb:
+    """Parallel feedback combs per channel (Freeverb tunings, stereo-spread)."""
+
+    COMB_TUNINGS = (1557, 1617, 1491, 1422)
+    STEREO_SPREAD = 23
+
+    def __init__(self, sample_rate: int, max_block: int, decay: float = 0.82):
+        scale = sample_rate / 44100
+        self._combs = []
+        for channel in range(2):
+            for tuning in self.COMB_TUNINGS:
+                delay = max(max_block, int((tuning + channel * self.STEREO_SPREAD) * scale))
+                self._combs.append((channel, FeedbackDelay(delay + 1, delay, decay, max_block, 1)))
+        self._out = np.zeros((max_block, 2), dtype=np.float32)
+        self._gain = 1.0 / len(self.COMB_TUNINGS)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        n = len(block)
+        out = self._out[:n]
+        out[:] = 0
+        for channel, comb in self._combs:
+            out[:, channel:channel + 1] += comb.process(block[:, channel:channel + 1])
+        out *= self._gain
+        return out
+
+
+class DropScheduler:
+    """
+    Bar-quantized buildup/drop automation.
+
+    Works in beat units so tempo changes mid-buildup keep the drop on a bar
+    line: a buildup starts at the next bar and the drop lands `bars` later.
+    """
+
+    def __init__(self, beats_per_bar: int = 4):
+        self.beats_per_bar = beats_per_bar
+        self.buildup_start = None
+        self.drop_beat = None
+
+    def schedule(self, now_beat: float, buildup_bars: int):
+        bar = self.beats_per_bar
+        self.buildup_start = math.ceil(now_beat / bar) * bar
+        self.drop_beat = self.buildup_start + buildup_bars * bar
+
+    def state(self, now_beat: float) -> tuple[str, float]:
+        """
+        Returns:
+            ('idle', 0), ('buildup', progress 0..1) or ('drop', beats since drop)
+        """
+        if self.drop_beat is None or now_beat < self.buildup_start:
+            return 'idle', 0.0
+        if now_beat < self.drop_beat:
+            span = self.drop_beat - self.buildup_start
+            return 'buildup', (now_beat - self.buildup_start) / span
+        since = now_beat - self.drop_beat
+        if since >= self.beats_per_bar:
+            self.buildup_start = self.drop_beat = None
+            return 'idle', 0.0
+        return 'drop', since
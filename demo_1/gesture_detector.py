@@ -1,6 +1,6 @@
 """
 Gesture detection for DJ controls.
-Handles wheel rotation and knob movements.
+Handles wheel rotation, knob movements and pad taps.
 """
 
 import numpy as np
@@ -182,6 +182,57 @@ class KnobGesture:
         self.is_grabbed = False
 
 
+class PadGesture:
+    """Detects pinch taps on a strip of pads (stem mutes, effect triggers)."""
+
+    def __init__(self, zone: Tuple[float, float, float, float], name: str):
+        """
+        Initialize a pad strip detector: a pinch tap in the zone picks the pad
+        under the hand (a stem to mute, or a one-shot effect to trigger).
+
+        Args:
+            zone: (x1, y1, x2, y2) normalized coordinates
+            name: Identifier for this pad strip (e.g. 'stems_left', 'fx_pads_left')
+        """
+        self.zone = zone
+        self.name = name
+        self.was_pinching = False
+
+    def update(self, hand: Optional[HandData]) -> GestureState:
+        """
+        Update pad state based on hand position.
+
+        Args:
+            hand: HandData if hand is in zone, None otherwise
+
+        Returns:
+            GestureState, active only on the frame a pinch starts in the zone,
+            with value = horizontal position across the strip (0-1)
+        """
+        state = GestureState()
+        pinching = hand is not None and hand.is_pinching
+        tapped = pinching and not self.was_pinching
+        self.was_pinching = pinching
+
+        if not tapped or not self._in_zone(hand.pinch_position):
+            return state
+
+        state.is_active = True
+        x = hand.pinch_position[0]
+        state.value = (x - self.zone[0]) / (self.zone[2] - self.zone[0])
+        return state
+
+    def _in_zone(self, pos: Tuple[float, float]) -> bool:
+        """Check if position is within the zone."""
+        x, y = pos
+        return (self.zone[0] <= x <= self.zone[2] and
+                self.zone[1] <= y <= self.zone[3])
+
+    def reset(self):
+        """Reset pad state."""
+        self.was_pinching = False
+
+
 class GestureDetector:
     """Main gesture detector managing all DJ controls."""
 
@@ -191,6 +242,11 @@ class GestureDetector:
         self.wheel_right = WheelGesture(config.ZONES['deck_right'], 'deck_right')
         self.knob_left = KnobGesture(config.ZONES['knob_left'], 'knob_left')
         self.knob_right = KnobGesture(config.ZONES['knob_right'], 'knob_right')
+        self.stems_left = PadGesture(config.ZONES['stems_left'], 'stems_left')
+        self.stems_right = PadGesture(config.ZONES['stems_right'], 'stems_right')
+        # Either hand can hit the effect pads
+        self.fx_left = PadGesture(config.ZONES['fx_pads'], 'fx_pads_left')
+        self.fx_right = PadGesture(config.ZONES['fx_pads'], 'fx_pads_right')
 
     def update(self, hands: list) -> Dict[str, GestureState]:
         """
@@ -220,6 +276,10 @@ class GestureDetector:
             'deck_right': self.wheel_right.update(right_hand),
             'knob_left': self.knob_left.update(left_hand),
             'knob_right': self.knob_right.update(right_hand),
+            'stems_left': self.stems_left.update(left_hand),
+            'stems_right': self.stems_right.update(right_hand),
+            'fx_pads_left': self.fx_left.update(left_hand),
+            'fx_pads_right': self.fx_right.update(right_hand),
         }
 
         return states
@@ -230,3 +290,7 @@ class GestureDetector:
         self.wheel_right.reset()
         self.knob_left.reset()
         self.knob_right.reset()
+        self.stems_left.reset()
+        self.stems_right.reset()
+        self.fx_left.reset()
+        self.fx_right.reset()
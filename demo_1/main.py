@@ -13,6 +13,10 @@ Controls:
     - SPACE: Play/pause all decks
     - 1/2: Toggle individual decks
     - N/M: Next track on deck left/right
+    - S: Toggle auto-sync
+    - Z/X/C/V, H/J/K/L: Solo stems 1-4 on deck left/right
+    - 7/8/9: Fire effect 1-3 (U/I/O: quantized to the next beat)
+    - R: Start/stop recording the session (replay with offline_render.py)
     - Q: Quit
 """
 
@@ -22,9 +26,23 @@ from hand_tracker import HandTracker
 from gesture_detector import GestureDetector
 from audio_engine import AudioEngine
 from dj_controller import DJController
+from agent_link import start_listener
 from ui_renderer import UIRenderer
 
 
+# Keyboard stem solo toggles: key -> (deck, stem index)
+STEM_SOLO_KEYS = {
+    **{ord(k): ('left', i) for i, k in enumerate('zxcv')},
+    **{ord(k): ('right', i) for i, k in enumerate('hjkl')},
+}
+
+# Keyboard effect triggers: key -> (effect index, quantize beats)
+EFFECT_KEYS = {
+    **{ord(k): (i, None) for i, k in enumerate('789')},  # Immediate
+    **{ord(k): (i, 1.0) for i, k in enumerate('uio')},  # On the next beat
+}
+
+
 def main():
     """Main application loop."""
     print("DJ Booth - Hand Gesture Controller")
@@ -36,6 +54,7 @@ def main():
     gesture_detector = GestureDetector()
     audio_engine = AudioEngine()
     dj_controller = DJController(audio_engine)
+    start_listener(dj_controller.queue_agent_decision, config.AGENT_WS_URL, 'DJ Booth')
     ui_renderer = UIRenderer(config.CAMERA_WIDTH, config.CAMERA_HEIGHT)
 
     # Open webcam
@@ -52,13 +71,20 @@ def main():
     print("  SPACE - Play/pause all decks")
     print("  1/2   - Toggle deck left/right")
     print("  N/M   - Next track on deck left/right")
+    print("  S     - Toggle auto-sync (right follows left)")
+    print("  Z/X/C/V - Solo stem 1-4 on left deck | H/J/K/L - right deck")
+    print("  7/8/9 - Fire effect 1-3 now | U/I/O - on the next beat")
+    print("  R     - Start/stop recording the session")
     print("  Q     - Quit")
     print("\nGestures:")
     print("  Pinch + rotate in deck area = tempo control")
     print("  Pinch + move up/down in knob area = volume control")
+    print("  Pinch tap on a stem pad = mute/unmute that stem")
+    print("  Pinch tap on an FX pad (top) = fire that effect")
     print("\nAdd audio files to the 'music' folder (.wav or .mp3):")
     print("  track1, track2 -> Left deck")
     print("  track3, track4 -> Right deck")
+    print("  (or a folder per track with drums/bass/melody/vocals stems)")
     print("-" * 40)
 
     try:
@@ -81,6 +107,9 @@ def main():
             # Apply gestures to audio
             dj_controller.process_gestures(gesture_states)
 
+            # Buffer auto-tune and metrics export
+            audio_engine.update_health()
+
             # Render UI
             frame = ui_renderer.render(frame, gesture_states, dj_controller, hands)
 
@@ -108,6 +137,17 @@ def main():
                 dj_controller.next_track('left')
             elif key == ord('m'):
                 dj_controller.next_track('right')
+            elif key == ord('s'):
+                dj_controller.toggle_sync('left')
+            elif key == ord('r'):
+                if dj_controller.recorder is None:
+                    dj_controller.start_recording()
+                else:
+                    dj_controller.stop_recording()
+            elif key in STEM_SOLO_KEYS:
+                dj_controller.toggle_stem_solo(*STEM_SOLO_KEYS[key])
+            elif key in EFFECT_KEYS:
+                dj_controller.trigger_effect(*EFFECT_KEYS[key])
 
     except KeyboardInterrupt:
         print("\nShutting down...")
@@ -116,6 +156,10 @@ def main():
         cap.release()
         cv2.destroyAllWindows()
         hand_tracker.close()
+        dj_controller.stop_recording()
+        print(f"Sampler: {dj_controller.get_sampler_info()}")
+        print(f"Analysis feed: {audio_engine.analysis.stats()}")
+        print(f"Audio output: {audio_engine.get_health()}")
         audio_engine.close()
         print("Goodbye!")
 
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Offline mix renderer.
+
+Replays a session timeline (timeline.py) through AudioEngine without sound
+hardware and writes the mix to a 16-bit WAV as fast as the CPU allows.
+Timelines come from recorded DJController sessions (R in main.py), from
+hand-written JSON, or from a DJ Agent decision log (--agent-log).
+
+Rendering runs in OFFLINE_BLOCK-frame chunks, cut at event times so every
+event lands exactly on its frame. Stretches where every deck is stopped
+and all one-shots have finished split the timeline into independent
+segments; with --jobs they render in parallel processes, each writing its
+slice of the output file in place.
+
+Usage:
+    python offline_render.py sessions/session-20261019-201500.json -o mix.wav
+    python offline_render.py --agent-log ../gesture-dj/agent/logs/decisions.jsonl \\
+        --duration 300 -o agent_set.wav --jobs 4
+"""
+
+import argparse
+import json
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
+import config
+from audio_engine import AudioEngine
+from sampler import Sampler
+from timeline import apply_event, load_decision_log, load_timeline, make_event
+
+WAV_HEADER_BYTES = 44
+CHANNELS = 2
+
+
+def _write_wav(path: str, frames: int, sample_rate: int):
+    """Create a 16-bit stereo WAV of `frames` silent frames, ready to fill in place."""
+    data_bytes = frames * CHANNELS * 2
+    with open(path, 'wb') as f:
+        f.write(struct.pack(
+            '<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_bytes, b'WAVE', b'fmt ', 16, 1,
+            CHANNELS, sample_rate, sample_rate * CHANNELS * 2, CHANNELS * 2, 16,
+            b'data', data_bytes))
+        f.truncate(WAV_HEADER_BYTES + data_bytes)
+
+
+def _event_frame(event: dict) -> int:
+    return max(0, int(round(event['t'] * config.SAMPLE_RATE)))
+
+
+def plan_segments(events: List[dict], total_frames: int, tail_frames: int,
+                  count: int) -> List[Tuple[int, int]]:
+    """
+    Split [0, total_frames) into up to `count` independent segments.
+
+    A cut is only placed where no deck is playing or paused and the last
+    one-shot started at least `tail_frames` earlier: there, the state a
+    segment inherits is just its decks' controls, which the renderer
+    reconstructs exactly without rendering audio.
+    """
+    running = set()  # Decks holding a play position (playing or paused)
+    quiet_from = 0  # Frame from which no deck runs and no FX rings
+    windows = []  # [lo, hi) ranges where a cut is safe
+    last_fx_end = 0
+    for event in events:
+        frame = _event_frame(event)
+        op, deck = event['op'], event.get('deck')
+        if not running:
+            lo = max(quiet_from, last_fx_end)
+            if lo < frame:
+                windows.append((lo, frame))
+        was_running = bool(running)
+        if op == 'play':
+            running.add(deck)
+        elif op == 'stop':
+            running.discard(deck)
+        elif op == 'play_all':
+            running = {'left', 'right'}
+        elif op == 'stop_all':
+            running = set()
+        elif op == 'fx':
+            last_fx_end = frame + tail_frames
+        if was_running and not running:
+            quiet_from = frame
+    if not running:
+        lo = max(quiet_from, last_fx_end)
+        if lo < total_frames:
+            windows.append((lo, total_frames))
+
+    # One cut per ideal boundary, at the nearest safe frame
+    cuts = set()
+    for k in range(1, count):
+        ideal = total_frames * k // count
+        best = None
+        for lo, hi in windows:
+            frame = min(max(ideal, lo + 1), hi - 1)
+            if 0 < frame < total_frames and (best is None or abs(frame - ideal) < abs(best - ideal)):
+                best = frame
+        if best is not None:
+            cuts.add(best)
+    bounds = [0] + sorted(cuts) + [total_frames]
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def render_segment(events: List[dict], start: int, end: int, path: str,
+                   block: int = config.OFFLINE_BLOCK) -> dict:
+    """
+    Render frames [start, end) of the timeline into the WAV at `path`.
+
+    Events before `start` are applied to a fresh engine with its controls
+    advanced between them (no audio), then the segment renders in chunks
+    of up to `block` frames, split at event frames.
+    """
+    setup_start = time.perf_counter()
+    engine = AudioEngine(start_output=False, block_size=block)
+    frames = [_event_frame(e) for e in events]
+    i = pos = 0
+    while i < len(events) and frames[i] < start:
+        engine.advance_controls(frames[i] - pos)
+        pos = frames[i]
+        # One-shots before a cut have finished by it (see plan_segments)
+        if events[i]['op'] != 'fx':
+            apply_event(engine, events[i])
+        i += 1
+    engine.advance_controls(start - pos)
+    pos = start
+
+    out = np.memmap(path, dtype=np.int16, mode='r+', shape=(end - start, CHANNELS),
+                    offset=WAV_HEADER_BYTES + start * CHANNELS * 2)
+    buffer = np.empty((block, CHANNELS), dtype=np.float32)
+    peak = 0.0
+    clipped = 0
+    render_start = time.perf_counter()
+    while pos < end:
+        while i < len(events) and frames[i] <= pos:
+            apply_event(engine, events[i])
+            i += 1
+        n = min(block, end - pos)
+        if i < len(events):
+            n = min(n, frames[i] - pos)
+        chunk = buffer[:n]
+        engine.render(chunk)
+        magnitude = np.abs(chunk)
+        peak = max(peak, float(magnitude.max()))
+        clipped += int(np.count_nonzero(magnitude > 1.0))
+        np.clip(chunk, -1.0, 1.0, out=chunk)
+        np.multiply(chunk, 32767, out=out[pos - start:pos - start + n], casting='unsafe')
+        pos += n
+    out.flush()
+    del out
+    elapsed = time.perf_counter() - render_start
+    engine.close()
+
+    seconds = (end - start) / config.SAMPLE_RATE
+    return {
+        'start_s': round(start / config.SAMPLE_RATE, 3),
+        'rendered_s': round(seconds, 3),
+        'setup_s': round(render_start - setup_start, 3),
+        'elapsed_s': round(elapsed, 3),
+        'realtime_x': round(seconds / elapsed, 1) if elapsed else None,
+        'peak': peak,
+        'clipped_samples': clipped,
+    }
+
+
+def _fx_tail_frames(events: List[dict]) -> int:
+    """Frames a one-shot can ring after its trigger: longest effect plus quantize wait."""
+    sampler = Sampler.from_dir()
+    longest = int(sampler.lengths.max()) if len(sampler.lengths) else 0
+    quantize = max((float(e['args'][2]) for e in events
+                    if e['op'] == 'fx' and len(e.get('args', [])) > 2 and e['args'][2]),
+                   default=0.0)
+    # A beat is at most a second at >= 60 BPM
+    return longest + int(quantize * config.SAMPLE_RATE)
+
+
+def render(events: List[dict], duration_s: float, path: str, jobs: int = 1,
+           block: int = config.OFFLINE_BLOCK) -> dict:
+    """
+    Render a timeline to a WAV file.
+
+    Args:
+        events: Timeline events, sorted by t
+        duration_s: Length of the mix
+        path: Output WAV path
+        jobs: Worker processes (segments render in parallel when the
+            timeline has safe cut points)
+        block: Frames per render chunk
+
+    Returns:
+        Render report: speed as a real-time multiple, segments, peak, clipping
+    """
+    total = int(round(duration_s * config.SAMPLE_RATE))
+    start = time.perf_counter()
+    _write_wav(path, total, config.SAMPLE_RATE)
+    segments = plan_segments(events, total, _fx_tail_frames(events), jobs * 2) if jobs > 1 \
+        else [(0, total)]
+
+    if len(segments) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(render_segment, [events] * len(segments),
+                                    [a for a, _ in segments], [b for _, b in segments],
+                                    [path] * len(segments), [block] * len(segments)))
+    else:
+        results = [render_segment(events, 0, total, path, block)]
+    elapsed = time.perf_counter() - start
+
+    peak = max(r['peak'] for r in results)
+    return {
+        'output': path,
+        'rendered_s': round(duration_s, 2),
+        'elapsed_s': round(elapsed, 3),
+        'realtime_x': round(duration_s / elapsed, 1),
+        'jobs': min(jobs, len(segments)),
+        'segments': [{k: v for k, v in r.items() if k != 'peak'} for r in results],
+        'peak_dbfs': round(20 * np.log10(peak), 2) if peak > 0 else None,
+        'clipped_samples': sum(r['clipped_samples'] for r in results),
+    }
+
+
+def load_events(timeline_path: Optional[str], agent_log: Optional[str],
+                agent_offset_s: float) -> Tuple[List[dict], Optional[float]]:
+    """Timeline events plus converted agent decisions, merged in time order."""
+    events, duration = [], None
+    if timeline_path:
+        timeline = load_timeline(timeline_path)
+        events, duration = timeline['events'], timeline['duration']
+    elif agent_log:
+        # An agent log has no transport events; start both decks with the set
+        events = [make_event(agent_offset_s, 'play_all')]
+    if agent_log:
+        events += load_decision_log(agent_log, agent_offset_s)
+    return sorted(events, key=lambda e: e['t']), duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a DJ session timeline to WAV offline")
+    parser.add_argument('timeline', nargs='?', help="timeline JSON (recorded session or hand-written)")
+    parser.add_argument('-o', '--output', default='mix.wav', help="output WAV path")
+    parser.add_argument('--agent-log', help="DJ Agent decisions.jsonl to apply")
+    parser.add_argument('--agent-offset', type=float, default=0.0, metavar='SECONDS',
+                        help="timeline time of the agent's set minute 0")
+    parser.add_argument('--duration', type=float, metavar='SECONDS',
+                        help="mix length (default: timeline duration, else last event + tail)")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="worker processes for independent segments (0 = all cores)")
+    parser.add_argument('--block', type=int, default=config.OFFLINE_BLOCK,
+                        help="frames per render chunk")
+    args = parser.parse_args()
+    if not args.timeline and not args.agent_log:
+        parser.error("give a timeline and/or --agent-log")
+
+    events, duration = load_events(args.timeline, args.agent_log, args.agent_offset)
+    duration = args.duration or duration or (
+        (events[-1]['t'] if events else 0.0) + config.OFFLINE_TAIL_S)
+    jobs = args.jobs or os.cpu_count() or 1
+    print(json.dumps(render(events, duration, args.output, jobs, args.block), indent=2))
+
+
+if __name__ == '__main__':
+    main()
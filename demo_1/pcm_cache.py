@@ -0,0 +1,123 @@
+"""
+Decoded PCM cache.
+Decodes audio files once to int16 .npy files keyed by content hash and
+hands out read-only memory maps, so loading a track again is instant and
+shares pages between processes. Multi-stem tracks are cached as one
+interleaved (frames, 2, stems) array so a deck reads all stems at once.
+"""
+
+import hashlib
+import os
+import wave
+from pathlib import Path
+from typing import List
+import numpy as np
+import pygame
+import config
+
+
+def file_hash(path: Path) -> str:
+    """Content hash of a file (hex, 32 chars)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _decode_wav(path: Path, sample_rate: int):
+    """Decode 16-bit WAV at the target rate without touching the mixer (None otherwise)."""
+    try:
+        with wave.open(str(path), 'rb') as f:
+            if f.getsampwidth() != 2 or f.getframerate() != sample_rate:
+                return None
+            channels = f.getnchannels()
+            data = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    except (wave.Error, EOFError):
+        return None
+    data = data.reshape(-1, channels)
+    if channels == 1:
+        data = np.repeat(data, 2, axis=1)
+    return data[:, :2]
+
+
+def decode_file(path: Path, sample_rate: int = config.SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode an audio file to int16 stereo PCM.
+
+    Uses the wave module for plain 16-bit WAV and pygame's decoder for the
+    rest. Outside an initialized mixer (analysis workers) pygame runs with
+    the dummy audio driver.
+    """
+    pcm = _decode_wav(path, sample_rate) if path.suffix.lower() == '.wav' else None
+    if pcm is not None:
+        return pcm
+
+    if not pygame.mixer.get_init():
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        pygame.mixer.init(frequency=sample_rate, size=-16, channels=2)
+    freq, _, channels = pygame.mixer.get_init()
+    if freq != sample_rate:
+        raise ValueError(f"Mixer runs at {freq} Hz, expected {sample_rate} Hz")
+    pcm = pygame.sndarray.array(pygame.mixer.Sound(str(path)))
+    if pcm.ndim == 1:
+        pcm = pcm[:, None]
+    if channels == 1:
+        pcm = np.repeat(pcm, 2, axis=1)
+    return np.ascontiguousarray(pcm[:, :2], dtype=np.int16)
+
+
+def load_pcm(path: Path, digest: str = None, sample_rate: int = config.SAMPLE_RATE,
+             cache_dir: str = config.PCM_CACHE_DIR) -> np.ndarray:
+    """
+    Return a file's PCM as a read-only (frames, 2) int16 memory map.
+
+    Args:
+        path: Audio file
+        digest: file_hash(path) if already known
+        sample_rate: Decode rate
+        cache_dir: Where decoded .npy files live
+    """
+    path = Path(path)
+    digest = digest or file_hash(path)
+    cached = Path(cache_dir) / f"{digest}-{sample_rate}.npy"
+    if not cached.exists():
+        _save_atomic(cached, decode_file(path, sample_rate))
+    return np.load(cached, mmap_mode='r')
+
+
+def load_stems(paths: List[Path], digests: List[str] = None,
+               sample_rate: int = config.SAMPLE_RATE,
+               cache_dir: str = config.PCM_CACHE_DIR) -> np.ndarray:
+    """
+    Return stems as one read-only (frames, 2, len(paths)) int16 memory map.
+
+    Stems are zero-padded to the longest one. The combined array is cached
+    under a hash of the stem hashes, so the interleave runs once per set.
+
+    Args:
+        paths: Stem files, in mixer order
+        digests: file_hash() of each path if already known
+        sample_rate: Decode rate
+        cache_dir: Where decoded .npy files live
+    """
+    paths = [Path(p) for p in paths]
+    digests = [d or file_hash(p) for p, d in zip(paths, digests or [None] * len(paths))]
+    combined = hashlib.blake2b('|'.join(digests).encode(), digest_size=16).hexdigest()
+    cached = Path(cache_dir) / f"{combined}-{sample_rate}-stems{len(paths)}.npy"
+    if not cached.exists():
+        stems = [load_pcm(p, d, sample_rate, cache_dir) for p, d in zip(paths, digests)]
+        interleaved = np.zeros((max(len(s) for s in stems), 2, len(stems)), dtype=np.int16)
+        for i, stem in enumerate(stems):
+            interleaved[:len(stem), :, i] = stem
+        _save_atomic(cached, interleaved)
+    return np.load(cached, mmap_mode='r')
+
+
+def _save_atomic(path: Path, data: np.ndarray):
+    """Write an .npy via a temp file so readers never see a partial array."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        np.save(f, data)
+    os.replace(tmp, path)
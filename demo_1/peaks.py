@@ -0,0 +1,90 @@
+"""
+Waveform peak pyramids.
+
+A pyramid summarizes a track's mono mix as min/max/RMS bins at
+power-of-two zoom levels (file format: peaks_format.py, shared with
+web/peaks.py). Built once per file by the track index workers, so
+drawing never touches the audio: a view picks the level whose bins are
+just finer than a pixel and reads at most a few bins per pixel,
+O(pixels) at any zoom.
+"""
+
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+import config
+from peaks_format import decode_peaks, encode_peaks
+
+
+def peaks_path(digest: str) -> Path:
+    return Path(config.PEAKS_DIR) / f"{digest}.peaks"
+
+
+def write_peaks(path: Path, pcm: np.ndarray, sample_rate: int = config.SAMPLE_RATE):
+    """Encode and write a pyramid atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_bytes(encode_peaks(pcm, sample_rate, config.PEAKS_BASE))
+    tmp.replace(path)
+
+
+class PeakPyramid:
+    """Read-only view of a pyramid file (memory-mapped)."""
+
+    def __init__(self, path: Path):
+        try:
+            header, self.levels = decode_peaks(np.memmap(path, dtype=np.uint8, mode='r'))
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}") from e
+        self.sample_rate, self.frames, self.base, self.peak = header
+
+    def columns(self, start: float, end: float, width: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Min, max and RMS (full scale) per pixel column for frames [start, end).
+
+        Frames outside the track read as silence.
+        """
+        spp = max((end - start) / width, 1e-9)
+        level = min(max(int(np.log2(max(spp / self.base, 1.0))), 0), len(self.levels) - 1)
+        bins = self.levels[level]
+        size = self.base << level
+        edges = (start + np.arange(width + 1) * spp) / size
+        lo = np.floor(edges[:-1]).astype(np.int64)
+        hi = np.maximum(np.ceil(edges[1:]).astype(np.int64), lo + 1)  # Bins [lo, hi) touch the column
+        inside = (lo >= 0) & (lo < len(bins))
+        first = np.clip(lo, 0, len(bins) - 1)
+        last = np.clip(hi - 1, 0, len(bins) - 1)
+
+        mins = bins['min'][first].astype(np.float32)
+        maxs = bins['max'][first].astype(np.float32)
+        rms = bins['rms'][first].astype(np.float32)
+        # At the chosen level a column spans only a few bins
+        for k in range(1, int((hi - lo).max())):
+            idx = np.minimum(first + k, last)
+            np.minimum(mins, bins['min'][idx], out=mins)
+            np.maximum(maxs, bins['max'][idx], out=maxs)
+            np.maximum(rms, bins['rms'][idx], out=rms)
+        mins[~inside] = maxs[~inside] = rms[~inside] = 0.0
+        return mins * (self.peak / 127), maxs * (self.peak / 127), rms * (self.peak / 255)
+
+
+def open_peaks(digest: Optional[str]) -> Optional[PeakPyramid]:
+    """The pyramid for a content hash, or None if it hasn't been built."""
+    if not digest:
+        return None
+    try:
+        return PeakPyramid(peaks_path(digest))
+    except (OSError, ValueError):
+        return None
+
+
+def envelope(pyramids: List[PeakPyramid], start: float, end: float,
+             width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Combined min/max per column of several stems (outer envelope)."""
+    lo = np.zeros(width, dtype=np.float32)
+    hi = np.zeros(width, dtype=np.float32)
+    for pyramid in pyramids:
+        mins, maxs, _ = pyramid.columns(start, end, width)
+        np.minimum(lo, mins, out=lo)
+        np.maximum(hi, maxs, out=hi)
+    return lo, hi
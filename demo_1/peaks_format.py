@@ -0,0 +1,113 @@
+"""
+PEAK file format: waveform peak pyramids, shared by the desktop booth
+(peaks.py) and the web server (web/peaks.py), which imports this module
+from here. The browser reader is web/static/js/waveform.js.
+
+A pyramid summarizes a track's mono mix as min/max/RMS bins at
+power-of-two zoom levels: level 0 bins cover `base` samples and each
+level above merges pairs of bins.
+
+File layout (little-endian):
+    magic b'PEAK' | version u8 | channels u8 (1 = mono mix) | reserved u16
+    | sample_rate u32 | frames u64 | base u32 | levels u32 | peak f32
+    | levels x (offset u32, bins u32)
+    | per level: bins x (min i8, max i8, rms u8)
+Bins are scaled so the file's peak maps to 127 (RMS to 255), keeping
+detail for quiet stems; multiply by peak / 127 (peak / 255) for full scale.
+
+Only NumPy is needed here, so either side can import it.
+"""
+
+import struct
+from typing import List, NamedTuple
+import numpy as np
+
+PEAKS_MAGIC = b'PEAK'
+PEAKS_VERSION = 1
+PEAKS_HEADER = struct.Struct('<4sBBHIQIIf')
+LEVEL_ENTRY = struct.Struct('<II')
+BIN_DTYPE = np.dtype([('min', 'i1'), ('max', 'i1'), ('rms', 'u1')])
+PEAKS_BASE = 256  # Samples per bin at the finest zoom level
+CHUNK_BINS = 4096  # Level-0 bins computed per pass (bounds memory)
+
+
+class PeaksHeader(NamedTuple):
+    sample_rate: int
+    frames: int
+    base: int
+    peak: float
+
+
+def encode_peaks(pcm: np.ndarray, sample_rate: int, base: int = PEAKS_BASE) -> bytes:
+    """Build the pyramid file for (frames, channels) int16 PCM."""
+    frames = len(pcm)
+    count = max(1, -(-frames // base))
+    mins = np.zeros(count, dtype=np.float32)
+    maxs = np.zeros(count, dtype=np.float32)
+    power = np.zeros(count, dtype=np.float32)
+    step = CHUNK_BINS * base
+    for first in range(0, frames, step):
+        chunk = pcm[first:first + step].mean(axis=1, dtype=np.float32) / 32768.0
+        bins = -(-len(chunk) // base)
+        padded = np.zeros(bins * base, dtype=np.float32)
+        padded[:len(chunk)] = chunk
+        blocks = padded.reshape(bins, base)
+        at = first // base
+        mins[at:at + bins] = blocks.min(axis=1)
+        maxs[at:at + bins] = blocks.max(axis=1)
+        power[at:at + bins] = np.einsum('ij,ij->i', blocks, blocks) / base
+
+    levels = [(mins, maxs, power)]
+    while len(levels[-1][0]) > 1:
+        lo, hi, ms = levels[-1]
+        if len(lo) % 2:
+            lo, hi, ms = np.append(lo, lo[-1]), np.append(hi, hi[-1]), np.append(ms, ms[-1])
+        levels.append((np.minimum(lo[0::2], lo[1::2]), np.maximum(hi[0::2], hi[1::2]),
+                       (ms[0::2] + ms[1::2]) * 0.5))
+
+    peak = float(max(-mins.min(), maxs.max(), 1e-9))
+    header_size = PEAKS_HEADER.size + LEVEL_ENTRY.size * len(levels)
+    table, body = [], []
+    offset = header_size
+    for lo, hi, ms in levels:
+        record = np.empty(len(lo), dtype=BIN_DTYPE)
+        # Round outward so the drawn envelope never clips a transient
+        record['min'] = np.clip(np.floor(lo * (127 / peak)), -127, 127)
+        record['max'] = np.clip(np.ceil(hi * (127 / peak)), -127, 127)
+        record['rms'] = np.clip(np.round(np.sqrt(ms) * (255 / peak)), 0, 255)
+        table.append(LEVEL_ENTRY.pack(offset, len(record)))
+        body.append(record.tobytes())
+        offset += record.nbytes
+    header = PEAKS_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, 1, 0, sample_rate, frames,
+                               base, len(levels), peak)
+    return header + b''.join(table) + b''.join(body)
+
+
+def decode_peaks(data) -> tuple:
+    """
+    Header and level arrays of a pyramid file (bytes, or a uint8 array such
+    as a memmap; the levels are views into it).
+
+    Returns:
+        (PeaksHeader, [BIN_DTYPE array per level, finest first])
+
+    Raises:
+        ValueError: Not a PEAK file of this version, or truncated
+    """
+    data = np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray)) else data
+    try:
+        (magic, version, _, _, sample_rate, frames, base, count,
+         peak) = PEAKS_HEADER.unpack_from(data)
+        if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+            raise ValueError("not a peaks file")
+        table = [LEVEL_ENTRY.unpack_from(data, PEAKS_HEADER.size + i * LEVEL_ENTRY.size)
+                 for i in range(count)]
+    except struct.error as e:
+        raise ValueError(f"truncated peaks file: {e}") from e
+    levels: List[np.ndarray] = []
+    for i, (offset, bins) in enumerate(table):
+        end = offset + bins * BIN_DTYPE.itemsize
+        if end > len(data):
+            raise ValueError(f"level {i} runs past the end of the file")
+        levels.append(data[offset:end].view(BIN_DTYPE))
+    return PeaksHeader(sample_rate, frames, base, peak), levels
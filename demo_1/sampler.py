@@ -0,0 +1,210 @@
+"""
+One-shot effects sampler.
+Pre-decodes every effect file into one contiguous float32 pool at startup
+and plays them as voices mixed into the engine's output block, with a
+polyphony limit, oldest-voice stealing and optional beat quantization.
+"""
+
+import collections
+import math
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+import config
+from pcm_cache import load_pcm
+
+
+class LatencyStats:
+    """Rolling trigger-to-sound latencies (ms)."""
+
+    def __init__(self, window: int = 256):
+        self.samples = collections.deque(maxlen=window)
+
+    def record(self, latency_s: float):
+        self.samples.append(latency_s * 1000.0)
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {'count': 0}
+        values = np.fromiter(self.samples, dtype=np.float64)
+        return {
+            'count': len(values),
+            'p50_ms': round(float(np.percentile(values, 50)), 2),
+            'p95_ms': round(float(np.percentile(values, 95)), 2),
+            'max_ms': round(float(values.max()), 2),
+        }
+
+
+class Sampler:
+    """
+    Polyphonic one-shot player over a pre-decoded sample pool.
+
+    trigger() may be called from any thread: it appends to a deque (atomic
+    under the GIL) which render() drains at the start of each block, so a
+    trigger is rendered in the very next audio block. Voice state lives in
+    preallocated arrays owned by the audio thread.
+    """
+
+    def __init__(self, paths: List[Path], max_voices: int = config.SAMPLER_VOICES,
+                 voices_per_sample: int = config.SAMPLER_VOICES_PER_SAMPLE,
+                 gain: float = config.SAMPLER_GAIN, max_block: int = config.AUDIO_BUFFER,
+                 output_latency_s: float = 0.0):
+        """
+        Args:
+            paths: Effect files; sample ids are their positions in this list
+            max_voices: Total polyphony
+            voices_per_sample: Polyphony per sample (retriggers steal the oldest)
+            gain: Output gain for all voices
+            max_block: Largest block render() will be asked for
+            output_latency_s: Device buffering after render (added to latency stats)
+        """
+        self.names = [Path(p).stem for p in paths]
+        clips = [np.asarray(load_pcm(p), dtype=np.float32) / 32768.0 for p in paths]
+        lengths = [len(c) for c in clips]
+        self.offsets = np.cumsum([0] + lengths[:-1]).astype(np.int64)
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.pool = np.concatenate(clips) if clips else np.zeros((0, 2), dtype=np.float32)
+        self.gain = gain
+        self.voices_per_sample = voices_per_sample
+        self.output_latency_s = output_latency_s
+
+        # Voice table (audio thread only)
+        self._active = np.zeros(max_voices, dtype=bool)
+        self._sample = np.zeros(max_voices, dtype=np.int64)
+        self._pos = np.zeros(max_voices, dtype=np.int64)  # Frames played
+        self._delay = np.zeros(max_voices, dtype=np.int64)  # Frames until start
+        self._started_at = np.zeros(max_voices, dtype=np.int64)  # Block counter
+        self._velocity = np.ones(max_voices, dtype=np.float32)
+        self._trigger_time = np.zeros(max_voices, dtype=np.float64)
+        self._scratch = np.empty((max_block, 2), dtype=np.float32)
+
+        self._pending: collections.deque = collections.deque()
+        self._blocks = 0
+        self.sample_rate = config.SAMPLE_RATE
+        self.latency = LatencyStats()
+        self.steals = 0
+        self.unquantized = 0  # Quantized triggers played immediately (no beat grid)
+
+    @classmethod
+    def from_dir(cls, directory: str = config.EFFECTS_DIR, **kwargs) -> 'Sampler':
+        """Load every supported audio file in `directory`, sorted by name."""
+        paths = sorted(p for p in Path(directory).glob('*')
+                       if p.suffix.lower() in config.SUPPORTED_EXTENSIONS and p.is_file())
+        sampler = cls(paths, **kwargs)
+        if paths:
+            seconds = len(sampler.pool) / config.SAMPLE_RATE
+            print(f"Sampler: {len(paths)} effects pre-decoded ({seconds:.1f}s, "
+                  f"{sampler.pool.nbytes / 1e6:.1f} MB)")
+        else:
+            print(f"Sampler: no effects found in {directory}")
+        return sampler
+
+    def trigger(self, sample_id: int, velocity: float = 1.0, quantize: Optional[float] = None):
+        """
+        Queue a one-shot (safe from any thread).
+
+        Args:
+            sample_id: Index into the loaded effects
+            velocity: Voice gain (0-1)
+            quantize: Start on the next multiple of this many beats (None = now)
+        """
+        if 0 <= sample_id < len(self.lengths):
+            self._pending.append((sample_id, velocity, quantize, time.perf_counter()))
+
+    def _allocate(self, sample_id: int) -> int:
+        """Free voice for sample_id, stealing the oldest if over a limit."""
+        same = np.flatnonzero(self._active & (self._sample == sample_id))
+        if len(same) >= self.voices_per_sample:
+            self.steals += 1
+            return int(same[np.argmin(self._started_at[same])])
+        free = np.flatnonzero(~self._active)
+        if len(free):
+            return int(free[0])
+        self.steals += 1
+        return int(np.argmin(self._started_at))
+
+    def _start_pending(self, beat_clock: Optional[Tuple[float, float]]):
+        """Assign queued triggers to voices (audio thread)."""
+        while self._pending:
+            sample_id, velocity, quantize, trigger_time = self._pending.popleft()
+            delay = 0
+            if quantize:
+                if beat_clock is None:
+                    self.unquantized += 1  # No grid to quantize to; play it now instead
+                else:
+                    beat, frames_per_beat = beat_clock
+                    target = math.ceil(beat / quantize) * quantize
+                    delay = int(round((target - beat) * frames_per_beat))
+            voice = self._allocate(sample_id)
+            self._active[voice] = True
+            self._sample[voice] = sample_id
+            self._pos[voice] = 0
+            self._delay[voice] = delay
+            self._started_at[voice] = self._blocks
+            self._velocity[voice] = velocity
+            # Quantized voices are late on purpose; only measure immediate ones
+            self._trigger_time[voice] = 0.0 if quantize and beat_clock else trigger_time
+
+    def render(self, out: np.ndarray, beat_clock: Optional[Tuple[float, float]] = None):
+        """
+        Mix active voices into `out` (audio thread).
+
+        Args:
+            out: (frames, 2) float32 block, added to in place
+            beat_clock: (current beat, output frames per beat) of the master
+                deck, for quantized triggers
+        """
+        self._blocks += 1
+        if self._pending:
+            self._start_pending(beat_clock)
+        if not self._active.any():
+            return
+
+        n = len(out)
+        render_time = time.perf_counter()
+        for voice in range(len(self._active)):
+            if not self._active[voice]:
+                continue
+            delay = int(self._delay[voice])
+            if delay >= n:
+                self._delay[voice] = delay - n
+                continue
+            self._delay[voice] = 0
+            if self._trigger_time[voice]:
+                # Wait for this block, plus the voice's offset into it, plus
+                # device buffering between render and playback
+                self.latency.record(render_time - self._trigger_time[voice]
+                                    + delay / self.sample_rate + self.output_latency_s)
+                self._trigger_time[voice] = 0.0
+
+            sample_id = self._sample[voice]
+            pos = int(self._pos[voice])
+            remaining = int(self.lengths[sample_id]) - pos
+            frames = min(n - delay, remaining)
+            start = int(self.offsets[sample_id]) + pos
+            scratch = self._scratch[:frames]
+            np.multiply(self.pool[start:start + frames], self._velocity[voice] * self.gain,
+                        out=scratch)
+            out[delay:delay + frames] += scratch
+            if frames == remaining:
+                self._active[voice] = False
+            else:
+                self._pos[voice] = pos + frames
+
+    @property
+    def has_pending(self) -> bool:
+        """True if triggers are waiting for the next block."""
+        return bool(self._pending)
+
+    @property
+    def active_voices(self) -> int:
+        return int(self._active.sum())
+
+    def stats(self) -> dict:
+        return {
+            'voices': self.active_voices,
+            'steals': self.steals,
+            'unquantized': self.unquantized,
+            'latency': self.latency.summary(),
+        }
@@ -0,0 +1,67 @@
+"""Round-trip check of the PEAK format — encode, read the level table back, compare the bins."""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+from peaks_format import BIN_DTYPE, LEVEL_ENTRY, PEAKS_HEADER, decode_peaks, encode_peaks
+
+
+def expected_level(mono: np.ndarray, base: int, level: int, peak: float):
+    """Quantized min/max of each bin straight from the samples, and which bins are full."""
+    size = base << level
+    bins = -(-len(mono) // size)
+    padded = np.zeros(bins * size, dtype=np.float32)
+    padded[:len(mono)] = mono  # Past the end is silence, as in level 0
+    blocks = padded.reshape(bins, size)
+    mins = np.clip(np.floor(blocks.min(axis=1) * (127 / peak)), -127, 127)
+    maxs = np.clip(np.ceil(blocks.max(axis=1) * (127 / peak)), -127, 127)
+    rms = np.clip(np.round(np.sqrt((blocks ** 2).mean(axis=1)) * (255 / peak)), 0, 255)
+    full = (np.arange(bins) + 1) * size <= -(-len(mono) // base) * base
+    return mins, maxs, rms, full
+
+
+def check(frames: int, base: int = 256, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    pcm = (rng.standard_normal((frames, 2)) * 6000).clip(-32768, 32767).astype(np.int16)
+    data = encode_peaks(pcm, 44100, base)
+    header, levels = decode_peaks(data)
+    assert header.sample_rate == 44100 and header.frames == frames and header.base == base
+
+    mono = pcm.mean(axis=1, dtype=np.float32) / 32768.0
+    assert np.isclose(header.peak, max(-mono.min(), mono.max(), 1e-9), rtol=1e-6)
+    assert len(levels[-1]) == 1, "pyramid must end in a single bin"
+    offset = PEAKS_HEADER.size + LEVEL_ENTRY.size * len(levels)
+    for level, bins in enumerate(levels):
+        # The level table packs the levels back to back after the header
+        assert LEVEL_ENTRY.unpack_from(data, PEAKS_HEADER.size + level * LEVEL_ENTRY.size) \
+            == (offset, len(bins))
+        offset += len(bins) * BIN_DTYPE.itemsize
+        mins, maxs, rms, full = expected_level(mono, base, level, header.peak)
+        assert len(bins) == len(mins), (level, len(bins), len(mins))
+        assert (bins['min'] == mins).all(), f"min differs at level {level}"
+        assert (bins['max'] == maxs).all(), f"max differs at level {level}"
+        # RMS averages pairs of bins (float32 rounding: one step either way), and
+        # a level's odd last bin is paired with itself, so compare full bins only
+        assert np.abs(bins['rms'][full].astype(int) - rms[full]).max(initial=0) <= 1, \
+            f"rms differs at level {level}"
+    assert offset == len(data), "file has trailing bytes"
+
+    try:
+        decode_peaks(data[:offset - 1])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("truncated file decoded")
+
+
+def test():
+    for frames in (1, 255, 256, 257, 256 * 4096 + 3, 1_000_000):
+        check(frames)
+    check(10_000, base=64)
+    print("✅ PEAK format: encode/decode round trip OK")
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,189 @@
+"""
+Session timelines - replayable deck/track/tempo/volume/FX operations.
+
+Every change DJController makes to the engine goes through apply_event(),
+so a live session can be recorded as a list of events and replayed
+offline with the same effect. A timeline file is JSON:
+
+    {"duration": 312.5,
+     "events": [{"t": 0.0, "op": "load", "deck": "left", "args": [0]},
+                {"t": 0.0, "op": "play", "deck": "left"},
+                {"t": 12.3, "op": "volume", "deck": "left", "args": [0.55]},
+                {"t": 30.0, "op": "fx", "args": [2, 1.0, 1.0]}]}
+
+`t` is seconds on the audio clock (frames rendered since the recording
+started), so events land on the same block boundaries when replayed.
+"""
+
+import json
+from pathlib import Path
+from typing import List, Optional
+import config
+
+# Ops on one deck: event["deck"] selects it
+DECK_OPS = {
+    'load': lambda deck, index: deck.load_track(int(index)),
+    'next_track': lambda deck: deck.next_track(),
+    'play': lambda deck: deck.play(),
+    'stop': lambda deck: deck.stop(),
+    'pause': lambda deck: deck.pause(),
+    'unpause': lambda deck: deck.unpause(),
+    'seek': lambda deck, seconds: setattr(deck, 'position', float(seconds) * config.SAMPLE_RATE),
+    'volume': lambda deck, volume: deck.set_volume(float(volume)),
+    'tempo': lambda deck, tempo: deck.set_tempo(float(tempo)),
+    'stem_level': lambda deck, stem, level: deck.set_stem_level(stem, float(level)),
+    'stem_mute': lambda deck, stem, muted: deck.set_stem_mute(stem, bool(muted)),
+    'stem_solo': lambda deck, stem, soloed: deck.set_stem_solo(stem, bool(soloed)),
+}
+
+
+def apply_agent_action(engine, action: dict):
+    """
+    Apply one DJ Agent action the booth understands (others are ignored).
+
+    set_stem: {"stem": name, "state": "mute"|"solo"|"on",
+               "deck": "left"|"right"|"both" (default both)}
+    """
+    if not isinstance(action, dict) or action.get('type') != 'set_stem':
+        return
+    value = action.get('value')
+    if not isinstance(value, dict):
+        return
+    stem = str(value.get('stem', '')).lower()
+    mode = value.get('state', 'on')
+    deck_ids = ['left', 'right'] if value.get('deck', 'both') == 'both' else [value.get('deck')]
+    for deck_id in deck_ids:
+        deck = engine.get_deck(deck_id)
+        if deck is None or stem not in deck.stem_names:
+            continue
+        deck.set_stem_mute(stem, mode == 'mute')
+        deck.set_stem_solo(stem, mode == 'solo')
+
+
+# Ops on the engine as a whole
+ENGINE_OPS = {
+    'play_all': lambda engine: engine.play_all(),
+    'stop_all': lambda engine: engine.stop_all(),
+    'sync': lambda engine, enabled, master=None: engine.set_sync(bool(enabled), master),
+    'fx': lambda engine, index, velocity=1.0, quantize=None: engine.sampler.trigger(
+        int(index), float(velocity), quantize),
+    'agent': apply_agent_action,
+}
+
+# Ops whose last argument is a continuous value (recorded only when it moves)
+CONTINUOUS_OPS = ('volume', 'tempo', 'stem_level')
+
+
+def make_event(t: float, op: str, deck: Optional[str] = None, args=()) -> dict:
+    event = {'t': round(t, 6), 'op': op}
+    if deck is not None:
+        event['deck'] = deck
+    if args:
+        event['args'] = list(args)
+    return event
+
+
+def apply_event(engine, event: dict):
+    """Apply one timeline event to an AudioEngine."""
+    op = event['op']
+    args = event.get('args', [])
+    if op in DECK_OPS:
+        deck = engine.get_deck(event.get('deck'))
+        if deck is None:
+            raise ValueError(f"event {op!r} needs a valid deck, got {event.get('deck')!r}")
+        DECK_OPS[op](deck, *args)
+    elif op in ENGINE_OPS:
+        ENGINE_OPS[op](engine, *args)
+    else:
+        raise ValueError(f"unknown timeline op {op!r}")
+
+
+def snapshot_events(engine) -> List[dict]:
+    """Events at t=0 that recreate the engine's current deck state."""
+    events = []
+    for deck_id, deck in engine.decks.items():
+        if deck.player is None:
+            continue
+        events.append(make_event(0.0, 'load', deck_id, [deck.current_track_index]))
+        events.append(make_event(0.0, 'volume', deck_id, [deck.controls['volume'].target]))
+        events.append(make_event(0.0, 'tempo', deck_id, [deck.controls['tempo'].target]))
+        for stem in deck.get_stem_states():
+            if stem['level'] != 1.0:
+                events.append(make_event(0.0, 'stem_level', deck_id, [stem['name'], stem['level']]))
+            if stem['muted']:
+                events.append(make_event(0.0, 'stem_mute', deck_id, [stem['name'], True]))
+            if stem['soloed']:
+                events.append(make_event(0.0, 'stem_solo', deck_id, [stem['name'], True]))
+        if deck.is_playing or deck.is_paused:
+            events.append(make_event(0.0, 'play', deck_id))
+            events.append(make_event(0.0, 'seek', deck_id,
+                                     [round(deck.position / config.SAMPLE_RATE, 6)]))
+            if deck.is_paused:
+                events.append(make_event(0.0, 'pause', deck_id))
+    if engine.sync_enabled:
+        events.append(make_event(0.0, 'sync', None, [True, engine.sync_master]))
+    return events
+
+
+class SessionRecorder:
+    """Collects the operations applied to an engine, timed on its audio clock."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.start_frame = engine.frames_rendered
+        self.events = snapshot_events(engine)
+        self._last = {}  # (op, deck, leading args) -> last recorded value
+
+    @property
+    def elapsed_s(self) -> float:
+        return (self.engine.frames_rendered - self.start_frame) / config.SAMPLE_RATE
+
+    def record(self, op: str, deck: Optional[str] = None, args=()):
+        """Append an event; continuous values that haven't moved are skipped."""
+        if op in CONTINUOUS_OPS:
+            key = (op, deck, tuple(args[:-1]))
+            last = self._last.get(key)
+            if last is not None and abs(args[-1] - last) <= config.CONTROL_EPSILON:
+                return
+            self._last[key] = args[-1]
+        self.events.append(make_event(self.elapsed_s, op, deck, args))
+
+    def save(self, path: str) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            'duration': round(self.elapsed_s, 3),
+            'sample_rate': config.SAMPLE_RATE,
+            'events': self.events,
+        }, indent=1))
+        return path
+
+
+def load_timeline(path: str) -> dict:
+    """Read a timeline file: {"duration": seconds or None, "events": [...] sorted by t}."""
+    data = json.loads(Path(path).read_text())
+    if isinstance(data, list):
+        data = {'events': data}
+    events = sorted(data.get('events', []), key=lambda e: e['t'])
+    return {'duration': data.get('duration'), 'events': events}
+
+
+def load_decision_log(path: str, offset_s: float = 0.0) -> List[dict]:
+    """
+    Turn a DJ Agent decision log (decisions.jsonl) into 'agent' events.
+
+    Args:
+        path: JSONL written by the agent's DecisionLog
+        offset_s: Timeline time of the agent's set minute 0
+    """
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            t = offset_s + float(entry.get('timestamp_min', 0.0)) * 60.0
+            for action in entry.get('actions', []):
+                events.append(make_event(t, 'agent', None, [action]))
+    return events
@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+"""
+Track Index - offline beat-grid / BPM / key / energy / loudness analysis for
+the music library.
+
+Scans the music folder with a process pool, analyzes each new or changed
+file once, and stores results in SQLite keyed by content hash. Re-scans only
+hash files whose size or mtime changed and only analyze unseen hashes.
+Loudness is BS.1770 integrated loudness (LUFS) and 4x-oversampled true
+peak; decks turn it into a fixed normalization gain at load. Workers also
+write each file's waveform peak pyramid (peaks.py). While the
+booth runs, a watcher thread rescans the library so newly generated tracks
+are analyzed before they are loaded.
+
+Usage:
+    python track_index.py                  # scan config.MUSIC_DIR
+    python track_index.py --workers 4 --music-dir ../music
+"""
+
+import argparse
+import os
+import math
+import multiprocessing
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import config
+from dsp import sos_filter, upsample
+from pcm_cache import file_hash, load_pcm
+from peaks import peaks_path, write_peaks
+
+HOP = 512
+FRAME = 2048
+CHUNK_FRAMES = 1024  # STFT frames per analysis chunk (bounds memory)
+MIN_BPM = 70
+MAX_BPM = 180
+
+# BS.1770 gating: 400 ms blocks every 100 ms, absolute and relative gates
+LOUDNESS_STEP_S = 0.1
+LOUDNESS_BLOCK_STEPS = 4
+LOUDNESS_ABS_GATE = -70.0
+LOUDNESS_REL_GATE = -10.0
+TRUE_PEAK_OVERSAMPLE = 4
+LOUDNESS_CHUNK_STEPS = 64  # 100 ms steps filtered per chunk (bounds memory)
+
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+# Krumhansl-Schmuckler key profiles
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    hash TEXT PRIMARY KEY,
+    duration_s REAL,
+    bpm REAL,
+    beat_offset_s REAL,
+    key TEXT,
+    energy BLOB,
+    analyzed_at REAL,
+    lufs REAL,
+    true_peak_db REAL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    hash TEXT
+);
+"""
+
+
+@dataclass
+class TrackInfo:
+    """Analysis results for one audio file."""
+    hash: str
+    path: str
+    duration_s: float
+    bpm: float
+    beat_offset_s: float  # time of the first beat of the grid
+    key: str
+    energy: np.ndarray  # RMS per second, float16
+    lufs: Optional[float] = None  # Integrated loudness
+    true_peak_db: Optional[float] = None  # dBTP
+
+    def beat_position(self, seconds: float) -> float:
+        """Beat number (fractional) at a playback time in the track."""
+        return (seconds - self.beat_offset_s) * self.bpm / 60.0
+
+    def beat_time(self, beat: float) -> float:
+        """Playback time (s) of a beat number."""
+        return self.beat_offset_s + beat * 60.0 / self.bpm
+
+
+def _spectral_features(mono: np.ndarray, sample_rate: int):
+    """Onset-strength envelope and pitch-class energy from a chunked STFT."""
+    window = np.hanning(FRAME).astype(np.float32)
+    freqs = np.fft.rfftfreq(FRAME, 1.0 / sample_rate)
+    tonal = (freqs >= 55) & (freqs <= 2000)
+    pitch = (np.round(12 * np.log2(freqs[tonal] / 440.0)).astype(int) + 9) % 12
+
+    n_frames = max(0, 1 + (len(mono) - FRAME) // HOP)
+    onset = np.zeros(n_frames, dtype=np.float32)
+    chroma = np.zeros(12)
+    frames = np.lib.stride_tricks.sliding_window_view(mono, FRAME)[::HOP]
+    prev = None
+    for start in range(0, n_frames, CHUNK_FRAMES):
+        mag = np.abs(np.fft.rfft(frames[start:start + CHUNK_FRAMES] * window, axis=1))
+        log_mag = np.log1p(mag)
+        if prev is None:
+            prev = log_mag[0]
+        shifted = np.vstack([prev[None, :], log_mag[:-1]])
+        onset[start:start + len(mag)] = np.maximum(0, log_mag - shifted).sum(axis=1)
+        prev = log_mag[-1]
+        chroma += np.bincount(pitch, weights=mag[:, tonal].sum(axis=0), minlength=12)
+    return onset, chroma
+
+
+def estimate_tempo(onset: np.ndarray, frame_rate: float):
+    """
+    BPM and first-beat frame from an onset envelope.
+
+    A comb over autocorrelation lags picks the period (with a log-normal
+    prior around 120 BPM to settle octave ambiguity); a comb over phases
+    picks the grid offset.
+    """
+    if len(onset) < 4:
+        return 120.0, 0.0
+    env = onset - np.convolve(onset, np.ones(16) / 16, mode='same')
+    env = np.maximum(env, 0)
+    n = len(env)
+    spectrum = np.fft.rfft(env, 2 * n)
+    ac = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+
+    min_lag = int(60 * frame_rate / MAX_BPM)
+    max_lag = min(n - 1, int(60 * frame_rate / MIN_BPM) + 1)
+    if max_lag <= min_lag + 1:
+        return 120.0, 0.0
+    lags = np.arange(min_lag, max_lag)
+    bpms = 60 * frame_rate / lags
+    prior = np.exp(-0.5 * (np.log2(bpms / 120.0) / 0.9) ** 2)
+    # Sum the autocorrelation over the first few multiples of each lag so a
+    # true beat period beats 3:2 look-alikes that only line up with offbeats
+    comb = np.zeros(len(lags))
+    for k in range(1, 5):
+        multiple = lags * k
+        comb += np.where(multiple < n, ac[np.minimum(multiple, n - 1)], 0)
+    scores = comb * prior
+    i = int(np.argmax(scores))
+
+    # Parabolic refinement of the peak lag
+    lag = float(lags[i])
+    if 0 < i < len(scores) - 1:
+        a, b, c = scores[i - 1], scores[i], scores[i + 1]
+        denom = a - 2 * b + c
+        if denom != 0:
+            lag += 0.5 * (a - c) / denom
+    bpm = 60 * frame_rate / lag
+
+    beats = np.arange(0, n - lag, lag)
+    best_phase, best_score = 0.0, -1.0
+    for phase in np.arange(0, lag, 1.0):
+        idx = np.round(beats + phase).astype(int)
+        score = env[idx[idx < n]].sum()
+        if score > best_score:
+            best_phase, best_score = phase, score
+    return round(bpm, 2), best_phase
+
+
+def estimate_key(chroma: np.ndarray) -> str:
+    """Best-correlating major/minor key for a pitch-class profile."""
+    if not chroma.any():
+        return 'unknown'
+    best, best_r = 'unknown', -2.0
+    for tonic in range(12):
+        for mode, profile in (('major', MAJOR_PROFILE), ('minor', MINOR_PROFILE)):
+            r = np.corrcoef(chroma, np.roll(profile, tonic))[0, 1]
+            if r > best_r:
+                best, best_r = f"{PITCH_CLASSES[tonic]} {mode}", r
+    return best
+
+
+def _k_weighting(sample_rate: int) -> np.ndarray:
+    """BS.1770 K-weighting (high-shelf pre-filter, then RLB high-pass) as SOS."""
+    # Shelf: +4 dB above ~1.7 kHz
+    k = math.tan(math.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0,
+             (vh - vb * k / q + k * k) / a0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    # High-pass at ~38 Hz
+    k = math.tan(math.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, highpass])
+
+
+def measure_loudness(pcm: np.ndarray, sample_rate: int = config.SAMPLE_RATE):
+    """
+    Integrated loudness and true peak of a stereo int16 track.
+
+    Filtering runs in chunks (filter state carried across) so memory stays
+    bounded for long files.
+
+    Returns:
+        (LUFS, dBTP); silence measures LOUDNESS_ABS_GATE LUFS and -inf dBTP
+    """
+    sos = _k_weighting(sample_rate)
+    step = int(sample_rate * LOUDNESS_STEP_S)
+    chunk = step * LOUDNESS_CHUNK_STEPS
+    steps = len(pcm) // step
+    energy = np.zeros(steps)  # Channel-summed mean square per 100 ms step
+    peak = 0.0
+    pad = 32  # Input frames of context either side of an oversampled chunk
+    for channel in range(pcm.shape[1]):
+        zi = np.zeros((len(sos), 2))
+        for start in range(0, len(pcm), chunk):
+            x = pcm[start:start + chunk, channel] / 32768.0
+            y, zi = sos_filter(sos, x, zi)
+            n = min(len(y) // step, steps - start // step)
+            if n > 0:
+                energy[start // step:start // step + n] += \
+                    (y[:n * step] ** 2).reshape(n, step).mean(axis=1)
+
+            lo = max(0, start - pad)
+            context = pcm[lo:start + chunk + pad, channel] / 32768.0
+            up = upsample(context, TRUE_PEAK_OVERSAMPLE)
+            core = up[(start - lo) * TRUE_PEAK_OVERSAMPLE:
+                      (start - lo + len(x)) * TRUE_PEAK_OVERSAMPLE]
+            peak = max(peak, float(np.abs(core).max()) if len(core) else 0.0)
+
+    true_peak_db = 20 * math.log10(peak) if peak > 0 else float('-inf')
+    if steps < LOUDNESS_BLOCK_STEPS:
+        return LOUDNESS_ABS_GATE, true_peak_db
+    blocks = np.lib.stride_tricks.sliding_window_view(energy, LOUDNESS_BLOCK_STEPS).mean(axis=1)
+    with np.errstate(divide='ignore'):
+        loudness = -0.691 + 10 * np.log10(blocks)
+    gated = blocks[loudness > LOUDNESS_ABS_GATE]
+    if not len(gated):
+        return LOUDNESS_ABS_GATE, true_peak_db
+    relative = -0.691 + 10 * math.log10(gated.mean()) + LOUDNESS_REL_GATE
+    gated = blocks[loudness > max(relative, LOUDNESS_ABS_GATE)]
+    return -0.691 + 10 * math.log10(gated.mean()), true_peak_db
+
+
+def normalization_gain(infos: List[TrackInfo], target_lufs: float = config.TARGET_LUFS,
+                       ceiling_db: float = config.TRUE_PEAK_CEILING_DB,
+                       max_gain_db: float = config.MAX_NORMALIZATION_GAIN_DB) -> float:
+    """
+    Linear gain that brings a track to `target_lufs` without pushing its
+    true peak over `ceiling_db`.
+
+    A stem folder is treated as the sum of its stems: loudness adds as
+    power (stems are mostly uncorrelated) and peaks add linearly (worst
+    case). Returns 1.0 unless every stem has been measured.
+    """
+    if not infos or any(info is None or info.lufs is None for info in infos):
+        return 1.0
+    lufs = 10 * math.log10(sum(10 ** (info.lufs / 10) for info in infos))
+    peaks = [10 ** (info.true_peak_db / 20) for info in infos if info.true_peak_db is not None]
+    peak_db = 20 * math.log10(sum(peaks)) if sum(peaks) > 0 else float('-inf')
+    gain_db = min(target_lufs - lufs, ceiling_db - peak_db, max_gain_db)
+    return 10 ** (gain_db / 20)
+
+
+def backfill_file(path: str, digest: str, loudness: bool,
+                  sample_rate: int = config.SAMPLE_RATE) -> dict:
+    """
+    Add what an already-analyzed file is missing (worker process): its
+    peak pyramid, and its loudness if `loudness`.
+    """
+    pcm = load_pcm(Path(path), digest, sample_rate)
+    result = {'hash': digest}
+    if not peaks_path(digest).exists():
+        write_peaks(peaks_path(digest), pcm, sample_rate)
+    if loudness:
+        result['lufs'], result['true_peak_db'] = measure_loudness(pcm, sample_rate)
+    return result
+
+
+def _lower_priority():
+    """Worker initializer: keep library analysis from competing with the audio thread."""
+    if hasattr(os, 'nice'):
+        os.nice(10)
+
+
+def analyze_file(path: str, digest: str, sample_rate: int = config.SAMPLE_RATE) -> dict:
+    """Analyze one file (runs in a worker process)."""
+    pcm = load_pcm(Path(path), digest, sample_rate)
+    lufs, true_peak_db = measure_loudness(pcm, sample_rate)
+    write_peaks(peaks_path(digest), pcm, sample_rate)
+    mono = pcm.mean(axis=1, dtype=np.float32) / 32768.0
+    frame_rate = sample_rate / HOP
+
+    onset, chroma = _spectral_features(mono, sample_rate)
+    bpm, phase = estimate_tempo(onset, frame_rate)
+
+    seconds = len(mono) // sample_rate
+    if seconds:
+        blocks = mono[:seconds * sample_rate].reshape(seconds, sample_rate)
+        energy = np.sqrt((blocks ** 2).mean(axis=1))
+    else:
+        energy = np.array([np.sqrt((mono ** 2).mean())]) if len(mono) else np.zeros(1)
+
+    return {
+        'hash': digest,
+        'duration_s': len(mono) / sample_rate,
+        'bpm': bpm,
+        'beat_offset_s': phase / frame_rate,
+        'key': estimate_key(chroma),
+        'energy': energy.astype(np.float16).tobytes(),
+        'lufs': lufs,
+        'true_peak_db': true_peak_db,
+    }
+
+
+class TrackIndex:
+    """SQLite-backed track analysis index, mirrored in memory for instant lookups."""
+
+    def __init__(self, db_path: str = config.TRACK_INDEX_PATH):
+        """
+        Args:
+            db_path: SQLite file (created if missing)
+        """
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        # Indexes from before loudness analysis: add the columns, backfilled by scan()
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(tracks)")}
+        for column in ('lufs', 'true_peak_db'):
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE tracks ADD COLUMN {column} REAL")
+        self.db.commit()
+        self._by_hash: Dict[str, tuple] = {}
+        self._by_path: Dict[str, str] = {}
+        self._lock = threading.Lock()  # One scan at a time (CLI, watcher)
+        self._watcher: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
+        self.reload()
+
+    def reload(self):
+        """Refresh the in-memory mirror from disk."""
+        self._by_hash = {row[0]: row for row in self.db.execute(
+            "SELECT hash, duration_s, bpm, beat_offset_s, key, energy, lufs, true_peak_db "
+            "FROM tracks")}
+        self._by_path = dict(self.db.execute("SELECT path, hash FROM files"))
+
+    def _info(self, digest: str, path: str) -> Optional[TrackInfo]:
+        row = self._by_hash.get(digest)
+        if row is None:
+            return None
+        return TrackInfo(
+            hash=digest, path=path, duration_s=row[1], bpm=row[2],
+            beat_offset_s=row[3], key=row[4],
+            energy=np.frombuffer(row[5], dtype=np.float16),
+            lufs=row[6], true_peak_db=row[7],
+        )
+
+    def lookup(self, path) -> Optional[TrackInfo]:
+        """Analysis for a file path (None if it hasn't been scanned)."""
+        key = str(Path(path).resolve())
+        digest = self._by_path.get(key)
+        return self._info(digest, key) if digest else None
+
+    def tracks(self) -> List[TrackInfo]:
+        """All indexed files that still have analysis."""
+        infos = (self._info(digest, path) for path, digest in self._by_path.items())
+        return [info for info in infos if info is not None]
+
+    def scan(self, music_dir: str = config.MUSIC_DIR, workers: int = None,
+             settle_s: float = 0.0) -> dict:
+        """
+        Incrementally index every supported audio file under `music_dir`.
+
+        Args:
+            music_dir: Library root
+            workers: Analysis processes (None = all cores)
+            settle_s: Skip files modified this recently (still being written)
+
+        Returns:
+            Counts: files, rehashed, analyzed, backfilled (loudness/peaks), removed
+        """
+        with self._lock:
+            return self._scan(music_dir, workers, settle_s)
+
+    def _scan(self, music_dir: str, workers: Optional[int], settle_s: float) -> dict:
+        files = [p for p in Path(music_dir).rglob('*')
+                 if p.suffix.lower() in config.SUPPORTED_EXTENSIONS and p.is_file()]
+        known = {row[0]: row[1:] for row in self.db.execute(
+            "SELECT path, size, mtime, hash FROM files")}
+
+        seen = set()
+        to_analyze: Dict[str, str] = {}
+        to_backfill: Dict[str, str] = {}
+        rehashed = 0
+        for path in files:
+            key = str(path.resolve())
+            seen.add(key)
+            stat = path.stat()
+            if settle_s and stat.st_mtime > time.time() - settle_s:
+                continue  # Picked up once it stops changing
+            prev = known.get(key)
+            if prev and prev[0] == stat.st_size and prev[1] == stat.st_mtime:
+                digest = prev[2]
+            else:
+                digest = file_hash(path)
+                rehashed += 1
+                self.db.execute(
+                    "INSERT OR REPLACE INTO files (path, size, mtime, hash) VALUES (?, ?, ?, ?)",
+                    (key, stat.st_size, stat.st_mtime, digest))
+            if digest not in self._by_hash:
+                to_analyze[digest] = key
+            elif self._by_hash[digest][6] is None or not peaks_path(digest).exists():
+                to_backfill[digest] = key
+
+        removed = [key for key in known if key not in seen]
+        self.db.executemany("DELETE FROM files WHERE path = ?", [(k,) for k in removed])
+        self.db.commit()
+
+        if to_analyze or to_backfill:
+            # Spawned, niced workers: safe to start from the watcher thread of a
+            # process that has audio threads running
+            with ProcessPoolExecutor(max_workers=workers, initializer=_lower_priority,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {pool.submit(analyze_file, path, digest): path
+                           for digest, path in to_analyze.items()}
+                futures.update({pool.submit(backfill_file, path, digest,
+                                            self._by_hash[digest][6] is None): path
+                                for digest, path in to_backfill.items()})
+                for future, path in futures.items():
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Analysis failed for {path}: {e}")
+                        continue
+                    if 'bpm' in result:
+                        self.db.execute(
+                            "INSERT OR REPLACE INTO tracks (hash, duration_s, bpm, beat_offset_s, "
+                            "key, energy, analyzed_at, lufs, true_peak_db) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (result['hash'], result['duration_s'], result['bpm'],
+                             result['beat_offset_s'], result['key'], result['energy'], time.time(),
+                             result['lufs'], result['true_peak_db']))
+                        print(f"Analyzed: {Path(path).name} -> {result['bpm']} BPM, {result['key']}, "
+                              f"{result['lufs']:.1f} LUFS")
+                    elif 'lufs' in result:
+                        self.db.execute(
+                            "UPDATE tracks SET lufs = ?, true_peak_db = ? WHERE hash = ?",
+                            (result['lufs'], result['true_peak_db'], result['hash']))
+                        print(f"Measured: {Path(path).name} -> {result['lufs']:.1f} LUFS, "
+                              f"{result['true_peak_db']:.1f} dBTP")
+            self.db.commit()
+
+        self.reload()
+        return {
+            'files': len(files),
+            'rehashed': rehashed,
+            'analyzed': len(to_analyze),
+            'backfilled': len(to_backfill),
+            'removed': len(removed),
+        }
+
+    def start_watcher(self, music_dir: str = config.MUSIC_DIR,
+                      interval_s: float = config.TRACK_WATCH_INTERVAL_S, workers: int = 1):
+        """
+        Rescan `music_dir` every `interval_s` in a background thread, so
+        tracks that appear while the booth runs (e.g. freshly generated
+        ones) are analyzed and measured before a deck loads them.
+        """
+        if self._watcher is not None:
+            return
+        self._watch_stop.clear()
+
+        def watch():
+            while not self._watch_stop.wait(interval_s):
+                try:
+                    counts = self.scan(music_dir, workers, config.TRACK_WATCH_SETTLE_S)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"[Track Index] Rescan failed: {e}")
+                    continue
+                if counts['analyzed'] or counts['backfilled']:
+                    print(f"[Track Index] Indexed {counts['analyzed']} new, "
+                          f"backfilled {counts['backfilled']} tracks")
+
+        self._watcher = threading.Thread(target=watch, name="track index watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._watch_stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=1.0)
+            self._watcher = None
+
+    def close(self):
+        self.stop_watcher()
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze and index the music library")
+    parser.add_argument('--music-dir', default=config.MUSIC_DIR)
+    parser.add_argument('--index', default=config.TRACK_INDEX_PATH)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    index = TrackIndex(args.index)
+    start = time.time()
+    counts = index.scan(args.music_dir, args.workers)
+    print(f"Scanned {counts['files']} files in {time.time() - start:.1f}s "
+          f"(rehashed {counts['rehashed']}, analyzed {counts['analyzed']}, "
+          f"backfilled {counts['backfilled']}, removed {counts['removed']})")
+    for info in sorted(index.tracks(), key=lambda t: t.path):
+        loudness = (f"{info.lufs:6.1f} LUFS {info.true_peak_db:5.1f} dBTP"
+                    if info.lufs is not None else "  loudness not measured")
+        print(f"  {Path(info.path).name:30s} {info.bpm:6.1f} BPM  {info.key:9s}  "
+              f"{info.duration_s:6.1f}s  {loudness}  peak energy {float(info.energy.max()):.2f}")
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
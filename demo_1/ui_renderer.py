@@ -9,6 +9,7 @@ import config
 from gesture_detector import GestureState
 from dj_controller import DJController
 from hand_tracker import HandData
+from peaks import envelope
 
 # Hand landmark connections for drawing skeleton
 HAND_CONNECTIONS = [
@@ -34,6 +35,7 @@ class UIRenderer:
         """
         self.width = width
         self.height = height
+        self._last_underruns = 0
 
     def render(self, frame, gesture_states: Dict[str, GestureState],
                dj_controller: DJController, hands: List[HandData]) -> np.ndarray:
@@ -61,6 +63,26 @@ class UIRenderer:
         self._draw_knob(frame, 'right', gesture_states.get('knob_right'),
                         dj_controller.get_deck_info('right'))
 
+        # Draw waveforms
+        self._draw_waveform(frame, 'left', dj_controller.get_deck_info('left'))
+        self._draw_waveform(frame, 'right', dj_controller.get_deck_info('right'))
+
+        # Draw stem pads
+        self._draw_stem_pads(frame, 'left', dj_controller.get_deck_info('left'))
+        self._draw_stem_pads(frame, 'right', dj_controller.get_deck_info('right'))
+
+        # Draw effect pads
+        self._draw_fx_pads(frame, gesture_states, dj_controller.get_sampler_info())
+
+        # Draw audio health overlay
+        self._draw_audio_health(frame, dj_controller.get_audio_health())
+
+        # Session recording indicator
+        if dj_controller.recorder is not None:
+            elapsed = int(dj_controller.recorder.elapsed_s)
+            cv2.putText(frame, f"REC {elapsed // 60}:{elapsed % 60:02d}", (self.width - 120, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, config.FONT_SCALE, config.COLORS['perf_warning'], 2)
+
         # Draw hand landmarks
         for hand in hands:
             self._draw_hand_landmarks(frame, hand)
@@ -139,6 +161,14 @@ class UIRenderer:
                     cv2.FONT_HERSHEY_SIMPLEX, config.FONT_SCALE * 0.7,
                     config.COLORS['tempo_indicator'], 1)
 
+        # Draw sync state (follower deck only)
+        if deck_info.get('synced'):
+            phase_ms = deck_info.get('phase_error_ms')
+            sync_text = "SYNC" if phase_ms is None else f"SYNC {phase_ms:+.1f}ms"
+            cv2.putText(frame, sync_text, (x1 + 10, y2 + 75),
+                        cv2.FONT_HERSHEY_SIMPLEX, config.FONT_SCALE * 0.7,
+                        config.COLORS['tempo_indicator'], 1)
+
     def _draw_knob(self, frame, knob_id: str, state: GestureState, deck_info: dict):
         """Draw a volume knob."""
         zone = config.ZONES[f'knob_{knob_id}']
@@ -171,6 +201,97 @@ class UIRenderer:
                     cv2.FONT_HERSHEY_SIMPLEX, config.FONT_SCALE * 0.5,
                     config.COLORS['text'], 1)
 
+    def _draw_waveform(self, frame, deck_id: str, deck_info: dict):
+        """Draw the audible stems' waveform around the playhead (from the peak pyramids)."""
+        pyramids = deck_info.get('peaks')
+        if not pyramids:
+            return
+        x1, y1, x2, y2 = self._zone_to_pixels(config.ZONES[f'wave_{deck_id}'])
+        width, height = x2 - x1, y2 - y1
+        center = deck_info['position_s'] * config.SAMPLE_RATE
+        half = config.WAVEFORM_WINDOW_S * config.SAMPLE_RATE / 2
+        lo, hi = envelope(pyramids, center - half, center + half, width)
+
+        # One vertical span per column, filled as a mask over the strip
+        mid = height / 2
+        top = (mid - np.clip(hi, 0, 1) * mid).astype(np.int32)
+        bottom = (mid - np.clip(lo, -1, 0) * mid).astype(np.int32)
+        rows = np.arange(height)[:, None]
+        mask = (rows >= top) & (rows <= bottom) & (bottom > top)
+        frame[y1:y2, x1:x2][mask] = config.COLORS['waveform']
+        cx = x1 + width // 2
+        cv2.line(frame, (cx, y1), (cx, y2), config.COLORS['playhead'], 1)
+
+    def _draw_stem_pads(self, frame, deck_id: str, deck_info: dict):
+        """Draw one pad per stem: green = playing, grey = muted, yellow = soloed."""
+        stems = deck_info.get('stems', [])
+        if len(stems) < 2:
+            return  # Single-file track: nothing to mute
+
+        x1, y1, x2, y2 = self._zone_to_pixels(config.ZONES[f'stems_{deck_id}'])
+        pad_width = (x2 - x1) / len(stems)
+        for i, stem in enumerate(stems):
+            px1 = int(x1 + i * pad_width) + 1
+            px2 = int(x1 + (i + 1) * pad_width) - 1
+            if stem['soloed']:
+                color = config.COLORS['stem_solo']
+            elif stem['audible']:
+                color = config.COLORS['stem_on']
+            else:
+                color = config.COLORS['stem_muted']
+            cv2.rectangle(frame, (px1, y1), (px2, y2), color, -1 if stem['audible'] else 2)
+            cv2.putText(frame, stem['name'][0].upper(), (px1 + 4, y2 - 6),
+                        cv2.FONT_HERSHEY_SIMPLEX, config.FONT_SCALE * 0.6,
+                        config.COLORS['text'], 1)
+
+    def _draw_fx_pads(self, frame, gesture_states: Dict[str, GestureState], sampler_info: dict):
+        """Draw one pad per effect plus voice count and trigger latency."""
+        effects = sampler_info.get('effects', [])
+        if not effects:
+            return
+
+        x1, y1, x2, y2 = self._zone_to_pixels(config.ZONES['fx_pads'])
+        hit = any(state and state.is_active for name, state in gesture_states.items()
+                  if name.startswith('fx_pads'))
+        pad_width = (x2 - x1) / len(effects)
+        for i, name in enumerate(effects):
+            px1 = int(x1 + i * pad_width) + 2
+            px2 = int(x1 + (i + 1) * pad_width) - 2
+            cv2.rectangle(frame, (px1, y1), (px2, y2), config.COLORS['fx_pad'], -1 if hit else 2)
+            cv2.putText(frame, name[:8], (px1 + 4, y2 - 8),
+                        cv2.FONT_HERSHEY_SIMPLEX, config.FONT_SCALE * 0.6,
+                        config.COLORS['text'], 1)
+
+        latency = sampler_info.get('latency', {})
+        stats_text = f"FX voices {sampler_info.get('voices', 0)}"
+        if latency.get('count'):
+            stats_text += f" | trigger->sound p50 {latency['p50_ms']:.0f}ms p95 {latency['p95_ms']:.0f}ms"
+        cv2.putText(frame, stats_text, (x1, y2 + 18),
+                    cv2.FONT_HERSHEY_SIMPLEX, config.FONT_SCALE * 0.6,
+                    config.COLORS['text'], 1)
+
+    def _draw_audio_health(self, frame, health: dict):
+        """Draw DSP load, render times, underruns and buffer fill (bottom left)."""
+        if not health.get('callbacks'):
+            return
+        # Red while the output is struggling: recent load near the deadline or any underrun
+        underruns = health['underruns']
+        warn = health['dsp_peak_pct'] > 80 or underruns > self._last_underruns
+        self._last_underruns = underruns
+        color = config.COLORS['perf_warning'] if warn else config.COLORS['text']
+        lines = [
+            f"DSP {health['dsp_load_pct']:.0f}% (peak {health['dsp_peak_pct']:.0f}%) | "
+            f"render p50 {health['render_p50_ms']}ms p99 {health['render_p99_ms']}ms "
+            f"max {health['render_max_ms']}ms",
+            f"buffer {health['block']} ({health['block_ms']}ms) fill {health['fill_pct']}% | "
+            f"underruns {underruns}" + (" | tuned" if health.get('tuned') else ""),
+        ]
+        y = self.height - 12 - 18 * (len(lines) - 1)
+        for line in lines:
+            cv2.putText(frame, line, (10, y), cv2.FONT_HERSHEY_SIMPLEX,
+                        config.FONT_SCALE * 0.6, color, 1)
+            y += 18
+
     def _draw_instructions(self, frame):
         """Draw help text."""
         instructions = [
@@ -178,7 +299,11 @@ class UIRenderer:
             "Pinch + rotate in deck = tempo",
             "Pinch + move up/down in knob = volume",
             "SPACE = play/pause all | Q = quit",
-            "1/2 = toggle deck L/R | N/M = next track"
+            "1/2 = toggle deck L/R | N/M = next track",
+            "S = auto-sync right deck to left",
+            "Tap stem pad = mute | ZXCV/HJKL = solo",
+            "Tap FX pad or 7/8/9 = effect (UIO = on beat)",
+            "R = record session"
         ]
 
         y = 30
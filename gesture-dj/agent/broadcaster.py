@@ -0,0 +1,207 @@
+"""
+Background WebSocket broadcaster for agent actions.
+
+DJAgent hands actions to publish(), which enqueues them and returns
+immediately; a dedicated task drains the queue once per tick, coalesces superseding
+actions into one message, and owns the connection — reconnecting with
+exponential backoff and jitter without ever blocking the decision loop.
+"""
+import asyncio
+import json
+import random
+import time
+
+import websockets
+
+from latency import LatencyTracker
+
+# Only the latest of these matters within a tick
+SUPERSEDING_ACTIONS = {
+    "switch_genre", "set_filter", "change_viz_theme", "set_camera_mode",
+    "set_color_palette", "set_animation_intensity",
+}
+# Deltas: merged by summing within a tick
+DELTA_ACTIONS = {"adjust_energy", "adjust_bpm"}
+
+
+def coalesce_actions(actions: list[dict]) -> list[dict]:
+    """
+    Merge a tick's worth of actions, keeping first-seen order:
+    - superseding actions keep only the latest value
+    - change_fx keeps the latest value per fx type (reverb/delay)
+    - set_stem keeps the latest state per (stem, deck)
+    - adjust_energy/adjust_bpm deltas are summed
+    - everything else (trigger_drop, unknown types) passes through
+    """
+    merged: dict = {}
+    for i, action in enumerate(actions):
+        action_type = action.get("type")
+        value = action.get("value")
+        if action_type in SUPERSEDING_ACTIONS:
+            key = action_type
+        elif action_type == "change_fx" and isinstance(value, dict):
+            key = (action_type, value.get("type"))
+        elif action_type == "set_stem" and isinstance(value, dict):
+            key = (action_type, value.get("stem"), value.get("deck", "both"))
+        elif action_type in DELTA_ACTIONS and isinstance(value, (int, float)):
+            key = action_type
+            if key in merged:
+                prev = merged[key]
+                merged[key] = {**prev, "value": prev["value"] + value}
+                continue
+        else:
+            key = i
+        # Re-assigning an existing key keeps its first-seen position
+        merged[key] = action
+    return list(merged.values())
+
+
+class Broadcaster:
+    """Owns the agent's WS connection and sends coalesced action batches."""
+
+    def __init__(
+        self,
+        url: str,
+        tick_s: float = 0.05,
+        compression: str | None = "deflate",
+        max_queue: int = 1000,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        session: str | None = None,
+    ):
+        """
+        Args:
+            url: WS server URL (with ?type=agent)
+            tick_s: Coalescing window; at most one message is sent per tick
+            compression: "deflate" for permessage-deflate, None to disable
+            max_queue: Outbound queue bound; the oldest entry is dropped when full
+            backoff_base: First reconnect delay in seconds
+            backoff_max: Reconnect delay cap in seconds
+            session: Session code added to each message so clients can filter by room
+        """
+        self.url = url
+        self.tick_s = tick_s
+        self.compression = compression
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = session
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._ws = None
+        self._task: asyncio.Task | None = None
+        self._attempt = 0
+        self._pending: list[tuple[float, list[dict], dict]] = []
+
+        self.send_latency = LatencyTracker(window=500)
+        self.max_queue_depth = 0
+        self.messages_sent = 0
+        self.actions_in = 0
+        self.actions_sent = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    def start(self):
+        """Start the sender task (idempotent; needs a running event loop)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def publish(self, actions: list[dict], audio_state: dict):
+        """Enqueue actions for the next tick. Never blocks."""
+        self.start()
+        item = (time.perf_counter(), actions, audio_state)
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+        self.actions_in += len(actions)
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+    def stats(self) -> dict:
+        latency = self.send_latency.summary().get("send", {})
+        return {
+            "queueDepth": self._queue.qsize(),
+            "maxQueueDepth": self.max_queue_depth,
+            "connected": self._ws is not None,
+            "messagesSent": self.messages_sent,
+            "actionsIn": self.actions_in,
+            "actionsSent": self.actions_sent,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+            "sendLatencyMs": {k: round(v * 1000, 2) for k, v in latency.items() if k != "n"},
+        }
+
+    async def close(self, flush_timeout: float = 1.0):
+        """Flush what is queued (best effort), then stop and disconnect."""
+        if self._task is not None and not self._task.done():
+            deadline = time.perf_counter() + flush_timeout
+            while (self._pending or not self._queue.empty()) and time.perf_counter() < deadline:
+                await asyncio.sleep(self.tick_s)
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self._disconnect()
+
+    async def _disconnect(self):
+        """Close the socket (and its reader task) before dropping it."""
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            try:
+                await ws.close()
+            except Exception:
+                pass
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._pending.append(await self._queue.get())
+            # Let the rest of this tick's actions arrive, then take them all
+            await asyncio.sleep(self.tick_s)
+            while not self._queue.empty():
+                self._pending.append(self._queue.get_nowait())
+            if await self._send_pending():
+                self._pending.clear()
+
+    async def _send_pending(self) -> bool:
+        # Collapse everything pending into one entry so a long outage stays bounded
+        actions = coalesce_actions([a for _, batch, _ in self._pending for a in batch])
+        self._pending = [(self._pending[0][0], actions, self._pending[-1][2])]
+        payload = {
+            "source": "agent",
+            "type": "agent_decision",
+            "data": {
+                "actions": actions,
+                "audioState": self._pending[-1][2],
+            },
+            "timestamp": int(time.time() * 1000),
+        }
+        if self.session:
+            payload["data"]["session"] = self.session
+
+        try:
+            if self._ws is None:
+                self._ws = await websockets.connect(self.url, compression=self.compression)
+                if self._attempt:
+                    self.reconnects += 1
+                self._attempt = 0
+            await self._ws.send(json.dumps(payload, separators=(",", ":")))
+        except Exception as e:
+            await self._disconnect()
+            await self._backoff(e)
+            return False
+
+        # Latency of the oldest action in the batch (enqueue -> on the wire)
+        self.send_latency.record("send", time.perf_counter() - self._pending[0][0])
+        self.messages_sent += 1
+        self.actions_sent += len(actions)
+        return True
+
+    async def _backoff(self, error: Exception):
+        """Exponential backoff with jitter; queued actions keep coalescing meanwhile."""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** self._attempt))
+        delay *= random.uniform(0.5, 1.0)
+        self._attempt += 1
+        print(f"[Broadcaster] WS send failed ({error}); retrying in {delay:.1f}s "
+              f"(attempt {self._attempt})")
+        await asyncio.sleep(delay)
@@ -0,0 +1,125 @@
+"""Bounded in-memory decision history backed by an append-only JSONL log on disk."""
+import os
+import json
+from collections import deque
+
+
+class DecisionLog:
+    """Keeps the last `capacity` decisions in a ring buffer and appends every
+    decision to a rotating JSONL file, so memory stays flat over a long set."""
+
+    def __init__(
+        self,
+        path: str | None,
+        capacity: int = 32,
+        max_bytes: int = 5 * 1024 * 1024,
+        backup_count: int = 3,
+    ):
+        self.path = path
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.total_appended = 0
+        self._recent: deque[dict] = deque(maxlen=capacity)
+        self._file = None
+
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def __iter__(self):
+        return iter(self._recent)
+
+    def __bool__(self) -> bool:
+        return bool(self._recent)
+
+    def recent(self, n: int = 3) -> list[dict]:
+        """Return the last `n` decisions, oldest first."""
+        if n <= 0:
+            return []
+        start = max(0, len(self._recent) - n)
+        return [self._recent[i] for i in range(start, len(self._recent))]
+
+    def append(self, entry: dict):
+        """Record a decision in memory and on disk."""
+        self._recent.append(entry)
+        self.total_appended += 1
+
+        if self._file is None:
+            return
+        try:
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._file.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+        except OSError as e:
+            print(f"[DJ Agent] Decision log write failed (non-fatal): {e}")
+
+    def restore(self, entries: list[dict], total_appended: int = 0):
+        """Seed the in-memory history from a snapshot (not re-written to disk)."""
+        self._recent.extend(entries)
+        self.total_appended = max(total_appended, len(self._recent))
+
+    def _rotate(self):
+        """Shift decisions.jsonl -> .1 -> .2 ... dropping the oldest backup."""
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (0 if unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, kilobytes on Linux
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+if __name__ == "__main__":
+    # Simulate a 12-hour set at the fastest decision cadence (one every 10s)
+    # and show that RSS stays flat once the ring buffer is full.
+    import tempfile
+    import time
+
+    hours = 12
+    decisions = hours * 3600 // 10
+    with tempfile.TemporaryDirectory() as tmp:
+        log = DecisionLog(os.path.join(tmp, "decisions.jsonl"), max_bytes=1024 * 1024)
+        start = time.time()
+        for i in range(decisions):
+            log.append({
+                "timestamp_min": round(i / 6, 1),
+                "reasoning": "The crowd is building energy, lean into it. " * 40,
+                "actions": [{"type": "adjust_energy", "value": 0.1}],
+                "confidence": 0.8,
+            })
+            if i % (decisions // hours) == 0:
+                print(f"  t={i / 360:4.1f}h  decisions={log.total_appended:5d}  "
+                      f"in_memory={len(log):3d}  rss={rss_bytes() / 1e6:.1f}MB")
+        log.close()
+        print(f"Simulated {hours}h ({decisions} decisions) in {time.time() - start:.2f}s, "
+              f"final rss={rss_bytes() / 1e6:.1f}MB")
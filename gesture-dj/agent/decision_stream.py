@@ -0,0 +1,133 @@
+"""
+Incremental parser for streamed agent decisions.
+
+Feeds on model output as it arrives and reports each element of the
+top-level "actions" array the moment its closing brace is seen, then the
+whole decision once the outer object closes. Anything before the first
+"{" (code fences, chatter) is skipped.
+"""
+import json
+
+ACTION_TYPES = {
+    "adjust_energy", "switch_genre", "trigger_drop", "adjust_bpm", "change_fx",
+    "set_filter", "change_viz_theme", "set_camera_mode", "set_color_palette",
+    "set_animation_intensity", "generate_track", "set_stem",
+}
+NUMERIC_ACTIONS = {"adjust_energy", "adjust_bpm", "set_animation_intensity"}
+
+
+def validate_action(action) -> bool:
+    """True if the action is safe to hand to DJAgent.execute_actions."""
+    if not isinstance(action, dict) or "value" not in action:
+        return False
+    action_type = action.get("type")
+    if action_type not in ACTION_TYPES:
+        return False
+    value = action["value"]
+    if action_type in NUMERIC_ACTIONS:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if action_type == "generate_track":
+        return isinstance(value, dict)
+    if action_type == "set_stem":
+        return isinstance(value, dict) and isinstance(value.get("stem"), str)
+    return True
+
+
+def chunk_text(chunk) -> str:
+    """Content delta of a streamed chat-completion chunk ('' if none)."""
+    choices = getattr(chunk, "choices", None)
+    if not choices:
+        return ""
+    delta = getattr(choices[0], "delta", None)
+    return getattr(delta, "content", None) or ""
+
+
+class DecisionStreamParser:
+    """Character-level scanner over a growing JSON decision.
+
+    feed() returns a list of events:
+        ("action", dict)   - a complete, valid element of "actions"
+        ("invalid", str)   - a complete element that failed validation
+        ("decision", dict) - the full decision object (last event)
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.done = False
+        self._pos = 0
+        self._obj_start = -1
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key = None
+        self._in_actions = False
+        self._element_start = -1
+
+    def feed(self, text: str) -> list[tuple[str, object]]:
+        events = []
+        if self.done:
+            return events
+        self.buffer += text
+        buf = self.buffer
+
+        for i in range(self._pos, len(buf)):
+            c = buf[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._expect_key:
+                        self._key = json.loads(buf[self._string_start:i + 1])
+                continue
+
+            if self._obj_start < 0:
+                if c == "{":
+                    self._obj_start = i
+                    self._stack.append("{")
+                    self._expect_key = True
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                if len(self._stack) == 1 and c == "[" and self._key == "actions":
+                    self._in_actions = True
+                elif self._in_actions and len(self._stack) == 2:
+                    self._element_start = i
+                self._stack.append(c)
+            elif c in "}]":
+                self._stack.pop()
+                depth = len(self._stack)
+                if self._in_actions and depth == 2 and c == "}":
+                    events.append(self._element(buf[self._element_start:i + 1]))
+                elif self._in_actions and depth == 1:
+                    self._in_actions = False
+                elif depth == 0:
+                    self.done = True
+                    self._pos = i + 1
+                    events.append(("decision", json.loads(buf[self._obj_start:i + 1])))
+                    return events
+            elif len(self._stack) == 1:
+                if c == ":":
+                    self._expect_key = False
+                elif c == ",":
+                    self._expect_key = True
+
+        self._pos = len(buf)
+        return events
+
+    def _element(self, text: str) -> tuple[str, object]:
+        try:
+            action = json.loads(text)
+        except json.JSONDecodeError:
+            return ("invalid", text)
+        if validate_action(action):
+            return ("action", action)
+        return ("invalid", text)
@@ -2,11 +2,21 @@ import os
 import json
 import asyncio
 import time
+import functools
 from dotenv import load_dotenv
 from dedalus_labs import AsyncDedalus, DedalusRunner
-import websockets
 import aiohttp
 
+from broadcaster import Broadcaster
+from decision_log import DecisionLog, rss_bytes
+from decision_stream import DecisionStreamParser, chunk_text
+from generation_scheduler import GenerationScheduler
+from instrumentation import METRICS_ENABLED, Instrumentation
+from latency import LatencyTracker
+from rules import default_track_spec, rule_based_decision
+from state_snapshot import read_snapshot, write_snapshot
+from track_library import TrackLibrary
+
 load_dotenv()
 
 DJ_AGENT_SYSTEM_PROMPT = """
@@ -22,14 +32,15 @@ You think like an experienced DJ:
 - You create moments of surprise and tension
 - You queue up the NEXT track well in advance (AI music generation takes ~30s)
 
-OUTPUT FORMAT: Respond with ONLY a valid JSON object, no markdown, no extra text:
+OUTPUT FORMAT: Respond with ONLY a valid JSON object, no markdown, no extra text.
+Keep "actions" first and "reasoning" last — actions are applied as soon as they stream in:
 {
-  "reasoning": "Your chain-of-thought reasoning about the current state",
   "actions": [
     {"type": "adjust_energy", "value": 0.1}
   ],
   "confidence": 0.85,
-  "next_check_seconds": 20
+  "next_check_seconds": 20,
+  "reasoning": "Your chain-of-thought reasoning about the current state"
 }
 
 AVAILABLE ACTIONS:
@@ -41,6 +52,8 @@ AVAILABLE ACTIONS:
 - adjust_bpm: delta from -20 to +20
 - change_fx: value is {"type": "reverb" | "delay", "amount": 0.0-1.0}
 - set_filter: value is {"type": "lowpass" | "highpass", "frequency": 100-18000}
+- set_stem: value is {"stem": "drums" | "bass" | "melody" | "vocals", "state": "mute" | "solo" | "on",
+  "deck": "left" | "right" | "both"} — strip a track down (e.g. drums only for a breakdown) or bring parts back
 
 == Visual / animation actions ==
 - change_viz_theme: value is one of "cyber" | "organic" | "minimal" | "chaos"
@@ -72,7 +85,8 @@ MUSIC GENERATION STRATEGY:
 - If crowd wants a genre switch, generate a transition track that bridges the current
   genre to the new one.
 - If a drop is requested, generate a track with a clear buildup and payoff.
-- Check the music queue status — don't queue more than 2 tracks ahead.
+- A scheduler starts generation jobs when the playback buffer needs them; your
+  generate_track decides what the next job sounds like, so send one when the direction changes.
 
 RULES:
 - Maximum 4 actions per decision (including at most 1 generate_track)
@@ -85,38 +99,267 @@ RULES:
 
 NEXT_JS_BASE_URL = os.getenv("NEXT_JS_BASE_URL", "http://localhost:3000")
 WS_SERVER_URL = os.getenv("WS_SERVER_URL", "ws://localhost:8080")
+# Votes can come straight from the DJ Booth vote service (web/votes.py)
+VOTE_API_URL = os.getenv("VOTE_API_URL")  # Default: {next_js_base_url}/api/vote
+DECISION_LOG_PATH = os.getenv(
+    "DECISION_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "decisions.jsonl"),
+)
+# Restart state (energy, BPM, genre, set timeline, recent decisions); "" disables
+SNAPSHOT_PATH = os.getenv(
+    "DJ_AGENT_SNAPSHOT",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "state.json"),
+)
+SNAPSHOT_DECISIONS = 8  # Recent decisions kept in the snapshot (the LLM context shows 3)
+DECISION_HISTORY_SIZE = int(os.getenv("DECISION_HISTORY_SIZE", "32"))
+STATS_LOG_INTERVAL = float(os.getenv("STATS_LOG_INTERVAL", "300"))  # seconds
+
+# LLM models. The hedge model fires when the primary is slower than its running
+# p90; point it at a cheaper/faster model, or leave it as a duplicate request.
+PRIMARY_MODEL = os.getenv("DJ_AGENT_MODEL", "moonshot/kimi-k2-thinking-turbo")
+HEDGE_MODEL = os.getenv("DJ_AGENT_HEDGE_MODEL", PRIMARY_MODEL)
+HEDGE_PERCENTILE = 90
+HEDGE_MIN_SAMPLES = 5  # use HEDGE_DEFAULT_DELAY until we have this many samples
+HEDGE_DEFAULT_DELAY = 30.0  # seconds
+
+# Each decision must land within next_check_seconds * factor, else the rule tier fills in
+DECISION_DEADLINE_FACTOR = 2.0
+MIN_DECISION_DEADLINE = 20.0  # seconds
+MAX_DECISION_DEADLINE = 120.0  # seconds
+
+# Outbound WS: one coalesced JSON message per batch window
+WS_BATCH_MS = float(os.getenv("WS_BATCH_MS", "50"))
+WS_COMPRESSION = os.getenv("WS_COMPRESSION", "deflate")  # deflate | none
+
+# Stream model output and dispatch each action as soon as it parses (DJ_AGENT_STREAM=1)
+STREAM_DECISIONS = os.getenv("DJ_AGENT_STREAM", "0") == "1"
+
+
+def parse_decision(raw_output: str) -> dict:
+    """Parse the model's JSON decision, tolerating markdown code fences."""
+    cleaned = raw_output.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.split("\n", 1)[1] if "\n" in cleaned else cleaned[3:]
+    if cleaned.endswith("```"):
+        cleaned = cleaned[:-3]
+    cleaned = cleaned.strip()
+
+    decision = json.loads(cleaned)
+    if not isinstance(decision, dict):
+        raise json.JSONDecodeError("Decision is not a JSON object", cleaned, 0)
+    return decision
+
+
+def partial_stream_decision(stream_state: dict) -> dict | None:
+    """Decision made of the actions a cut-off stream already produced (None if none)."""
+    actions = stream_state["dispatched"] + stream_state["deferred"]
+    if not actions:
+        return None
+    return {
+        "reasoning": "Stream ended before the decision closed; kept the streamed actions",
+        "actions": actions,
+        "confidence": 0.5,
+        "next_check_seconds": 15,
+        "source": "stream-partial",
+    }
+
+
+class StreamSuperseded(Exception):
+    """A hedged stream lost the race to dispatch the first action."""
 
 
 class DJAgent:
-    def __init__(self):
-        self.client = AsyncDedalus(api_key=os.environ.get("DEDALUS_API_KEY"))
-        self.runner = DedalusRunner(self.client)
-        self.decision_history: list[dict] = []
+    def __init__(
+        self,
+        runner=None,
+        next_js_base_url: str = NEXT_JS_BASE_URL,
+        vote_api_url: str | None = VOTE_API_URL,
+        ws_server_url: str = WS_SERVER_URL,
+        decision_log_path: str | None = DECISION_LOG_PATH,
+        time_scale: float = 1.0,
+        stream: bool = STREAM_DECISIONS,
+        session_code: str | None = None,
+        http_session: aiohttp.ClientSession | None = None,
+        stats_log_interval: float = STATS_LOG_INTERVAL,
+        instrumentation: Instrumentation | None = None,
+        snapshot_path: str | None = None,
+    ):
+        """
+        Args:
+            runner: Anything with an async `run(input=..., model=...)` returning an
+                object with `final_output`. Defaults to a DedalusRunner; the
+                simulation harness passes a local stub instead.
+            next_js_base_url: Base URL for /api/vote, /api/music-queue, /api/agent
+            vote_api_url: Vote aggregation URL, when not the Next.js /api/vote
+            ws_server_url: WebSocket server to broadcast actions to
+            decision_log_path: JSONL decision log (None keeps history in memory only)
+            time_scale: Multiplier on loop sleeps (0 = no waiting, for simulation)
+            stream: Parse model output incrementally and dispatch actions early
+            session_code: Room this agent DJs (None = the global, session-less room);
+                scopes the votes it reads and tags what it broadcasts
+            http_session: Shared aiohttp session (connection pool); not closed by close()
+            stats_log_interval: Seconds between stats lines (inf = never, when a
+                runtime hosting many agents reports for them)
+            instrumentation: Started Instrumentation to time this agent's
+                coroutines (DJ_AGENT_METRICS=1 in main)
+            snapshot_path: State snapshot restored at startup and rewritten each
+                cycle (None = no snapshots; main passes SNAPSHOT_PATH)
+        """
+        if runner is None:
+            self.client = AsyncDedalus(api_key=os.environ.get("DEDALUS_API_KEY"))
+            runner = DedalusRunner(self.client)
+        self.runner = runner
+        self.next_js_base_url = next_js_base_url
+        self.vote_api_url = vote_api_url or f"{next_js_base_url}/api/vote"
+        self.session_code = session_code
+        self.tag = f"[DJ Agent {session_code}]" if session_code else "[DJ Agent]"
+        if session_code:
+            self.vote_api_url += f"?session={session_code}"
+        self.ws_server_url = ws_server_url
+        self.time_scale = time_scale
+        self.stream = stream
+        self.decision_history = DecisionLog(decision_log_path, capacity=DECISION_HISTORY_SIZE)
         self.set_start_time = time.time()
+        self._last_stats_log = 0.0
+        self.stats_log_interval = stats_log_interval
+        self.llm_latency = LatencyTracker()  # Whole calls per model; drives the hedge delay
+        self.first_action_latency = LatencyTracker()  # Streamed calls: time to first action, per model
+        self.cycle_latency = LatencyTracker()  # "fetch", "decision" and whole "cycle" per loop
+        self.track_library = TrackLibrary()
+        self.hedges_fired = 0
+        self.fallbacks_used = 0
         self.current_energy = 0.5
         self.current_bpm = 128
         self.current_genre = "house"
         self.current_viz_theme = "cyber"
         self.current_scene_complexity = 0.5
         self.current_animation_intensity = 0.5
-        self.ws_connection = None
-        self._http_session: aiohttp.ClientSession | None = None
+        self.broadcaster = Broadcaster(
+            f"{self.ws_server_url}?type=agent" + (f"&session={session_code}" if session_code else ""),
+            tick_s=WS_BATCH_MS / 1000,
+            compression=None if WS_COMPRESSION == "none" else WS_COMPRESSION,
+            session=session_code,
+        )
+        self._http_session = http_session
+        self._owns_http_session = http_session is None
+        # generate_track actions say what to generate; the scheduler decides when
+        self.generation = GenerationScheduler(
+            fetch_queue=lambda: self.fetch_music_queue_status(),
+            submit=lambda spec, reasoning: self.queue_music_generation(spec, reasoning),
+            default_spec=lambda: default_track_spec(self.get_audio_state()),
+            tag=self.tag,
+        )
+        self._generation_task: asyncio.Task | None = None
+        self.snapshot_path = snapshot_path or None
+        self._created = time.perf_counter()
+        self.first_action_s: float | None = None  # Start to first applied action
+        self.restored = self.restore_snapshot()
+        if instrumentation is not None:
+            instrumentation.instrument(self)
 
     async def get_http_session(self) -> aiohttp.ClientSession:
         """Reuse a single HTTP session across all requests."""
         if self._http_session is None or self._http_session.closed:
             self._http_session = aiohttp.ClientSession()
+            self._owns_http_session = True
         return self._http_session
 
+    def snapshot_state(self) -> dict:
+        """What a restarted agent needs to carry on the set."""
+        return {
+            "sessionCode": self.session_code,
+            "setStartTime": self.set_start_time,
+            "energy": self.current_energy,
+            "bpm": self.current_bpm,
+            "genre": self.current_genre,
+            "vizTheme": self.current_viz_theme,
+            "sceneComplexity": self.current_scene_complexity,
+            "animationIntensity": self.current_animation_intensity,
+            "decisions": self.decision_history.recent(SNAPSHOT_DECISIONS),
+            "totalDecisions": self.decision_history.total_appended,
+            "llmLatency": self.llm_latency.export(),
+            "generation": self.generation.snapshot(),
+        }
+
+    def restore_snapshot(self) -> bool:
+        """Load the snapshot, if there's a fresh one for this session."""
+        if not self.snapshot_path:
+            return False
+        state = read_snapshot(self.snapshot_path)
+        if state is None or state.get("sessionCode") != self.session_code:
+            return False
+        try:
+            (self.set_start_time, self.current_energy, self.current_bpm, self.current_genre,
+             self.current_viz_theme, self.current_scene_complexity,
+             self.current_animation_intensity) = (
+                float(state["setStartTime"]), float(state["energy"]), int(state["bpm"]),
+                state["genre"], state["vizTheme"], float(state["sceneComplexity"]),
+                float(state["animationIntensity"]))
+            self.decision_history.restore(state["decisions"], state["totalDecisions"])
+            self.llm_latency.load(state["llmLatency"])  # Hedge delays pick up where they were
+            self.generation.restore(state["generation"])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"{self.tag} Ignoring malformed snapshot {self.snapshot_path}: {e}")
+            return False
+        print(f"{self.tag} Restored state from {self.snapshot_path}: "
+              f"t={self.get_set_timeline_minutes():.1f}m, {self.current_genre} "
+              f"{self.current_bpm}bpm, energy {self.current_energy:.2f}, "
+              f"{len(state['decisions'])} recent decisions")
+        return True
+
+    async def save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        try:
+            await asyncio.to_thread(write_snapshot, self.snapshot_path, self.snapshot_state())
+        except OSError as e:
+            print(f"{self.tag} Snapshot write failed (non-fatal): {e}")
+
     async def close(self):
         """Clean up resources."""
-        if self._http_session and not self._http_session.closed:
+        if self._generation_task is not None:
+            self._generation_task.cancel()
+            await asyncio.gather(self._generation_task, return_exceptions=True)
+        await self.save_snapshot()
+        if self._owns_http_session and self._http_session and not self._http_session.closed:
             await self._http_session.close()
-        if self.ws_connection:
-            try:
-                await self.ws_connection.close()
-            except Exception:
-                pass
+        await self.broadcaster.close()
+        self.decision_history.close()
+
+    def get_runtime_stats(self) -> dict:
+        """Memory/uptime snapshot for the periodic stats line."""
+        return {
+            "uptimeMin": round(self.get_set_timeline_minutes(), 1),
+            "rssMb": round(rss_bytes() / (1024 * 1024), 1),
+            "decisions": self.decision_history.total_appended,
+            "historyInMemory": len(self.decision_history),
+            "llmLatency": self.llm_latency.summary(),
+            "firstActionLatency": self.first_action_latency.summary(),
+            "cycleLatency": self.cycle_latency.summary(),
+            "hedgesFired": self.hedges_fired,
+            "fallbacksUsed": self.fallbacks_used,
+            "generationJobs": self.generation.jobs_submitted,
+            "firstActionS": self.first_action_s,
+            "warmStart": self.restored,
+            "broadcast": self.broadcaster.stats(),
+        }
+
+    def maybe_log_stats(self):
+        """Print a stats line at most once per stats_log_interval seconds."""
+        now = time.time()
+        if now - self._last_stats_log < self.stats_log_interval:
+            return
+        self._last_stats_log = now
+        stats = self.get_runtime_stats()
+        print(f"{self.tag} Stats: uptime={stats['uptimeMin']}m | RSS={stats['rssMb']}MB | "
+              f"decisions={stats['decisions']} ({stats['historyInMemory']} in memory) | "
+              f"hedges={stats['hedgesFired']} | fallbacks={stats['fallbacksUsed']}")
+        ws = stats["broadcast"]
+        print(f"{self.tag}   WS: queue={ws['queueDepth']} (max {ws['maxQueueDepth']}) | "
+              f"sent={ws['messagesSent']} msgs/{ws['actionsSent']} actions | "
+              f"reconnects={ws['reconnects']} | send p90={ws['sendLatencyMs'].get('p90', 0)}ms")
+        for model, lat in stats["llmLatency"].items():
+            print(f"{self.tag}   {model}: p50={lat['p50']}s p90={lat['p90']}s p99={lat['p99']}s (n={lat['n']})")
 
     def get_set_timeline_minutes(self) -> float:
         return (time.time() - self.set_start_time) / 60.0
@@ -125,23 +368,23 @@ class DJAgent:
         """Fetch current music queue status from the Next.js API."""
         try:
             session = await self.get_http_session()
-            async with session.get(f"{NEXT_JS_BASE_URL}/api/music-queue") as resp:
+            async with session.get(f"{self.next_js_base_url}/api/music-queue") as resp:
                 if resp.status == 200:
                     return await resp.json()
         except Exception as e:
-            print(f"[DJ Agent] Failed to fetch music queue: {e}")
+            print(f"{self.tag} Failed to fetch music queue: {e}")
         return {"queued": 0, "generating": 0, "ready": 0, "total": 0, "queue": []}
 
     async def fetch_vote_aggregation(self) -> dict:
         """Fetch current vote aggregation from the Next.js API."""
         try:
             session = await self.get_http_session()
-            async with session.get(f"{NEXT_JS_BASE_URL}/api/vote") as resp:
+            async with session.get(self.vote_api_url) as resp:
                 if resp.status == 200:
                     data = await resp.json()
                     return data.get("aggregation", {})
         except Exception as e:
-            print(f"[DJ Agent] Failed to fetch votes: {e}")
+            print(f"{self.tag} Failed to fetch votes: {e}")
         return {
             "counts": {},
             "total": 0,
@@ -165,7 +408,7 @@ class DJAgent:
 
     def build_context(self, vote_agg: dict, audio_state: dict, music_queue: dict) -> str:
         set_timeline = self.get_set_timeline_minutes()
-        last_decisions = self.decision_history[-3:] if self.decision_history else []
+        last_decisions = self.decision_history.recent(3)
 
         # Summarize recent queue items
         queue_items = music_queue.get("queue", [])
@@ -175,6 +418,14 @@ class DJAgent:
         if not queue_summary:
             queue_summary = "  (empty)\n"
 
+        # Analyzed tracks on disk closest to the current tempo
+        library = self.track_library.nearest_bpm(audio_state['bpm'])
+        library_summary = ""
+        for track in library:
+            library_summary += f"  - \"{track['name']}\" ({track['bpm']}bpm, {track['key']}, energy {track['energy']:.2f}, {track['duration_s']:.0f}s)\n"
+        if not library_summary:
+            library_summary = "  (not indexed — run demo_1/track_index.py)\n"
+
         return f"""
 CURRENT STATE (t={set_timeline:.1f}min into set):
 
@@ -204,8 +455,12 @@ Visual State:
 
 Music Generation Queue:
 - Queued: {music_queue.get('queued', 0)} | Generating: {music_queue.get('generating', 0)} | Ready: {music_queue.get('ready', 0)}
+- Playback horizon: {self.generation.summary()}
+- Your generate_track sets what the next job plays; the scheduler starts it when the buffer needs it
 - Recent items:
 {queue_summary}
+Track Library (nearest to current BPM):
+{library_summary}
 Last {len(last_decisions)} Decisions:
 {json.dumps(last_decisions, indent=2) if last_decisions else "None yet — this is the first decision."}
 
@@ -215,45 +470,165 @@ Reason about what the crowd needs right now. Consider:
 3. Do you need to queue a new track? What should it sound like and why?
 """
 
-    async def make_decision(self, vote_agg: dict, music_queue: dict) -> dict | None:
-        """Send context to K2 Think via Dedalus and get a decision."""
+    def hedge_delay(self) -> float:
+        """Seconds to wait on the primary model before firing a hedge request."""
+        if self.llm_latency.count(PRIMARY_MODEL) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return self.llm_latency.percentile(PRIMARY_MODEL, HEDGE_PERCENTILE)
+
+    async def _run_model(self, full_input: str, model: str) -> tuple[str, str]:
+        """One runner call, recording its latency under the model name."""
+        start = time.perf_counter()
+        response = await self.runner.run(input=full_input, model=model)
+        self.llm_latency.record(model, time.perf_counter() - start)
+        return response.final_output, model
+
+    async def _stream_model(self, full_input: str, model: str, state: dict) -> tuple[str, str]:
+        """
+        Streaming runner call. Each action is dispatched to execute_actions as
+        soon as it parses; generate_track waits for the reasoning (it is queued
+        anyway). With hedging, only the first stream to produce an action
+        dispatches — the other raises StreamSuperseded.
+        """
+        start = time.perf_counter()
+        parser = DecisionStreamParser()
+        raw_output = ""
+        chunks = self.runner.run(input=full_input, model=model, stream=True)
+        try:
+            async for chunk in chunks:
+                text = chunk_text(chunk)
+                if not text:
+                    continue
+                for kind, payload in parser.feed(text):
+                    if kind == "action":
+                        if state.setdefault("owner", parser) is not parser:
+                            raise StreamSuperseded(model)
+                        if not state["dispatched"] and not state["deferred"]:
+                            self.first_action_latency.record(model, time.perf_counter() - start)
+                        if payload.get("type") == "generate_track":
+                            state["deferred"].append(payload)
+                        else:
+                            state["dispatched"].append(payload)
+                            await self.execute_actions([payload])
+                    elif kind == "invalid":
+                        print(f"{self.tag} Skipping invalid streamed action: {payload[:120]}")
+                    elif kind == "decision":
+                        raw_output = json.dumps(payload)
+                if parser.done:
+                    break
+        finally:
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()  # Stop the stream now, not when it is garbage collected
+        self.llm_latency.record(model, time.perf_counter() - start)
+        # Unclosed stream: hand back the raw text so the parse error shows it
+        return raw_output or parser.buffer, model
+
+    async def _hedged_run(self, full_input: str, deadline_s: float, run=None) -> tuple[str, str]:
+        """
+        Call the primary model and, if it is slower than its running p90 (or
+        fails), race a hedge request on HEDGE_MODEL against it.
+
+        Args:
+            run: Coroutine function (full_input, model) -> (raw_output, model);
+                defaults to a plain, non-streaming runner call
+
+        Returns:
+            (raw_output, model) from whichever request finishes first
+
+        Raises:
+            asyncio.TimeoutError if nothing succeeds before the deadline
+        """
+        run = run or self._run_model
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + deadline_s
+        hedge_at = loop.time() + self.hedge_delay()
+        pending = {asyncio.create_task(run(full_input, PRIMARY_MODEL))}
+        hedged = False
+        error: BaseException | None = None
+
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    raise asyncio.TimeoutError
+                wake = deadline if hedged else min(deadline, hedge_at)
+                done, pending = await asyncio.wait(
+                    pending, timeout=wake - now, return_when=asyncio.FIRST_COMPLETED
+                )
+                # Check every finished task (both may finish together) so none goes unretrieved
+                errors = [task.exception() for task in done]
+                for task, task_error in zip(done, errors):
+                    if task_error is None:
+                        return task.result()
+                    error = task_error
+                if not hedged and (done or loop.time() >= hedge_at):
+                    hedged = True
+                    self.hedges_fired += 1
+                    print(f"{self.tag} Hedging: {PRIMARY_MODEL} slower than p{HEDGE_PERCENTILE} "
+                          f"({self.hedge_delay():.1f}s), firing {HEDGE_MODEL}")
+                    pending.add(asyncio.create_task(run(full_input, HEDGE_MODEL)))
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def fallback_decision(self, vote_agg: dict, music_queue: dict) -> dict:
+        """Rule-based decision used when the LLM misses its deadline or fails."""
+        self.fallbacks_used += 1
+        decision = rule_based_decision(vote_agg, music_queue, self.get_audio_state())
+        decision["source"] = "rules"
+        return decision
+
+    async def make_decision(
+        self,
+        vote_agg: dict,
+        music_queue: dict,
+        deadline_s: float = MAX_DECISION_DEADLINE,
+    ) -> dict | None:
+        """Send context to K2 Think via Dedalus and get a decision.
+
+        Falls back to the rule-based tier if no valid decision arrives
+        within `deadline_s`.
+        """
         audio_state = self.get_audio_state()
         context = self.build_context(vote_agg, audio_state, music_queue)
 
         full_input = f"{DJ_AGENT_SYSTEM_PROMPT}\n\n---\n\n{context}"
+        start = time.perf_counter()
+        raw_output = ""
+        stream_state = {"dispatched": [], "deferred": []}
+        run = functools.partial(self._stream_model, state=stream_state) if self.stream else None
 
         try:
-            response = await asyncio.wait_for(
-                self.runner.run(
-                    input=full_input,
-                    model="moonshot/kimi-k2-thinking-turbo",
-                ),
-                timeout=120,
-            )
-
-            raw_output = response.final_output
-            # Strip markdown code fences if present
-            cleaned = raw_output.strip()
-            if cleaned.startswith("```"):
-                cleaned = cleaned.split("\n", 1)[1] if "\n" in cleaned else cleaned[3:]
-            if cleaned.endswith("```"):
-                cleaned = cleaned[:-3]
-            cleaned = cleaned.strip()
-
-            decision = json.loads(cleaned)
-            return decision
+            raw_output, model = await self._hedged_run(full_input, deadline_s, run)
+            decision = parse_decision(raw_output)
+            decision["source"] = model
 
+        except asyncio.TimeoutError:
+            print(f"{self.tag} LLM missed {deadline_s:.0f}s deadline — using rule-based fallback")
+            decision = partial_stream_decision(stream_state) or self.fallback_decision(vote_agg, music_queue)
         except json.JSONDecodeError as e:
-            print(f"[DJ Agent] Failed to parse decision JSON: {e}")
-            print(f"[DJ Agent] Raw output: {raw_output[:200]}")
-            return None
+            print(f"{self.tag} Failed to parse decision JSON: {e}")
+            print(f"{self.tag} Raw output: {raw_output[:200]}")
+            decision = partial_stream_decision(stream_state) or self.fallback_decision(vote_agg, music_queue)
         except Exception as e:
-            print(f"[DJ Agent] Error calling K2 Think: {e}")
-            return None
+            print(f"{self.tag} Error calling K2 Think: {e}")
+            decision = partial_stream_decision(stream_state) or self.fallback_decision(vote_agg, music_queue)
+
+        if stream_state["dispatched"] or stream_state["deferred"]:
+            # Immediate actions already ran while streaming; only queued generation is left
+            decision["pending_actions"] = stream_state["deferred"]
+
+        decision["latency_s"] = round(time.perf_counter() - start, 2)
+        return decision
 
     async def execute_actions(self, actions: list[dict], decision_reasoning: str = ""):
         """Execute agent actions by updating local state and broadcasting via WS."""
         broadcast_actions = []
+        if actions and self.first_action_s is None:
+            self.first_action_s = time.perf_counter() - self._created
+            print(f"{self.tag} First action {self.first_action_s:.2f}s after start "
+                  f"({'warm, from snapshot' if self.restored else 'cold'})")
 
         for action in actions:
             action_type = action.get("type")
@@ -270,8 +645,9 @@ Reason about what the crowd needs right now. Consider:
             elif action_type == "set_animation_intensity":
                 self.current_animation_intensity = max(0, min(1, float(value)))
             elif action_type == "generate_track":
-                # Queue music generation via the Next.js API
-                await self.queue_music_generation(value, decision_reasoning)
+                # Held for the generation scheduler, which queues it on its next
+                # check once the buffer runs low (no HTTP round-trip here)
+                self.generation.request(value, decision_reasoning)
             # These are broadcast-only (handled by viz/audio clients):
             # trigger_drop, set_camera_mode, set_color_palette, change_fx, set_filter
 
@@ -283,8 +659,8 @@ Reason about what the crowd needs right now. Consider:
         if ws_actions:
             await self.broadcast_actions(ws_actions)
 
-    async def queue_music_generation(self, track_params: dict, reasoning: str = ""):
-        """Post a music generation request to the Next.js music queue API."""
+    async def queue_music_generation(self, track_params: dict, reasoning: str = "") -> dict | None:
+        """Post a music generation request to the Next.js music queue API (returns the item)."""
         try:
             payload = {
                 "prompt": track_params.get("prompt", ""),
@@ -297,16 +673,17 @@ Reason about what the crowd needs right now. Consider:
             }
             session = await self.get_http_session()
             async with session.post(
-                f"{NEXT_JS_BASE_URL}/api/music-queue",
+                f"{self.next_js_base_url}/api/music-queue",
                 json=payload,
             ) as resp:
                 if resp.status == 200:
                     data = await resp.json()
                     print(f"  -> [Music Queue] Queued: {data.get('item', {}).get('id')}")
-                else:
-                    print(f"  -> [Music Queue] Failed: {resp.status}")
+                    return data.get("item") or payload
+                print(f"  -> [Music Queue] Failed: {resp.status}")
         except Exception as e:
             print(f"  -> [Music Queue] Error: {e}")
+        return None
 
     async def post_decision_to_api(self, decision: dict):
         """Post the decision to the Next.js /api/agent endpoint for dashboard display."""
@@ -318,72 +695,72 @@ Reason about what the crowd needs right now. Consider:
                 "confidence": decision.get("confidence", 0),
                 "audioState": self.get_audio_state(),
             }
+            if self.session_code:
+                payload["sessionCode"] = self.session_code
             async with session.post(
-                f"{NEXT_JS_BASE_URL}/api/agent",
+                f"{self.next_js_base_url}/api/agent",
                 json=payload,
             ) as resp:
                 if resp.status != 200:
-                    print(f"[DJ Agent] API post failed: {resp.status}")
+                    print(f"{self.tag} API post failed: {resp.status}")
         except Exception as e:
-            print(f"[DJ Agent] API post error (non-fatal): {e}")
+            print(f"{self.tag} API post error (non-fatal): {e}")
 
     async def broadcast_actions(self, actions: list[dict]):
-        """Send actions to the WebSocket server for distribution to viz + audio."""
-        msg = json.dumps({
-            "source": "agent",
-            "type": "agent_decision",
-            "data": {
-                "actions": actions,
-                "audioState": self.get_audio_state(),
-            },
-            "timestamp": int(time.time() * 1000),
-        })
+        """Hand actions to the broadcaster task for distribution to viz + audio.
 
-        try:
-            if self.ws_connection is None:
-                self.ws_connection = await websockets.connect(
-                    f"{WS_SERVER_URL}?type=agent"
-                )
-            try:
-                await self.ws_connection.send(msg)
-            except Exception:
-                # Reconnect on stale connection
-                self.ws_connection = await websockets.connect(
-                    f"{WS_SERVER_URL}?type=agent"
-                )
-                await self.ws_connection.send(msg)
-        except Exception as e:
-            print(f"[DJ Agent] WS broadcast failed (non-fatal): {e}")
+        Returns immediately; batching, coalescing and reconnects happen in the
+        background so the decision loop never waits on the WS server.
+        """
+        self.broadcaster.publish(actions, self.get_audio_state())
 
-    async def run_loop(self):
-        """Main agent decision loop."""
-        next_check = 15  # seconds
+    async def run_loop(self, max_cycles: int | None = None):
+        """Main agent decision loop (runs forever unless max_cycles is set)."""
+        # A restored agent decides straight away; a fresh one lets votes build up first
+        next_check = 0 if self.restored else 15  # seconds
+        cycles = 0
 
         print("=" * 60)
         print("  DJ AGENT STARTING")
-        print(f"  Model: K2 Think via Dedalus")
-        print(f"  Polling votes from: {NEXT_JS_BASE_URL}/api/vote")
-        print(f"  WS server: {WS_SERVER_URL}")
+        print(f"  Model: {PRIMARY_MODEL} via Dedalus (hedge: {HEDGE_MODEL})")
+        print(f"  Polling votes from: {self.vote_api_url}")
+        print(f"  WS server: {self.ws_server_url}")
         print("=" * 60)
+        if self.time_scale > 0 and self._generation_task is None:
+            # Checks the playback horizon between decisions (simulations check once per cycle)
+            self._generation_task = asyncio.create_task(self.generation.run())
 
-        while True:
-            await asyncio.sleep(next_check)
+        while max_cycles is None or cycles < max_cycles:
+            cycles += 1
+            await asyncio.sleep(next_check * self.time_scale)
+            cycle_start = time.perf_counter()
 
             # 1. Collect current state (votes + music queue in parallel)
-            vote_agg = await self.fetch_vote_aggregation()
-            music_queue = await self.fetch_music_queue_status()
+            vote_agg, music_queue = await asyncio.gather(
+                self.fetch_vote_aggregation(), self.fetch_music_queue_status()
+            )
+            self.cycle_latency.record("fetch", time.perf_counter() - cycle_start)
+            if self._generation_task is None:
+                await self.generation.tick(music_queue)
             set_min = self.get_set_timeline_minutes()
+            self.maybe_log_stats()
 
-            print(f"\n[DJ Agent] t={set_min:.1f}m | Votes: {vote_agg.get('total', 0)} | "
+            print(f"\n{self.tag} t={set_min:.1f}m | Votes: {vote_agg.get('total', 0)} | "
                   f"Rate: {vote_agg.get('voteRate', 0):.2f}/s | "
                   f"Hype: {'YES' if vote_agg.get('isHypeSpike') else 'no'} | "
                   f"Queue: {music_queue.get('queued', 0)}q/{music_queue.get('generating', 0)}g/{music_queue.get('ready', 0)}r")
 
             # 2. Get decision from K2 Think
-            decision = await self.make_decision(vote_agg, music_queue)
+            deadline_s = max(
+                MIN_DECISION_DEADLINE,
+                min(MAX_DECISION_DEADLINE, next_check * DECISION_DEADLINE_FACTOR),
+            )
+            decision = await self.make_decision(vote_agg, music_queue, deadline_s=deadline_s)
+            if decision is not None:
+                self.cycle_latency.record("decision", decision.get("latency_s", 0))
 
             if decision is None:
-                print("[DJ Agent] No valid decision — skipping cycle")
+                print(f"{self.tag} No valid decision — skipping cycle")
                 next_check = 15
                 continue
 
@@ -392,8 +769,9 @@ Reason about what the crowd needs right now. Consider:
             actions = decision.get("actions", [])
             confidence = decision.get("confidence", 0)
 
-            print(f"[DJ Agent] Reasoning: {reasoning[:120]}...")
-            print(f"[DJ Agent] Confidence: {confidence:.0%} | Actions: {len(actions)}")
+            print(f"{self.tag} Reasoning: {reasoning[:120]}...")
+            print(f"{self.tag} Confidence: {confidence:.0%} | Actions: {len(actions)} | "
+                  f"Source: {decision.get('source')} in {decision.get('latency_s', 0)}s")
 
             # 4. Record in history
             self.decision_history.append({
@@ -401,24 +779,32 @@ Reason about what the crowd needs right now. Consider:
                 "reasoning": reasoning,
                 "actions": actions,
                 "confidence": confidence,
+                "source": decision.get("source"),
             })
 
-            # 5. Execute actions
-            if actions:
-                await self.execute_actions(actions, decision_reasoning=reasoning)
+            # 5. Execute actions (streamed decisions have already applied most of theirs)
+            pending_actions = decision.get("pending_actions", actions)
+            if pending_actions:
+                await self.execute_actions(pending_actions, decision_reasoning=reasoning)
 
             # 5b. Post decision to Next.js API for dashboard
             await self.post_decision_to_api(decision)
+            self.cycle_latency.record("cycle", time.perf_counter() - cycle_start)
+            await self.save_snapshot()
 
             # 6. Adjust next check interval
             next_check = decision.get("next_check_seconds", 15)
             next_check = max(10, min(60, next_check))  # clamp to 10-60s
 
-            print(f"[DJ Agent] Next check in {next_check}s")
+            print(f"{self.tag} Next check in {next_check}s")
 
 
 async def main():
-    agent = DJAgent()
+    instrumentation = None
+    if METRICS_ENABLED:
+        instrumentation = Instrumentation()
+        await instrumentation.start()
+    agent = DJAgent(instrumentation=instrumentation, snapshot_path=SNAPSHOT_PATH)
     try:
         await agent.run_loop()
     except KeyboardInterrupt:
@@ -428,6 +814,8 @@ async def main():
         raise
     finally:
         await agent.close()
+        if instrumentation is not None:
+            await instrumentation.close()
 
 
 if __name__ == "__main__":
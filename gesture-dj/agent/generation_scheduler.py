@@ -0,0 +1,231 @@
+"""
+Just-in-time music generation driven by the playback horizon.
+
+The horizon is the audio the booth can play without new generation: what
+is left of the playing track plus every ready, queued and generating item
+in /api/music-queue. A job started now lands after the estimated
+generation latency (the p90 of past jobs, learned from the queue), by
+which time that much of the horizon has played. The scheduler starts a
+job only when what would be left at that point is under TARGET_BUFFER_S,
+and never has more than MAX_IN_FLIGHT jobs in flight — so the music
+doesn't run dry and the queue doesn't fill with tracks that never play.
+
+generate_track actions from the LLM (or the rule tier) say *what* to
+generate: the latest one is held and used for the next job. The
+scheduler decides *when*; with no fresh request it continues the
+current state (rules.default_track_spec).
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+from latency import LatencyTracker
+
+DEFAULT_GENERATION_LATENCY_S = 30.0  # Until MIN_LATENCY_SAMPLES jobs have been seen
+MIN_LATENCY_SAMPLES = 3
+LATENCY_PERCENTILE = 90
+TARGET_BUFFER_S = float(os.getenv("DJ_AGENT_BUFFER_S", "45"))  # Audio left when a new job lands
+MAX_IN_FLIGHT = 2  # Queued + generating jobs
+SCHEDULER_TICK_S = 5.0
+STALE_JOB_FACTOR = 3.0  # A job in flight this many latency estimates is presumed lost
+REQUEST_TTL_S = 120.0  # An LLM track request older than this no longer reflects the crowd
+IN_FLIGHT = ("queued", "generating")
+
+
+class GenerationLatencyEstimator:
+    """Rolling p90 of queue-to-ready time over recent generation jobs."""
+
+    def __init__(self, default_s: float = DEFAULT_GENERATION_LATENCY_S, window: int = 20):
+        self.default_s = default_s
+        self.samples = LatencyTracker(window=window)
+        self._pending: dict[str, float] = {}  # id -> createdAt (s), jobs not seen ready yet
+        self._learned: set[str] = set()
+
+    def estimate(self) -> float:
+        if self.samples.count("job") < MIN_LATENCY_SAMPLES:
+            return max(self.default_s, self.samples.percentile("job", 100))
+        return self.samples.percentile("job", LATENCY_PERCENTILE)
+
+    def observe(self, items: list[dict], now: float):
+        """
+        Learn from the queue. Uses the server's readyAt stamp when present,
+        else the first poll that saw the item ready (an upper bound).
+        """
+        for item in items:
+            item_id = item.get("id")
+            created = item.get("createdAt")
+            if not item_id or created is None or item_id in self._learned:
+                continue
+            status = item.get("status")
+            if status in IN_FLIGHT:
+                self._pending.setdefault(item_id, created / 1000)
+            elif status in ("ready", "playing"):
+                ready_at = item["readyAt"] / 1000 if item.get("readyAt") else None
+                if ready_at is None and item_id in self._pending:
+                    ready_at = now  # Seen in flight by an earlier poll, ready now
+                if ready_at is not None:
+                    self.samples.record("job", max(0.0, ready_at - created / 1000))
+                self._learned.add(item_id)
+                self._pending.pop(item_id, None)
+            else:
+                self._pending.pop(item_id, None)
+        if len(self._learned) > 200:
+            self._learned = {i.get("id") for i in items}  # The queue keeps 20 items at most
+
+
+def playback_horizon(music_queue: dict, now: float, stale_after_s: float = float("inf")) -> dict:
+    """
+    Seconds of audio available, by source (queue timestamps are ms). Jobs in
+    flight longer than `stale_after_s` are left out: they'd otherwise hold
+    in-flight slots forever if the generator dropped them.
+    """
+    playing_s = ready_s = in_flight_s = 0.0
+    in_flight = stale = 0
+    for item in music_queue.get("queue", []):
+        duration = float(item.get("duration_seconds") or 0)
+        status = item.get("status")
+        if status == "playing":
+            started = item.get("startedAt")
+            playing_s += max(0.0, duration - (now - started / 1000)) if started else 0.0
+        elif status == "ready":
+            ready_s += duration
+        elif status in IN_FLIGHT:
+            created = item.get("createdAt")
+            if created and now - created / 1000 > stale_after_s:
+                stale += 1
+                continue
+            in_flight_s += duration
+            in_flight += 1
+    return {
+        "playingS": round(playing_s, 1),
+        "readyS": round(ready_s, 1),
+        "inFlightS": round(in_flight_s, 1),
+        "inFlight": in_flight,
+        "stale": stale,
+        "totalS": round(playing_s + ready_s + in_flight_s, 1),
+    }
+
+
+class GenerationScheduler:
+    """Issues generation jobs just in time to keep TARGET_BUFFER_S of audio ahead."""
+
+    def __init__(
+        self,
+        fetch_queue: Callable[[], Awaitable[dict]],
+        submit: Callable[[dict, str], Awaitable[dict | None]],
+        default_spec: Callable[[], dict],
+        target_buffer_s: float = TARGET_BUFFER_S,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        tick_s: float = SCHEDULER_TICK_S,
+        clock: Callable[[], float] = time.time,
+        tag: str = "[Generation]",
+    ):
+        """
+        Args:
+            fetch_queue: Returns /api/music-queue's JSON
+            submit: Queues one job (spec, reasoning); returns the queue item or None
+            default_spec: Track spec to use when there is no recent request
+            target_buffer_s: Audio that should remain when a job started now lands
+            max_in_flight: Cap on queued + generating jobs
+            tick_s: Seconds between queue checks in run()
+            clock: Wall clock in seconds (queue timestamps are wall-clock ms)
+            tag: Log prefix
+        """
+        self.fetch_queue = fetch_queue
+        self.submit = submit
+        self.default_spec = default_spec
+        self.target_buffer_s = target_buffer_s
+        self.max_in_flight = max_in_flight
+        self.tick_s = tick_s
+        self.clock = clock
+        self.tag = tag
+        self.latency = GenerationLatencyEstimator()
+        self.horizon = playback_horizon({}, clock())
+        self._request: tuple[dict, str, float] | None = None  # (spec, reasoning, when)
+        self._submitted_in_flight = 0  # Jobs submitted since the last queue read
+        self.jobs_submitted = 0
+        self.requests_used = 0
+        self._lock = asyncio.Lock()  # One check at a time (run() and the decision loop)
+
+    def request(self, spec: dict, reasoning: str = ""):
+        """Hold a generate_track spec for the next job (the latest one wins)."""
+        self._request = (spec, reasoning, self.clock())
+
+    def snapshot(self) -> dict:
+        """Learned latencies and the held request, for a state snapshot."""
+        request = None
+        if self._request is not None:
+            spec, reasoning, when = self._request
+            request = {"spec": spec, "reasoning": reasoning, "ageS": self.clock() - when}
+        return {"latencies": self.latency.samples.export(), "request": request}
+
+    def restore(self, state: dict):
+        self.latency.samples.load(state.get("latencies", {}))
+        request = state.get("request")
+        if request:
+            self._request = (request["spec"], request.get("reasoning", ""),
+                             self.clock() - request.get("ageS", 0))
+
+    def observe(self, music_queue: dict):
+        """Update the horizon and latency estimate from a queue read."""
+        now = self.clock()
+        self.latency.observe(music_queue.get("queue", []), now)
+        self.horizon = playback_horizon(
+            music_queue, now, stale_after_s=STALE_JOB_FACTOR * self.latency.estimate())
+        self._submitted_in_flight = 0
+
+    def shortfall(self) -> float:
+        """Seconds under the target buffer once a job started now would land (0 = none)."""
+        left_when_landed = self.horizon["totalS"] - self.latency.estimate()
+        return max(0.0, self.target_buffer_s - left_when_landed)
+
+    async def tick(self, music_queue: dict | None = None) -> int:
+        """Read the queue (unless given) and submit jobs while there's a shortfall."""
+        async with self._lock:
+            return await self._tick(music_queue)
+
+    async def _tick(self, music_queue: dict | None) -> int:
+        self.observe(music_queue if music_queue is not None else await self.fetch_queue())
+        submitted = 0
+        while (self.shortfall() > 0
+               and self.horizon["inFlight"] + self._submitted_in_flight < self.max_in_flight):
+            spec, reasoning = self._next_spec()
+            item = await self.submit(spec, reasoning)
+            if item is None:
+                break  # Queue API down: retry next tick
+            duration = float(item.get("duration_seconds") or spec.get("duration_seconds") or 30)
+            self.horizon["totalS"] += duration
+            self.horizon["inFlightS"] += duration
+            self._submitted_in_flight += 1
+            self.jobs_submitted += 1
+            submitted += 1
+        return submitted
+
+    def _next_spec(self) -> tuple[dict, str]:
+        if self._request is not None:
+            spec, reasoning, when = self._request
+            self._request = None
+            if self.clock() - when <= REQUEST_TTL_S:
+                self.requests_used += 1
+                return spec, reasoning
+        return self.default_spec(), (
+            f"Scheduler: {self.horizon['totalS']:.0f}s of audio ahead, "
+            f"generation takes ~{self.latency.estimate():.0f}s"
+        )
+
+    def summary(self) -> str:
+        """One line for the LLM context."""
+        h = self.horizon
+        return (f"{h['totalS']:.0f}s of audio ahead (playing {h['playingS']:.0f}s, ready {h['readyS']:.0f}s, "
+                f"in flight {h['inFlightS']:.0f}s in {h['inFlight']} jobs); generation takes "
+                f"~{self.latency.estimate():.0f}s; target buffer {self.target_buffer_s:.0f}s")
+
+    async def run(self):
+        """Check the queue every tick_s seconds (cancel to stop)."""
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"{self.tag} Generation check failed: {e}")
+            await asyncio.sleep(self.tick_s)
@@ -0,0 +1,395 @@
+"""
+Opt-in event-loop and coroutine instrumentation for the DJ agent.
+
+When the agent stalls this tells apart a slow LLM, slow HTTP calls, WS
+reconnects and the event loop itself being blocked by synchronous work:
+- loop lag: a task that sleeps LAG_INTERVAL_S and measures how late it wakes
+- slow callbacks: every loop callback (task step) is timed; those over
+  SLOW_CALLBACK_S are counted per coroutine, with the worst kept
+- spans: timing around the agent's fetch_*, make_decision, execute_actions,
+  broadcast_actions and post_decision_to_api, per session
+- a sampling profiler of the loop thread, toggled at runtime, that
+  returns collapsed stacks (flamegraph.pl / speedscope input)
+
+Results go out as a periodic [Metrics] line and as OpenMetrics text on
+http://<host>:<port>/metrics. /profile/start, /profile/stop and
+/profile?seconds=N drive the profiler.
+
+    DJ_AGENT_METRICS=1 python dj_agent.py
+    curl localhost:9464/metrics
+    curl 'localhost:9464/profile?seconds=10' > stacks.txt
+"""
+import asyncio
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from latency import LatencyTracker
+
+METRICS_ENABLED = os.getenv("DJ_AGENT_METRICS", "0") == "1"
+METRICS_HOST = os.getenv("DJ_AGENT_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("DJ_AGENT_METRICS_PORT", "9464"))  # 0 = no endpoint
+METRICS_LOG_INTERVAL = float(os.getenv("DJ_AGENT_METRICS_INTERVAL", "60"))  # seconds
+LAG_INTERVAL_S = 0.1
+SLOW_CALLBACK_S = float(os.getenv("DJ_AGENT_SLOW_CALLBACK_MS", "50")) / 1000
+PROFILE_INTERVAL_S = 0.005
+PROFILE_MAX_SECONDS = 120.0
+
+SPAN_METHODS = (
+    "fetch_vote_aggregation",
+    "fetch_music_queue_status",
+    "make_decision",
+    "execute_actions",
+    "broadcast_actions",
+    "post_decision_to_api",
+)
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Instances timing loop callbacks; asyncio.Handle._run is patched while any are
+_callback_timers: list = []
+_original_handle_run = None
+
+
+class SpanStats:
+    """Count, sum and rolling percentiles for one span (or the loop lag)."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.in_flight = 0
+        self.max = 0.0
+        self.recent = LatencyTracker(window=500)
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.record("s", seconds)
+
+    def quantile(self, q: float) -> float:
+        return self.recent.percentile("s", q * 100)
+
+
+def _describe_callback(handle) -> str:
+    """Coroutine name for a task step, else the callback's name."""
+    callback = getattr(handle, "_callback", None)
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        return getattr(coro, "__qualname__", None) or repr(coro)
+    return getattr(callback, "__qualname__", None) or repr(callback)
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id: int, interval_s: float = PROFILE_INTERVAL_S):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.stacks.clear()
+        self.samples = 0
+        self.started_at = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="loop-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Stop sampling; returns collapsed stacks ("frame;frame;frame count" per line)."""
+        if self._thread is None:
+            return ""
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common()) + "\n"
+
+    def _run(self):
+        deadline = self.started_at + PROFILE_MAX_SECONDS
+        while not self._stop.wait(self.interval_s) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class Instrumentation:
+    """Loop lag, slow callbacks and coroutine spans for one process's agents."""
+
+    def __init__(
+        self,
+        host: str = METRICS_HOST,
+        port: int = METRICS_PORT,
+        log_interval: float = METRICS_LOG_INTERVAL,
+        slow_callback_s: float = SLOW_CALLBACK_S,
+    ):
+        """
+        Args:
+            host, port: OpenMetrics/profiler endpoint (port 0 = no endpoint)
+            log_interval: Seconds between [Metrics] lines (0 = none)
+            slow_callback_s: Loop callbacks taking longer than this are counted
+        """
+        self.host = host
+        self.port = port
+        self.log_interval = log_interval
+        self.slow_callback_s = slow_callback_s
+        self.lag = SpanStats()
+        self.spans: dict[tuple[str, str], SpanStats] = {}  # (span, session) -> stats
+        self.slow_callbacks: Counter = Counter()  # callback name -> count
+        self.worst_callback: tuple[str, float] = ("", 0.0)
+        self.agents: list = []
+        self.profiler: SamplingProfiler | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._runner: web.AppRunner | None = None
+
+    # --- setup -------------------------------------------------------------
+
+    async def start(self):
+        """Start the lag monitor, slow-callback timing, periodic line and endpoint."""
+        loop = asyncio.get_running_loop()
+        self.profiler = SamplingProfiler(threading.get_ident())
+        self._install_callback_timer()
+        self._tasks.append(loop.create_task(self._monitor_lag()))
+        if self.log_interval > 0:
+            self._tasks.append(loop.create_task(self._log_periodically()))
+        if self.port:
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle_metrics)
+            app.router.add_get("/profile", self._handle_profile)
+            app.router.add_get("/profile/start", self._handle_profile_start)
+            app.router.add_get("/profile/stop", self._handle_profile_stop)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, self.host, self.port).start()
+            print(f"[Metrics] OpenMetrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        try:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks.clear()
+            if self.profiler is not None:
+                self.profiler.stop()
+            if self._runner is not None:
+                await self._runner.cleanup()
+                self._runner = None
+        finally:
+            self._uninstall_callback_timer()
+
+    def instrument(self, agent, methods=SPAN_METHODS):
+        """Wrap the agent's coroutine methods in timing spans (per instance)."""
+        session = getattr(agent, "session_code", None) or ""
+        for name in methods:
+            method = getattr(agent, name)
+            setattr(agent, name, self._wrap(method, name, session))
+        self.agents.append(agent)
+
+    def _wrap(self, method, name: str, session: str):
+        stats = self.spans.setdefault((name, session), SpanStats())
+
+        @functools.wraps(method)
+        async def timed(*args, **kwargs):
+            stats.in_flight += 1
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            except BaseException:
+                stats.errors += 1
+                raise
+            finally:
+                stats.in_flight -= 1
+                stats.record(time.perf_counter() - start)
+        return timed
+
+    def _install_callback_timer(self):
+        """
+        Time every loop callback by wrapping asyncio.Handle._run (not under uvloop).
+
+        The patch is process-wide, so it is shared: the first instance installs
+        it, the last one to uninstall restores the original.
+        """
+        global _original_handle_run
+        if self in _callback_timers:
+            return
+        _callback_timers.append(self)
+        if _original_handle_run is not None:
+            return
+        original = _original_handle_run = asyncio.Handle._run
+
+        def _run(handle):
+            start = time.perf_counter()
+            original(handle)
+            elapsed = time.perf_counter() - start
+            for instr in _callback_timers:
+                if elapsed > instr.slow_callback_s:
+                    instr._slow_callback(handle, elapsed)
+
+        asyncio.Handle._run = _run
+
+    def _uninstall_callback_timer(self):
+        global _original_handle_run
+        if self not in _callback_timers:
+            return
+        _callback_timers.remove(self)
+        if not _callback_timers and _original_handle_run is not None:
+            asyncio.Handle._run = _original_handle_run
+            _original_handle_run = None
+
+    def _slow_callback(self, handle, elapsed: float):
+        name = _describe_callback(handle)
+        self.slow_callbacks[name] += 1
+        if elapsed > self.worst_callback[1]:
+            self.worst_callback = (name, elapsed)
+
+    async def _monitor_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_INTERVAL_S
+            await asyncio.sleep(LAG_INTERVAL_S)
+            self.lag.record(max(0.0, loop.time() - expected))
+
+    async def _log_periodically(self):
+        while True:
+            await asyncio.sleep(self.log_interval)
+            print(self.metrics_line())
+
+    # --- export ------------------------------------------------------------
+
+    def metrics_line(self) -> str:
+        """One-line summary: loop lag, slow callbacks and the slowest spans."""
+        worst, worst_s = self.worst_callback
+        line = (f"[Metrics] loop lag p50={self.lag.quantile(0.5) * 1000:.1f}ms "
+                f"p99={self.lag.quantile(0.99) * 1000:.1f}ms max={self.lag.max * 1000:.0f}ms | "
+                f"slow callbacks={sum(self.slow_callbacks.values())}")
+        if worst:
+            line += f" (worst {worst} {worst_s * 1000:.0f}ms)"
+        by_span: dict[str, list[SpanStats]] = {}
+        for (name, _), stats in self.spans.items():
+            by_span.setdefault(name, []).append(stats)
+        parts = []
+        for name, stats_list in by_span.items():
+            p90 = max(s.quantile(0.9) for s in stats_list)
+            count = sum(s.count for s in stats_list)
+            parts.append(f"{name} p90={p90 * 1000:.0f}ms n={count}")
+        if parts:
+            line += " | " + ", ".join(parts)
+        return line
+
+    def openmetrics(self) -> str:
+        """All metrics in OpenMetrics text format."""
+        out: list[str] = []
+
+        def summary(name: str, help_text: str, series: list[tuple[str, SpanStats]]):
+            out.append(f"# TYPE {name} summary")
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# UNIT {name} seconds")
+            for labels, stats in series:
+                sep = "," if labels else ""
+                for q in (0.5, 0.9, 0.99):
+                    out.append(f'{name}{{{labels}{sep}quantile="{q}"}} {stats.quantile(q):.6f}')
+                braces = f"{{{labels}}}" if labels else ""
+                out.append(f"{name}_count{braces} {stats.count}")
+                out.append(f"{name}_sum{braces} {stats.total:.6f}")
+
+        def metric(name: str, kind: str, help_text: str, series: list[tuple[str, float]]):
+            out.append(f"# TYPE {name} {kind}")
+            out.append(f"# HELP {name} {help_text}")
+            suffix = "_total" if kind == "counter" else ""
+            for labels, value in series:
+                braces = f"{{{labels}}}" if labels else ""
+                out.append(f"{name}{suffix}{braces} {value}")
+
+        summary("dj_agent_loop_lag_seconds", "Event loop wake-up lag", [("", self.lag)])
+        metric("dj_agent_loop_lag_max_seconds", "gauge", "Worst event loop lag seen",
+               [("", round(self.lag.max, 6))])
+        metric("dj_agent_slow_callbacks", "counter",
+               f"Loop callbacks over {self.slow_callback_s * 1000:.0f} ms",
+               [(f'callback="{_escape(name)}"', n) for name, n in self.slow_callbacks.items()])
+        spans = sorted(self.spans.items())
+        summary("dj_agent_span_seconds", "Agent coroutine duration",
+                [(_labels(name, session), stats) for (name, session), stats in spans])
+        metric("dj_agent_span_errors", "counter", "Agent coroutines that raised",
+               [(_labels(name, session), stats.errors) for (name, session), stats in spans])
+        metric("dj_agent_span_in_flight", "gauge", "Agent coroutines running",
+               [(_labels(name, session), stats.in_flight) for (name, session), stats in spans])
+
+        agents = [(getattr(a, "session_code", None) or "", a) for a in self.agents]
+
+        def session(code: str) -> str:
+            return f'session="{_escape(code)}"' if code else ""
+
+        metric("dj_agent_decisions", "counter", "Decisions made",
+               [(session(c), a.decision_history.total_appended) for c, a in agents])
+        metric("dj_agent_hedges", "counter", "Hedge LLM requests fired",
+               [(session(c), a.hedges_fired) for c, a in agents])
+        metric("dj_agent_fallbacks", "counter", "Rule-based fallback decisions",
+               [(session(c), a.fallbacks_used) for c, a in agents])
+        metric("dj_agent_ws_queue_depth", "gauge", "Broadcaster queue depth",
+               [(session(c), a.broadcaster.stats()["queueDepth"]) for c, a in agents])
+        metric("dj_agent_ws_reconnects", "counter", "Broadcaster reconnects",
+               [(session(c), a.broadcaster.reconnects) for c, a in agents])
+        profiling = self.profiler is not None and self.profiler.running
+        metric("dj_agent_profiler_running", "gauge", "Sampling profiler on", [("", int(profiling))])
+        out.append("# EOF")
+        return "\n".join(out) + "\n"
+
+    # --- profiler ----------------------------------------------------------
+
+    def toggle_profiler(self) -> str:
+        """Start the profiler, or stop it and return collapsed stacks."""
+        if self.profiler.running:
+            return self.profiler.stop()
+        self.profiler.start()
+        return ""
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.openmetrics(), headers={"Content-Type": OPENMETRICS_TYPE})
+
+    async def _handle_profile_start(self, request: web.Request) -> web.Response:
+        self.profiler.start()
+        return web.Response(text="profiling\n")
+
+    async def _handle_profile_stop(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.profiler.stop())
+
+    async def _handle_profile(self, request: web.Request) -> web.Response:
+        try:
+            seconds = min(PROFILE_MAX_SECONDS, float(request.query.get("seconds", "10")))
+        except ValueError:
+            return web.Response(status=400, text="seconds must be a number\n")
+        if self.profiler.running:
+            return web.Response(status=409, text="profiler already running\n")
+        self.profiler.start()
+        await asyncio.sleep(seconds)
+        return web.Response(text=self.profiler.stop())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(span: str, session: str) -> str:
+    labels = f'span="{span}"'
+    return labels + (f',session="{_escape(session)}"' if session else "")
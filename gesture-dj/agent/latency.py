@@ -0,0 +1,53 @@
+"""Rolling latency percentiles, kept per key (model name, endpoint, ...)."""
+import math
+from collections import deque
+
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty sequence)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+class LatencyTracker:
+    """Keeps the last `window` latency samples (seconds) for each key."""
+
+    def __init__(self, window: int = 50):
+        self.window = window
+        self._samples: dict[str, deque[float]] = {}
+
+    def record(self, key: str, seconds: float):
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def count(self, key: str) -> int:
+        return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, pct: float) -> float:
+        return percentile(self._samples.get(key, ()), pct)
+
+    def export(self) -> dict[str, list[float]]:
+        """Samples per key, for a state snapshot."""
+        return {key: list(samples) for key, samples in self._samples.items()}
+
+    def load(self, samples: dict[str, list[float]]):
+        """Restore exported samples (the newest `window` per key are kept)."""
+        for key, values in samples.items():
+            self._samples[key] = deque((float(v) for v in values), maxlen=self.window)
+
+    def summary(self) -> dict:
+        """p50/p90/p99 per key, in seconds."""
+        return {
+            key: {
+                "n": len(samples),
+                "p50": round(percentile(samples, 50), 3),
+                "p90": round(percentile(samples, 90), 3),
+                "p99": round(percentile(samples, 99), 3),
+            }
+            for key, samples in self._samples.items()
+        }
@@ -0,0 +1,76 @@
+"""
+Rule-based fast tier for the DJ Agent.
+
+Produces a small, conservative decision straight from the vote aggregation
+when the LLM misses its deadline or returns garbage, so the booth never
+goes minutes without a decision.
+"""
+
+
+def clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(high, value))
+
+
+def default_track_spec(audio_state: dict, duration_seconds: int = 30) -> dict:
+    """A generate_track value that continues the current genre, tempo and energy."""
+    energy = audio_state.get("energy", 0.5)
+    genre = audio_state.get("genre", "house")
+    bpm = int(clamp(audio_state.get("bpm", 128), 80, 180))
+    return {
+        "prompt": f"{genre} track at {bpm}bpm, "
+                  f"{'driving and energetic' if energy >= 0.5 else 'smooth and laid back'}, "
+                  "steady groove that mixes cleanly out of the current track",
+        "genre": genre,
+        "bpm": bpm,
+        "energy": round(energy, 2),
+        "mood": "euphoric" if energy >= 0.5 else "chill",
+        "duration_seconds": duration_seconds,
+    }
+
+
+def rule_based_decision(
+    vote_agg: dict,
+    music_queue: dict,
+    audio_state: dict,
+    next_check_seconds: int = 15,
+) -> dict:
+    """Build a decision in the same shape the LLM returns."""
+    counts = vote_agg.get("counts", {})
+    vote_rate = vote_agg.get("voteRate", 0)
+    energy_bias = vote_agg.get("energyBias", 0)
+    # Quiet crowd -> subtler moves, as the system prompt asks of the LLM
+    scale = 0.5 if vote_rate < 0.1 else 1.0
+
+    actions = []
+    reasons = []
+
+    if abs(energy_bias) >= 0.2:
+        delta = round(clamp(energy_bias * 0.2 * scale, -0.3, 0.3), 2)
+        actions.append({"type": "adjust_energy", "value": delta})
+        reasons.append(f"energy bias {energy_bias:+.2f}")
+
+    speed = counts.get("speed_up", 0) - counts.get("speed_down", 0)
+    if speed:
+        delta = int(4 * scale) * (1 if speed > 0 else -1)
+        actions.append({"type": "adjust_bpm", "value": delta})
+        reasons.append(f"speed votes {speed:+d}")
+
+    if vote_agg.get("isHypeSpike") and counts.get("drop_request", 0) > 0:
+        actions.append({"type": "trigger_drop", "value": {"buildup_bars": 8}})
+        reasons.append("hype spike with drop requests")
+
+    pending = (
+        music_queue.get("queued", 0)
+        + music_queue.get("generating", 0)
+        + music_queue.get("ready", 0)
+    )
+    if pending == 0:
+        actions.append({"type": "generate_track", "value": default_track_spec(audio_state)})
+        reasons.append("music queue is empty")
+
+    return {
+        "reasoning": "Rule-based fallback: " + (", ".join(reasons) if reasons else "holding steady"),
+        "actions": actions[:4],
+        "confidence": 0.4,
+        "next_check_seconds": next_check_seconds,
+    }
@@ -0,0 +1,315 @@
+"""
+Multi-session runtime: many DJ agents, one per room, in one asyncio process.
+
+Each session (a room's code from /api/sessions) gets its own DJAgent with
+its own energy/genre/visual state, decision history, broadcaster and
+metrics. What they share:
+- one aiohttp connection pool for /api/vote, /api/music-queue, /api/agent
+- one LLM runner behind LLMScheduler, which caps concurrent model calls and
+  hands free slots to waiting sessions in round-robin order, so a session
+  firing hedges or retries can't starve the others
+
+Usage:
+    python session_runtime.py --sessions ABC123,XYZ789
+    DJ_AGENT_SESSIONS=ABC123,XYZ789 DJ_AGENT_LLM_CONCURRENCY=8 python session_runtime.py
+
+Session listings need a user's auth, so the rooms to run are passed in;
+add_session/remove_session let an embedding process change them live.
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import time
+from collections import OrderedDict, deque
+
+import aiohttp
+from dedalus_labs import AsyncDedalus, DedalusRunner
+
+from dj_agent import (
+    DECISION_LOG_PATH,
+    NEXT_JS_BASE_URL,
+    SNAPSHOT_PATH,
+    STATS_LOG_INTERVAL,
+    STREAM_DECISIONS,
+    VOTE_API_URL,
+    WS_SERVER_URL,
+    DJAgent,
+)
+from instrumentation import METRICS_ENABLED, Instrumentation
+from latency import LatencyTracker
+
+LLM_CONCURRENCY = int(os.getenv("DJ_AGENT_LLM_CONCURRENCY", "8"))
+HTTP_POOL_SIZE = int(os.getenv("DJ_AGENT_HTTP_POOL", "64"))  # Connections shared by all sessions
+START_SPREAD_S = 15.0  # Session loops start spread over this window instead of in lockstep
+
+
+class LLMScheduler:
+    """Bounded LLM concurrency with fair (round-robin per session) queuing."""
+
+    def __init__(self, max_concurrency: int = LLM_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self._waiting: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        self.queue_wait = LatencyTracker(window=200)  # Seconds waited for a slot, per session
+        self.granted = 0
+        self.max_waiting = 0
+
+    def waiting(self) -> int:
+        return sum(1 for q in self._waiting.values() for f in q if not f.done())
+
+    async def acquire(self, key: str):
+        """Wait for a slot; `key` is the session queued under."""
+        start = time.perf_counter()
+        if self.active < self.max_concurrency and not self._waiting:
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiting.setdefault(key, deque()).append(future)
+            self.max_waiting = max(self.max_waiting, self.waiting())
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release()  # Granted as we were cancelled: pass it on
+                raise
+        self.granted += 1
+        self.queue_wait.record(key, time.perf_counter() - start)
+
+    def release(self):
+        """Hand the slot to the next session in turn, or free it."""
+        while self._waiting:
+            key, queue = next(iter(self._waiting.items()))
+            future = queue.popleft()
+            if queue:
+                self._waiting.move_to_end(key)  # Its next request waits for everyone else's turn
+            else:
+                del self._waiting[key]
+            if not future.done():  # Skip requests cancelled while queued
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "maxConcurrency": self.max_concurrency,
+            "active": self.active,
+            "waiting": self.waiting(),
+            "maxWaiting": self.max_waiting,
+            "granted": self.granted,
+        }
+
+
+class ScheduledRunner:
+    """Per-session view of a shared runner: every model call takes a scheduler slot."""
+
+    def __init__(self, runner, scheduler: LLMScheduler, key: str):
+        self.runner = runner
+        self.scheduler = scheduler
+        self.key = key
+
+    def run(self, input: str, model: str, stream: bool = False, **kwargs):
+        """Same shape as the wrapped runner: a coroutine, or an async chunk iterator when streaming."""
+        if stream:
+            return self._stream(input, model, **kwargs)
+        return self._complete(input, model, **kwargs)
+
+    async def _complete(self, input: str, model: str, **kwargs):
+        await self.scheduler.acquire(self.key)
+        try:
+            return await self.runner.run(input=input, model=model, **kwargs)
+        finally:
+            self.scheduler.release()
+
+    async def _stream(self, input: str, model: str, **kwargs):
+        # The slot is held until the stream is consumed or abandoned
+        await self.scheduler.acquire(self.key)
+        try:
+            async for chunk in self.runner.run(input=input, model=model, stream=True, **kwargs):
+                yield chunk
+        finally:
+            self.scheduler.release()
+
+
+class AgentRuntime:
+    """Hosts one DJAgent per session on a shared HTTP pool and LLM scheduler."""
+
+    def __init__(
+        self,
+        runner=None,
+        llm_concurrency: int = LLM_CONCURRENCY,
+        next_js_base_url: str = NEXT_JS_BASE_URL,
+        vote_api_url: str | None = VOTE_API_URL,
+        ws_server_url: str = WS_SERVER_URL,
+        log_dir: str | None = os.path.dirname(DECISION_LOG_PATH),
+        snapshot_dir: str | None = None,
+        time_scale: float = 1.0,
+        stream: bool = STREAM_DECISIONS,
+        http_pool_size: int = HTTP_POOL_SIZE,
+        instrumentation: Instrumentation | None = None,
+    ):
+        """
+        Args:
+            runner: Shared LLM runner (defaults to one DedalusRunner for all sessions)
+            llm_concurrency: Model calls in flight at once, across all sessions
+            next_js_base_url, vote_api_url, ws_server_url, time_scale, stream: As for DJAgent
+            log_dir: Directory for per-session decision logs (None = in memory only)
+            snapshot_dir: Directory for per-session state snapshots restored on
+                restart (None = no snapshots)
+            http_pool_size: Connections in the shared aiohttp pool
+            instrumentation: Started Instrumentation shared by all sessions' agents
+        """
+        if runner is None:
+            runner = DedalusRunner(AsyncDedalus(api_key=os.environ.get("DEDALUS_API_KEY")))
+        self.runner = runner
+        self.scheduler = LLMScheduler(llm_concurrency)
+        self.next_js_base_url = next_js_base_url
+        self.vote_api_url = vote_api_url
+        self.ws_server_url = ws_server_url
+        self.log_dir = log_dir
+        self.snapshot_dir = snapshot_dir
+        self.time_scale = time_scale
+        self.stream = stream
+        self.http_pool_size = http_pool_size
+        self.instrumentation = instrumentation
+        self.agents: dict[str, DJAgent] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._http_session: aiohttp.ClientSession | None = None
+        self._started = time.time()
+
+    def http_session(self) -> aiohttp.ClientSession:
+        if self._http_session is None or self._http_session.closed:
+            connector = aiohttp.TCPConnector(limit=self.http_pool_size)
+            self._http_session = aiohttp.ClientSession(connector=connector)
+        return self._http_session
+
+    def add_session(self, code: str, max_cycles: int | None = None) -> DJAgent:
+        """Start an agent for `code` (no-op if one is running)."""
+        if code in self.agents:
+            return self.agents[code]
+        log_path = os.path.join(self.log_dir, f"decisions-{code}.jsonl") if self.log_dir else None
+        snapshot_path = (os.path.join(self.snapshot_dir, f"state-{code}.json")
+                         if self.snapshot_dir else None)
+        agent = DJAgent(
+            runner=ScheduledRunner(self.runner, self.scheduler, code),
+            next_js_base_url=self.next_js_base_url,
+            vote_api_url=self.vote_api_url,
+            ws_server_url=self.ws_server_url,
+            decision_log_path=log_path,
+            snapshot_path=snapshot_path,
+            time_scale=self.time_scale,
+            stream=self.stream,
+            session_code=code,
+            http_session=self.http_session(),
+            stats_log_interval=math.inf,
+            instrumentation=self.instrumentation,
+        )
+        self.agents[code] = agent
+        self._tasks[code] = asyncio.create_task(self._run_agent(agent, max_cycles))
+        return agent
+
+    async def _run_agent(self, agent: DJAgent, max_cycles: int | None):
+        await asyncio.sleep(random.uniform(0, START_SPREAD_S) * self.time_scale)
+        try:
+            await agent.run_loop(max_cycles=max_cycles)
+        except Exception as e:
+            print(f"{agent.tag} Loop failed: {e}")
+            raise
+
+    async def remove_session(self, code: str):
+        """Stop and close a session's agent."""
+        agent = self.agents.pop(code, None)
+        task = self._tasks.pop(code, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if agent is not None:
+            await agent.close()
+
+    async def wait(self):
+        """Until every session loop has finished (forever unless max_cycles was set)."""
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def close(self):
+        for code in list(self.agents):
+            await self.remove_session(code)
+        if self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
+
+    def stats(self) -> dict:
+        """Per-session decision/queue/LLM latency percentiles plus scheduler counters."""
+        sessions = {}
+        queue_wait = self.scheduler.queue_wait.summary()
+        for code, agent in self.agents.items():
+            cycle = agent.cycle_latency.summary()
+            sessions[code] = {
+                "decisions": agent.decision_history.total_appended,
+                "fallbacks": agent.fallbacks_used,
+                "hedges": agent.hedges_fired,
+                "decisionLatency": cycle.get("decision", {}),
+                "cycleLatency": cycle.get("cycle", {}),
+                "fetchLatency": cycle.get("fetch", {}),
+                "llmQueueWait": queue_wait.get(code, {}),
+                "llmLatency": agent.llm_latency.summary(),
+            }
+        return {
+            "uptimeMin": round((time.time() - self._started) / 60, 1),
+            "sessions": sessions,
+            "scheduler": self.scheduler.stats(),
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        sched = stats["scheduler"]
+        print(f"[Runtime] uptime={stats['uptimeMin']}m | sessions={len(stats['sessions'])} | "
+              f"LLM slots {sched['active']}/{sched['maxConcurrency']} | waiting={sched['waiting']} "
+              f"(max {sched['maxWaiting']})")
+        for code, s in stats["sessions"].items():
+            d, q = s["decisionLatency"], s["llmQueueWait"]
+            print(f"[Runtime]   {code}: decisions={s['decisions']} | decision p50={d.get('p50', 0)}s "
+                  f"p90={d.get('p90', 0)}s | queue p90={q.get('p90', 0)}s | "
+                  f"fallbacks={s['fallbacks']} hedges={s['hedges']}")
+
+    async def run(self, codes: list[str], stats_interval: float = STATS_LOG_INTERVAL):
+        """Run the given sessions until cancelled, logging stats periodically."""
+        for code in codes:
+            self.add_session(code)
+        print(f"[Runtime] {len(codes)} sessions, {self.scheduler.max_concurrency} concurrent LLM calls")
+        while True:
+            await asyncio.sleep(stats_interval)
+            self.log_stats()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run DJ agents for many sessions in one process")
+    parser.add_argument("--sessions", default=os.getenv("DJ_AGENT_SESSIONS", ""),
+                        help="Comma-separated session codes")
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY)
+    args = parser.parse_args()
+    codes = [c.strip().upper() for c in args.sessions.split(",") if c.strip()]
+    if not codes:
+        parser.error("no sessions given (--sessions or DJ_AGENT_SESSIONS)")
+
+    instrumentation = None
+    if METRICS_ENABLED:
+        instrumentation = Instrumentation()
+        await instrumentation.start()
+    runtime = AgentRuntime(
+        llm_concurrency=args.llm_concurrency,
+        snapshot_dir=os.path.dirname(SNAPSHOT_PATH) if SNAPSHOT_PATH else None,
+        instrumentation=instrumentation,
+    )
+    try:
+        await runtime.run(codes)
+    finally:
+        await runtime.close()
+        if instrumentation is not None:
+            await instrumentation.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n[Runtime] Shutting down...")
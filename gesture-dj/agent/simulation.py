@@ -0,0 +1,681 @@
+"""
+Offline simulation harness for the DJ Agent.
+
+Runs DJAgent.run_loop with no Dedalus key, no Next.js app and no WS server:
+- StubRunner stands in for the LLM and returns scripted or randomized
+  decisions after a configurable latency
+- FakeBackend serves /api/vote, /api/music-queue and /api/agent in-process
+- FakeWSServer routes agent messages to N simulated subscribers
+- SyntheticCrowd generates the votes behind /api/vote
+
+With --sessions N the agents run as N rooms under AgentRuntime (shared
+HTTP pool and LLM scheduler) and per-session latencies are reported.
+With --playback-hours H, hours of virtual playback compare the generation
+scheduler against queueing only when the queue is empty. With --restart,
+a cold start is compared with a restart from the state snapshot the first
+agent left behind (time to first applied action, in real seconds).
+
+Usage:
+    python simulation.py --cycles 2000 --latency-ms 5 --subscribers 20
+    python simulation.py --script decisions.jsonl --cycles 100
+    python simulation.py --sessions 50 --cycles 20 --latency-ms 2000 --llm-concurrency 8
+    python simulation.py --playback-hours 4 --seed 1
+    python simulation.py --restart --latency-ms 2000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+from aiohttp import web
+import websockets
+
+from dj_agent import DJAgent
+from generation_scheduler import SCHEDULER_TICK_S, GenerationScheduler
+from instrumentation import Instrumentation
+from session_runtime import AgentRuntime
+
+VOTE_TYPES = [
+    "energy_up", "energy_down", "genre_switch", "drop_request",
+    "viz_style", "speed_up", "speed_down",
+]
+GENRES = ["house", "dnb", "techno", "lofi", "ambient"]
+VIZ_THEMES = ["cyber", "organic", "minimal", "chaos"]
+CAMERA_MODES = ["orbit", "fly", "static", "shake"]
+MOODS = ["euphoric", "dark", "chill", "aggressive", "dreamy", "hypnotic"]
+
+
+class StubResponse:
+    """Mimics the `final_output` attribute of a Dedalus runner result."""
+
+    def __init__(self, final_output: str):
+        self.final_output = final_output
+
+
+class StubRunner:
+    """Local LLM stand-in with the same `run(input=..., model=...)` shape as DedalusRunner."""
+
+    def __init__(
+        self,
+        script: list[dict] | None = None,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_ms: float = 0.0,
+        seed: int | None = None,
+    ):
+        """
+        Args:
+            script: Decisions to replay in order (cycled); randomized if None
+            latency_ms: Base response latency
+            jitter_ms: Uniform extra latency in [0, jitter_ms]
+            slow_rate: Fraction of calls that stall (exercises hedging/fallback)
+            slow_ms: Extra latency added to stalled calls
+            seed: RNG seed for reproducible runs
+        """
+        self.script = script or []
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.rng = random.Random(seed)
+        self.chunk_chars = 16
+        self.calls = 0
+
+    def run(self, input: str, model: str, stream: bool = False, **kwargs):
+        """Like DedalusRunner.run: a coroutine, or an async chunk iterator when streaming."""
+        if stream:
+            return self._stream()
+        return self._complete()
+
+    def _next_output(self) -> str:
+        if self.script:
+            decision = self.script[self.calls % len(self.script)]
+        else:
+            decision = self.random_decision()
+        self.calls += 1
+        return json.dumps(decision)
+
+    def _delay_s(self) -> float:
+        delay = self.latency_ms + self.rng.uniform(0, self.jitter_ms)
+        if self.rng.random() < self.slow_rate:
+            delay += self.slow_ms
+        return delay / 1000
+
+    async def _complete(self) -> StubResponse:
+        await asyncio.sleep(self._delay_s())
+        output = self._next_output()
+        return StubResponse(output)
+
+    async def _stream(self):
+        """Emit the decision in small chunks spread evenly over the latency."""
+        output = self._next_output()
+        pieces = [output[i:i + self.chunk_chars] for i in range(0, len(output), self.chunk_chars)]
+        per_piece = self._delay_s() / len(pieces)
+        for piece in pieces:
+            await asyncio.sleep(per_piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+    def random_decision(self) -> dict:
+        """Build a decision that follows the system prompt's rules."""
+        rng = self.rng
+        builders = [
+            lambda: {"type": "adjust_energy", "value": round(rng.uniform(-0.3, 0.3), 2)},
+            lambda: {"type": "adjust_bpm", "value": rng.randint(-20, 20)},
+            lambda: {"type": "switch_genre", "value": rng.choice(GENRES)},
+            lambda: {"type": "trigger_drop", "value": {"buildup_bars": rng.choice([4, 8, 16])}},
+            lambda: {"type": "change_fx", "value": {
+                "type": rng.choice(["reverb", "delay"]), "amount": round(rng.random(), 2)}},
+            lambda: {"type": "set_filter", "value": {
+                "type": rng.choice(["lowpass", "highpass"]), "frequency": rng.randint(100, 18000)}},
+            lambda: {"type": "change_viz_theme", "value": rng.choice(VIZ_THEMES)},
+            lambda: {"type": "set_camera_mode", "value": rng.choice(CAMERA_MODES)},
+            lambda: {"type": "set_animation_intensity", "value": round(rng.random(), 2)},
+        ]
+        actions = [build() for build in rng.sample(builders, rng.randint(1, 3))]
+        if rng.random() < 0.2:
+            actions.append({"type": "generate_track", "value": {
+                "prompt": "Simulated track with rolling drums and warm pads",
+                "genre": rng.choice(GENRES),
+                "bpm": rng.randint(80, 180),
+                "energy": round(rng.random(), 2),
+                "mood": rng.choice(MOODS),
+                "duration_seconds": rng.randint(15, 60),
+            }})
+        return {
+            "actions": actions,
+            "confidence": round(rng.uniform(0.5, 0.95), 2),
+            "next_check_seconds": rng.randint(10, 60),
+            "reasoning": "Simulated reasoning. " * rng.randint(5, 40),
+        }
+
+
+class SyntheticCrowd:
+    """Generates vote aggregations with the same shape as /api/vote."""
+
+    def __init__(self, size: int = 200, seed: int | None = None):
+        self.size = size
+        self.rng = random.Random(seed)
+        self.mood = 0.0  # -1 chill .. +1 hype, random walk
+        self.rate_history: list[float] = []
+
+    def sample(self) -> dict:
+        rng = self.rng
+        self.mood = max(-1.0, min(1.0, self.mood + rng.gauss(0, 0.15)))
+        engagement = 0.02 + 0.08 * rng.random()  # votes per person per second
+        window_s = 30
+        total = int(self.size * engagement * window_s)
+
+        weights = [
+            1 + max(0, self.mood) * 3,   # energy_up
+            1 + max(0, -self.mood) * 3,  # energy_down
+            0.5, 1 + max(0, self.mood) * 2, 0.5, 1, 1,
+        ]
+        counts = dict.fromkeys(VOTE_TYPES, 0)
+        for vote in rng.choices(VOTE_TYPES, weights=weights, k=total):
+            counts[vote] += 1
+
+        vote_rate = total / window_s
+        self.rate_history = (self.rate_history + [vote_rate])[-10:]
+        avg_rate = sum(self.rate_history) / len(self.rate_history)
+        up = counts["energy_up"] + counts["speed_up"] + counts["drop_request"]
+        down = counts["energy_down"] + counts["speed_down"]
+        return {
+            "counts": counts,
+            "total": total,
+            "voteRate": vote_rate,
+            "avgRate": avg_rate,
+            "isHypeSpike": vote_rate > avg_rate * 1.5,
+            "dominantVote": max(counts, key=counts.get) if total else None,
+            "energyBias": (up - down) / total if total else 0,
+        }
+
+
+class FakeBackend:
+    """In-process stand-in for the Next.js /api/vote, /api/music-queue and /api/agent routes."""
+
+    def __init__(self, crowd: SyntheticCrowd):
+        self.crowd = crowd
+        self.queue: list[dict] = []
+        self.decisions_posted = 0
+        self.app = web.Application()
+        self.app.router.add_get("/api/vote", self.get_vote)
+        self.app.router.add_get("/api/music-queue", self.get_music_queue)
+        self.app.router.add_post("/api/music-queue", self.post_music_queue)
+        self.app.router.add_post("/api/agent", self.post_agent)
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def get_vote(self, request: web.Request) -> web.Response:
+        return web.json_response({"aggregation": self.crowd.sample()})
+
+    async def get_music_queue(self, request: web.Request) -> web.Response:
+        # Advance each item one step per poll: queued -> generating -> ready
+        for item in self.queue:
+            if item["status"] == "queued":
+                item["status"] = "generating"
+            elif item["status"] == "generating":
+                item["status"] = "ready"
+        self.queue = self.queue[-20:]
+        by_status = {s: sum(1 for i in self.queue if i["status"] == s)
+                     for s in ("queued", "generating", "ready")}
+        return web.json_response({**by_status, "total": len(self.queue), "queue": self.queue})
+
+    async def post_music_queue(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        item = {**body, "id": f"sim-{len(self.queue)}-{time.time_ns()}", "status": "queued"}
+        self.queue.append(item)
+        return web.json_response({"item": item})
+
+    async def post_agent(self, request: web.Request) -> web.Response:
+        await request.read()
+        self.decisions_posted += 1
+        return web.json_response({"ok": True})
+
+
+class FakeWSServer:
+    """Routes `source: agent` messages to viz/cv/dashboard subscribers like ws-server.ts."""
+
+    def __init__(self):
+        self.subscribers: set = set()
+        self.messages_in = 0
+        self.deliveries = 0
+        self.receive_times: list[float] = []
+        self._server = None
+        self.url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = await websockets.serve(self._handler, host, port)
+        port = next(iter(self._server.sockets)).getsockname()[1]
+        self.url = f"ws://{host}:{port}"
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handler(self, ws, path: str | None = None):
+        path = path or getattr(getattr(ws, "request", None), "path", "")
+        if "type=agent" not in path:
+            self.subscribers.add(ws)
+            try:
+                await ws.wait_closed()
+            finally:
+                self.subscribers.discard(ws)
+            return
+
+        async for raw in ws:
+            self.messages_in += 1
+            self.receive_times.append(time.perf_counter())
+            targets = list(self.subscribers)
+            if targets:
+                await asyncio.gather(*(t.send(raw) for t in targets), return_exceptions=True)
+                self.deliveries += len(targets)
+
+
+class Subscriber:
+    """A simulated viz/dashboard client counting the messages it receives."""
+
+    def __init__(self, url: str, client_type: str = "viz"):
+        self.url = f"{url}?type={client_type}"
+        self.received = 0
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        self._ws = await websockets.connect(self.url)
+        self._task = asyncio.create_task(self._consume())
+
+    async def _consume(self):
+        try:
+            async for _ in self._ws:
+                self.received += 1
+        except websockets.ConnectionClosed:
+            pass
+
+    async def stop(self):
+        await self._ws.close()
+        if self._task:
+            await self._task
+
+
+async def simulate(
+    cycles: int,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    slow_rate: float = 0.0,
+    slow_ms: float = 0.0,
+    subscribers: int = 5,
+    crowd_size: int = 200,
+    script: list[dict] | None = None,
+    seed: int | None = None,
+    stream: bool = False,
+    quiet: bool = True,
+    metrics: bool = False,
+) -> dict:
+    """Run `cycles` agent decisions against fake services and return metrics."""
+    backend = FakeBackend(SyntheticCrowd(crowd_size, seed=seed))
+    ws_server = FakeWSServer()
+    await backend.start()
+    await ws_server.start()
+    subs = [Subscriber(ws_server.url) for _ in range(subscribers)]
+    for sub in subs:
+        await sub.start()
+
+    runner = StubRunner(
+        script=script,
+        latency_ms=latency_ms,
+        jitter_ms=jitter_ms,
+        slow_rate=slow_rate,
+        slow_ms=slow_ms,
+        seed=seed,
+    )
+    instrumentation = Instrumentation(port=0, log_interval=0) if metrics else None
+    if instrumentation is not None:
+        await instrumentation.start()
+    agent = DJAgent(
+        runner=runner,
+        next_js_base_url=backend.base_url,
+        ws_server_url=ws_server.url,
+        decision_log_path=None,
+        time_scale=0,
+        stream=stream,
+        instrumentation=instrumentation,
+    )
+
+    start = time.perf_counter()
+    try:
+        out = io.StringIO() if quiet else None
+        with contextlib.redirect_stdout(out) if quiet else contextlib.nullcontext():
+            await agent.run_loop(max_cycles=cycles)
+    finally:
+        elapsed = time.perf_counter() - start
+        await agent.close()
+        if instrumentation is not None:
+            await instrumentation.close()
+        # Let in-flight fan-out drain before reading counters
+        await asyncio.sleep(0.1)
+        for sub in subs:
+            await sub.stop()
+        await ws_server.stop()
+        await backend.stop()
+
+    results = {
+        "cycles": cycles,
+        "elapsed_s": round(elapsed, 3),
+        "decisions_per_min": round(cycles / elapsed * 60, 1),
+        "llm_calls": runner.calls,
+        "llm_latency_s": agent.llm_latency.summary(),
+        "first_action_latency_s": agent.first_action_latency.summary(),
+        "hedges_fired": agent.hedges_fired,
+        "fallbacks_used": agent.fallbacks_used,
+        "broadcaster": agent.broadcaster.stats(),
+        "broadcasts": ws_server.messages_in,
+        "fanout_deliveries": ws_server.deliveries,
+        "fanout_received": sum(s.received for s in subs),
+        "decisions_posted": backend.decisions_posted,
+        "tracks_queued": len(backend.queue),
+        "history_in_memory": len(agent.decision_history),
+    }
+    if instrumentation is not None:
+        results["metrics"] = instrumentation.metrics_line()
+    return results
+
+
+async def simulate_sessions(
+    sessions: int,
+    cycles: int,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    llm_concurrency: int = 8,
+    subscribers: int = 5,
+    crowd_size: int = 200,
+    seed: int | None = None,
+    stream: bool = False,
+    quiet: bool = True,
+) -> dict:
+    """Run `sessions` rooms for `cycles` decisions each under one AgentRuntime."""
+    backend = FakeBackend(SyntheticCrowd(crowd_size, seed=seed))
+    ws_server = FakeWSServer()
+    await backend.start()
+    await ws_server.start()
+    subs = [Subscriber(ws_server.url) for _ in range(subscribers)]
+    for sub in subs:
+        await sub.start()
+
+    runner = StubRunner(latency_ms=latency_ms, jitter_ms=jitter_ms, seed=seed)
+    runtime = AgentRuntime(
+        runner=runner,
+        llm_concurrency=llm_concurrency,
+        next_js_base_url=backend.base_url,
+        ws_server_url=ws_server.url,
+        log_dir=None,
+        time_scale=0,
+        stream=stream,
+    )
+
+    start = time.perf_counter()
+    try:
+        out = io.StringIO() if quiet else None
+        with contextlib.redirect_stdout(out) if quiet else contextlib.nullcontext():
+            for i in range(sessions):
+                runtime.add_session(f"SIM{i:03d}", max_cycles=cycles)
+            await runtime.wait()
+        stats = runtime.stats()
+    finally:
+        elapsed = time.perf_counter() - start
+        await runtime.close()
+        await asyncio.sleep(0.1)
+        for sub in subs:
+            await sub.stop()
+        await ws_server.stop()
+        await backend.stop()
+
+    per_session = stats["sessions"].values()
+    decision_p50 = [s["decisionLatency"].get("p50", 0) for s in per_session]
+    decision_p90 = [s["decisionLatency"].get("p90", 0) for s in per_session]
+    return {
+        "sessions": sessions,
+        "cycles_per_session": cycles,
+        "elapsed_s": round(elapsed, 3),
+        "decisions": sum(s["decisions"] for s in per_session),
+        "llm_calls": runner.calls,
+        "fallbacks_used": sum(s["fallbacks"] for s in per_session),
+        "scheduler": stats["scheduler"],
+        # Spread of the per-session percentiles: fair queuing keeps these close
+        "decision_p50_s": {"min": min(decision_p50), "max": max(decision_p50)},
+        "decision_p90_s": {"min": min(decision_p90), "max": max(decision_p90)},
+        "decisions_posted": backend.decisions_posted,
+        "broadcasts": ws_server.messages_in,
+        "per_session": {code: {"decisions": s["decisions"], "decision_s": s["decisionLatency"],
+                               "queue_wait_s": s["llmQueueWait"]}
+                        for code, s in stats["sessions"].items()},
+    }
+
+
+class PlaybackModel:
+    """Virtual-time music queue: jobs take a random generation time, ready tracks play back to back."""
+
+    def __init__(self, rng: random.Random, gen_mean_s: float = 35.0, gen_sigma: float = 0.3,
+                 slow_rate: float = 0.1, slow_s: float = 60.0):
+        self.rng = rng
+        self.gen_mean_s = gen_mean_s
+        self.gen_sigma = gen_sigma
+        self.slow_rate = slow_rate
+        self.slow_s = slow_s
+        self.now = 1_700_000_000.0  # Wall-clock-like seconds; the queue speaks ms
+        self.items: list[dict] = []
+        self._done_at: dict[str, float] = {}
+        self.started = False
+        self.dry_s = self.played_s = self.generated_s = 0.0
+        self.jobs = 0
+        self.buffer_samples: list[float] = []
+
+    def snapshot(self) -> dict:
+        return {"queue": [dict(i) for i in self.items]}
+
+    def submit(self, spec: dict) -> dict:
+        latency = self.rng.lognormvariate(0, self.gen_sigma) * self.gen_mean_s
+        if self.rng.random() < self.slow_rate:
+            latency += self.slow_s
+        item = {"id": f"job-{self.jobs}", "status": "generating", "createdAt": self.now * 1000,
+                "duration_seconds": spec.get("duration_seconds", 30)}
+        self._done_at[item["id"]] = self.now + latency
+        self.items.append(item)
+        self.jobs += 1
+        self.generated_s += item["duration_seconds"]
+        return item
+
+    def step(self, dt: float):
+        self.now += dt
+        for item in self.items:
+            if item["status"] == "generating" and self.now >= self._done_at[item["id"]]:
+                item["status"], item["readyAt"] = "ready", self.now * 1000
+        playing = [i for i in self.items if i["status"] == "playing"]
+        if playing and self.now >= playing[0]["startedAt"] / 1000 + playing[0]["duration_seconds"]:
+            self.played_s += playing[0]["duration_seconds"]
+            self.items.remove(playing[0])
+            playing = []
+        if not playing:
+            ready = next((i for i in self.items if i["status"] == "ready"), None)
+            if ready is not None:
+                ready["status"], ready["startedAt"] = "playing", self.now * 1000
+                self.started = True
+            elif self.started:
+                self.dry_s += dt
+        self.buffer_samples.append(sum(i["duration_seconds"] for i in self.items if i["status"] == "ready"))
+
+    def results(self, hours: float) -> dict:
+        leftover = sum(i["duration_seconds"] for i in self.items if i["status"] != "playing")
+        return {
+            "jobs": self.jobs,
+            "generated_s": round(self.generated_s),
+            "played_s": round(self.played_s),
+            "dry_s": round(self.dry_s),
+            "dry_pct": round(self.dry_s / (hours * 3600) * 100, 2),
+            "unplayed_at_end_s": round(leftover),
+            "mean_ready_buffer_s": round(sum(self.buffer_samples) / max(1, len(self.buffer_samples)), 1),
+        }
+
+
+async def simulate_playback(hours: float = 4.0, seed: int | None = None) -> dict:
+    """Hours of virtual playback: horizon-driven scheduler vs. queueing when the queue is empty."""
+    results = {}
+    spec = {"prompt": "Simulated track", "duration_seconds": 30}
+
+    # Baseline: what the rule tier does, checked once per 20 s decision cycle
+    model = PlaybackModel(random.Random(seed))
+    for t in range(int(hours * 3600)):
+        if t % 20 == 0 and not any(i["status"] in ("generating", "ready") for i in model.items):
+            model.submit(spec)
+        model.step(1.0)
+    results["queue_when_empty"] = model.results(hours)
+
+    model = PlaybackModel(random.Random(seed))
+
+    async def fetch_queue() -> dict:
+        return model.snapshot()
+
+    async def submit(track: dict, reasoning: str) -> dict:
+        return model.submit(track)
+
+    scheduler = GenerationScheduler(fetch_queue, submit, lambda: spec, clock=lambda: model.now)
+    for t in range(int(hours * 3600)):
+        if t % int(SCHEDULER_TICK_S) == 0:
+            await scheduler.tick()
+        model.step(1.0)
+    results["horizon_scheduler"] = {
+        **model.results(hours),
+        "learned_latency_p90_s": round(scheduler.latency.estimate(), 1),
+    }
+    return results
+
+
+async def simulate_restart(latency_ms: float = 0.0, seed: int | None = None, quiet: bool = True) -> dict:
+    """Time to first action for a cold start vs. a restart from the cold run's snapshot."""
+    backend = FakeBackend(SyntheticCrowd(200, seed=seed))
+    ws_server = FakeWSServer()
+    await backend.start()
+    await ws_server.start()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, "state.json")
+        try:
+            for run in ("cold", "warm"):
+                out = io.StringIO() if quiet else None
+                with contextlib.redirect_stdout(out) if quiet else contextlib.nullcontext():
+                    agent = DJAgent(
+                        runner=StubRunner(latency_ms=latency_ms, seed=seed),
+                        next_js_base_url=backend.base_url,
+                        ws_server_url=ws_server.url,
+                        decision_log_path=None,
+                        snapshot_path=snapshot_path,
+                    )
+                    try:
+                        await agent.run_loop(max_cycles=1)
+                    finally:
+                        await agent.close()
+                results[run] = {
+                    "restored": agent.restored,
+                    "time_to_first_action_s": round(agent.first_action_s or 0, 3),
+                    "set_minutes": round(agent.get_set_timeline_minutes(), 2),
+                    "decisions_in_context": len(agent.decision_history),
+                }
+            results["snapshot_bytes"] = os.path.getsize(snapshot_path)
+        finally:
+            await ws_server.stop()
+            await backend.stop()
+    return results
+
+
+def load_script(path: str) -> list[dict]:
+    """Load scripted decisions from a JSON array or JSONL file."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline DJ Agent simulation")
+    parser.add_argument("--cycles", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub LLM base latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="stub LLM latency jitter")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of stalled LLM calls")
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="extra latency of stalled calls")
+    parser.add_argument("--subscribers", type=int, default=5, help="simulated WS clients")
+    parser.add_argument("--crowd-size", type=int, default=200)
+    parser.add_argument("--script", help="JSON/JSONL file of decisions to replay")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--stream", action="store_true", help="stream and parse decisions incrementally")
+    parser.add_argument("--verbose", action="store_true", help="show agent output")
+    parser.add_argument("--metrics", action="store_true", help="instrument the agent (loop lag, spans)")
+    parser.add_argument("--playback-hours", type=float, default=0,
+                        help="simulate generation scheduling over H hours of virtual playback")
+    parser.add_argument("--restart", action="store_true",
+                        help="compare cold start with a restart from a state snapshot")
+    parser.add_argument("--sessions", type=int, default=0, help="run N rooms under AgentRuntime")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="LLM slots shared by the rooms")
+    args = parser.parse_args()
+
+    if args.playback_hours:
+        print(json.dumps(asyncio.run(simulate_playback(args.playback_hours, args.seed)), indent=2))
+        return
+
+    if args.restart:
+        results = asyncio.run(simulate_restart(args.latency_ms, args.seed, quiet=not args.verbose))
+        print(json.dumps(results, indent=2))
+        return
+
+    if args.sessions:
+        results = asyncio.run(simulate_sessions(
+            sessions=args.sessions,
+            cycles=args.cycles,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            llm_concurrency=args.llm_concurrency,
+            subscribers=args.subscribers,
+            crowd_size=args.crowd_size,
+            seed=args.seed,
+            stream=args.stream,
+            quiet=not args.verbose,
+        ))
+        print(json.dumps(results, indent=2))
+        return
+
+    results = asyncio.run(simulate(
+        cycles=args.cycles,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        subscribers=args.subscribers,
+        crowd_size=args.crowd_size,
+        script=load_script(args.script) if args.script else None,
+        seed=args.seed,
+        stream=args.stream,
+        quiet=not args.verbose,
+        metrics=args.metrics,
+    ))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -87,6 +87,12 @@ async def test():
     except Exception as e:
         print(f"   ⚠️  Post error (non-fatal): {e}")
 
+    # Flush the background WS broadcaster before exiting
+    await agent.close()
+    ws = agent.broadcaster.stats()
+    print(f"\n[9] WS broadcaster: sent={ws['messagesSent']} msgs, dropped={ws['dropped']}, "
+          f"reconnects={ws['reconnects']}")
+
     print("\n" + "=" * 60)
     print("  ✅ ALL TESTS PASSED — Agent is working!")
     print("=" * 60)
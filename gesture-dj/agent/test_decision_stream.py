@@ -0,0 +1,49 @@
+"""Quick check of the streamed-decision parser — feeds decisions split at every position."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+from decision_stream import DecisionStreamParser
+
+DECISION = (
+    '```json\n{"reasoning": "Crowd says \\"more\\" {bass} [now] \\\\ go", '
+    '"actions": [{"type": "adjust_energy", "value": 0.1}, '
+    '{"type": "change_viz_theme", "value": "neon \\"}\\" \\u00e9"}, '
+    '{"type": "bogus", "value": 1}, '
+    '{"type": "generate_track", "value": {"prompt": "a, b: [c]", "bpm": 128}}], '
+    '"confidence": 0.8, "next_check_seconds": 20}\n```'
+)
+
+
+def feed_all(chunks: list[str]) -> list[tuple[str, object]]:
+    parser = DecisionStreamParser()
+    events = []
+    for chunk in chunks:
+        events += parser.feed(chunk)
+    assert parser.done, "decision never closed"
+    return events
+
+
+def test():
+    expected = feed_all([DECISION])
+    kinds = [kind for kind, _ in expected]
+    assert kinds == ["action", "action", "invalid", "action", "decision"], kinds
+    assert expected[1][1]["value"] == 'neon "}" é', expected[1][1]
+    assert expected[-1][1]["reasoning"] == 'Crowd says "more" {bass} [now] \\ go'
+
+    # Every split point, including inside strings and between a backslash and what it escapes
+    for i in range(len(DECISION) + 1):
+        assert feed_all([DECISION[:i], DECISION[i:]]) == expected, f"split at {i}"
+    # One character at a time
+    assert feed_all(list(DECISION)) == expected
+
+    # Nothing after the decision closes is parsed
+    parser = DecisionStreamParser()
+    parser.feed('{"actions": []} {"actions": [{"type": "adjust_bpm", "value": 2}]}')
+    assert parser.done and parser.feed("{}") == []
+
+    print(f"✅ Decision stream parser: {len(DECISION) + 1} splits + per-character feed OK")
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,88 @@
+"""
+Read-only view of the music library index built by demo_1/track_index.py.
+
+Gives the agent real BPM/key/energy figures for the tracks on disk instead of
+guessing from genre names. The SQLite file is re-read only when it changes,
+so querying from every decision cycle is cheap.
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+TRACK_INDEX_PATH = os.getenv(
+    "TRACK_INDEX_PATH",
+    str(Path(__file__).resolve().parents[2] / "demo_1" / "cache" / "track_index.sqlite"),
+)
+
+# Stem file names used by demo_1 stem folders, in mixer order
+STEM_NAMES = ["drums", "bass", "melody", "vocals"]
+
+
+class TrackLibrary:
+    """In-memory snapshot of the track index, refreshed when the file changes."""
+
+    def __init__(self, db_path: str = TRACK_INDEX_PATH):
+        self.db_path = Path(db_path)
+        self._tracks: list[dict] = []
+        self._stamp = None
+
+    def _refresh(self):
+        try:
+            # The WAL file changes on every write, the main file only on checkpoint
+            stamp = tuple(
+                p.stat().st_mtime_ns if p.exists() else 0
+                for p in (self.db_path, self.db_path.with_name(self.db_path.name + "-wal"))
+            )
+        except OSError:
+            return
+        if stamp == self._stamp or not self.db_path.exists():
+            return
+
+        try:
+            db = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            try:
+                rows = db.execute(
+                    "SELECT f.path, t.bpm, t.key, t.duration_s, t.energy "
+                    "FROM files f JOIN tracks t ON t.hash = f.hash"
+                ).fetchall()
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            print(f"[DJ Agent] Track index unreadable: {e}")
+            return
+
+        tracks = {}
+        for path, bpm, key, duration_s, energy in rows:
+            path = Path(path)
+            stem = path.stem.lower()
+            if stem in STEM_NAMES:
+                # One entry per stem folder, described by its highest-ranked stem
+                name, rank = path.parent.name, STEM_NAMES.index(stem)
+            else:
+                name, rank = path.stem, -1
+            if name in tracks and tracks[name][0] <= rank:
+                continue
+            curve = np.frombuffer(energy, dtype=np.float16) if energy else np.zeros(1)
+            tracks[name] = (rank, {
+                "name": name,
+                "bpm": round(bpm, 1),
+                "key": key,
+                "duration_s": round(duration_s, 1),
+                "energy": round(float(curve.mean()), 3),
+            })
+        self._tracks = [track for _, track in tracks.values()]
+        self._stamp = stamp
+
+    def tracks(self) -> list[dict]:
+        """All analyzed tracks: name, bpm, key, duration_s, mean energy (RMS)."""
+        self._refresh()
+        return self._tracks
+
+    def nearest_bpm(self, bpm: float, limit: int = 5) -> list[dict]:
+        """Tracks closest in tempo to `bpm`, counting half/double time as a match."""
+        def distance(track):
+            return min(abs(track["bpm"] * m - bpm) for m in (0.5, 1.0, 2.0))
+        return sorted(self.tracks(), key=distance)[:limit]
@@ -70,7 +70,16 @@ wss.on('connection', (ws: WebSocket, req: http.IncomingMessage) => {
   clients.set(clientId, { ws, type: clientType, connectedAt: Date.now() });
   console.log(`[WS] Client connected: ${clientId} (${clientType})`);
 
-  ws.on('message', (rawData: Buffer) => {
+  ws.on('message', (rawData: Buffer, isBinary: boolean) => {
+    if (isBinary) {
+      // Binary frames are the audio engine's analysis feed (src/lib/audio-frame.ts):
+      // forwarded untouched, never parsed, so the fan-out costs one send per client
+      if (clientType === 'cv') {
+        broadcast('viz', rawData);
+        broadcast('dashboard', rawData);
+      }
+      return;
+    }
     try {
       const msg = JSON.parse(rawData.toString());
       const source = msg.source || clientType;
@@ -119,12 +128,18 @@ wss.on('connection', (ws: WebSocket, req: http.IncomingMessage) => {
 
 let latestAgentDecision: unknown = null;
 
+// Skip binary analysis frames for clients this far behind: the next frame
+// supersedes them anyway, and queueing would only add latency
+const MAX_BUFFERED_BINARY = 64 * 1024;
+
 function broadcast(targetType: string, msg: unknown) {
-  const payload = typeof msg === 'string' ? msg : JSON.stringify(msg);
+  const binary = Buffer.isBuffer(msg);
+  const payload = binary || typeof msg === 'string' ? msg : JSON.stringify(msg);
   let sent = 0;
   for (const [, client] of clients) {
     if (client.type === targetType && client.ws.readyState === WebSocket.OPEN) {
-      client.ws.send(payload);
+      if (binary && client.ws.bufferedAmount > MAX_BUFFERED_BINARY) continue;
+      client.ws.send(payload as Buffer | string);
       sent++;
     }
   }
@@ -10,6 +10,8 @@ export interface MusicQueueItem {
   duration_seconds: number;
   status: 'queued' | 'generating' | 'ready' | 'playing' | 'failed';
   createdAt: number;
+  readyAt?: number;   // Generation latency = readyAt - createdAt (agent's scheduler learns it)
+  startedAt?: number; // When playback began; remaining = duration_seconds - elapsed
   audioUrl?: string;
   error?: string;
   agentReasoning?: string;
@@ -99,6 +101,10 @@ export async function PATCH(req: NextRequest) {
       return NextResponse.json({ error: 'Item not found' }, { status: 404 });
     }
 
+    if (status && status !== item.status) {
+      if (status === 'ready') item.readyAt = Date.now();
+      if (status === 'playing') item.startedAt = Date.now();
+    }
     if (status) item.status = status;
     if (audioUrl) item.audioUrl = audioUrl;
     if (error) {
@@ -18,6 +18,18 @@ function broadcastVote(vote: Vote, aggregation: VoteAggregation) {
   }).catch(() => { /* non-fatal — WS server may not be running */ });
 }
 
+// When set, votes go to the DJ Booth server's vote service (web/votes.py):
+// rate limits, aggregation and broadcasts live there, shared by every
+// Next.js instance, and broadcasts are coalesced instead of one per vote.
+const VOTE_SERVICE_URL = process.env.VOTE_SERVICE_URL;
+
+async function proxyToVoteService(path: string, init?: RequestInit) {
+  const res = await fetch(`${VOTE_SERVICE_URL}${path}`, init);
+  const body = await res.json();
+  // FastAPI errors are {detail}; clients of this route expect {error}
+  return NextResponse.json(res.ok ? body : { error: body.detail ?? 'Vote service error' }, { status: res.status });
+}
+
 const VALID_VOTE_TYPES: VoteType[] = [
   'energy_up',
   'energy_down',
@@ -43,6 +55,13 @@ setInterval(() => {
 export async function POST(req: NextRequest) {
   try {
     const body = await req.json();
+    if (VOTE_SERVICE_URL) {
+      return await proxyToVoteService('/api/vote', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body),
+      });
+    }
     const { userId, voteType, voteValue, sessionCode } = body;
 
     if (!userId || !voteType) {
@@ -104,6 +123,14 @@ export async function POST(req: NextRequest) {
 
 export async function GET(req: NextRequest) {
   const sessionCode = req.nextUrl.searchParams.get('session') || undefined;
+  if (VOTE_SERVICE_URL) {
+    try {
+      return await proxyToVoteService(`/api/vote${sessionCode ? `?session=${encodeURIComponent(sessionCode)}` : ''}`);
+    } catch (error) {
+      console.error('Vote service error:', error);
+      return NextResponse.json({ error: 'Vote service unavailable' }, { status: 502 });
+    }
+  }
   const aggregator = getAggregator(sessionCode);
   const aggregation = aggregator.getLatestAggregation();
   const recentVotes = aggregator.getRecentVotes(20);
@@ -282,6 +282,7 @@ function DashboardContent() {
         let staleTimer: ReturnType<typeof setTimeout> | null = null;
 
         ws.onmessage = (event) => {
+          if (typeof event.data !== 'string') return; // Binary audio analysis frames (projector)
           try {
             const msg = JSON.parse(event.data);
             if (msg.source === 'cv' && msg.type === 'gesture_update' && msg.data) {
@@ -310,6 +311,13 @@ function DashboardContent() {
               if (msg.data.aggregation) setAggregation(msg.data.aggregation);
               if (msg.data.vote) setRecentVotes((prev) => prev.some((v) => v.id === msg.data.vote.id) ? prev : [...prev.slice(-19), msg.data.vote]);
             }
+            // Coalesced updates from the Python vote service: several votes per message
+            if (msg.source === 'votes' && msg.type === 'vote_update' && msg.data
+                && (msg.data.session ?? '__global__') === (sessionCode || '__global__')) {
+              if (msg.data.aggregation) setAggregation(msg.data.aggregation);
+              const votes: Vote[] = msg.data.votes || [];
+              if (votes.length) setRecentVotes((prev) => [...prev, ...votes.filter((v) => !prev.some((p) => p.id === v.id))].slice(-20));
+            }
           } catch { /* ignore parse errors */ }
         };
 
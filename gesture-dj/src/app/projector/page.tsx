@@ -3,6 +3,7 @@
 import { useEffect, useRef, useCallback, useState } from 'react';
 import * as THREE from 'three';
 import { GLTFLoader } from 'three/addons/loaders/GLTFLoader.js';
+import { AudioFrame, bandSummary, decodeAudioFrame } from '@/lib/audio-frame';
 
 // ─── Types ───────────────────────────────────────────────────────────────────
 
@@ -25,6 +26,9 @@ const DEFAULT_PALETTES: Record<string, string[]> = {
   matrix: ['#00ff00', '#008800', '#00ff88', '#44ff44'],
 };
 
+// Fall back to mic/simulated audio when engine frames stop arriving
+const ENGINE_FRAME_STALE_MS = 250;
+
 const DEFAULT_PARAMS: VizParams = {
   colorPalette: DEFAULT_PALETTES.neon,
   vizTheme: 'neon',
@@ -44,6 +48,8 @@ export default function ProjectorPage() {
   const audioDataRef = useRef<{ bass: number; mid: number; high: number; raw: Uint8Array<ArrayBuffer> | null }>({
     bass: 0, mid: 0, high: 0, raw: null,
   });
+  // Latest analysis frame from the DJ audio engine (the real mix, preferred over mic)
+  const engineFrameRef = useRef<{ frame: AudioFrame; receivedAt: number } | null>(null);
   const [started, setStarted] = useState(false);
   const initRef = useRef(false);
   const animFrameRef = useRef<number>(0);
@@ -158,7 +164,17 @@ export default function ProjectorPage() {
     const hexToThreeColor = (hex: string) => new THREE.Color(hex);
 
     const getAudioBands = () => {
-      if (analyser && freqData) {
+      const engine = engineFrameRef.current;
+      if (engine && performance.now() - engine.receivedAt < ENGINE_FRAME_STALE_MS) {
+        const { bass, mid, high } = bandSummary(engine.frame.bands);
+        // Onsets kick the bass so transients read even on sustained low end
+        audioDataRef.current = {
+          bass: engine.frame.onset ? Math.max(bass, 1) : bass,
+          mid,
+          high,
+          raw: null,
+        };
+      } else if (analyser && freqData) {
         analyser.getByteFrequencyData(freqData);
         const len = freqData.length;
         let bass = 0, mid = 0, high = 0;
@@ -287,11 +303,19 @@ export default function ProjectorPage() {
       try {
         ws = new WebSocket(`${process.env.NEXT_PUBLIC_WS_URL || 'ws://localhost:8080'}?type=viz`);
 
+        ws.binaryType = 'arraybuffer';
+
         ws.onopen = () => {
           console.log('[Projector WS] Connected as viz client');
         };
 
         ws.onmessage = (event) => {
+          // Binary messages are the audio engine's spectrum/level feed
+          if (event.data instanceof ArrayBuffer) {
+            const frame = decodeAudioFrame(event.data);
+            if (frame) engineFrameRef.current = { frame, receivedAt: performance.now() };
+            return;
+          }
           try {
             const msg = JSON.parse(event.data);
             const p = paramsRef.current;
@@ -0,0 +1,55 @@
+// Decoder for the audio engine's binary analysis frames (demo_1/analysis_tap.py).
+//
+// Layout, little-endian:
+//   magic 'AF' | version u8 | flags u8 (bit0 onset, bit1 degraded)
+//   | seq u32 | t_ms u32 | rms u16 | peak u16 | band count u8 | bands u8[]
+
+export interface AudioFrame {
+  seq: number;
+  tMs: number;
+  rms: number;       // 0-1 linear
+  peak: number;      // 0-1 linear
+  bands: number[];   // 0-1, log-spaced 40 Hz - 16 kHz, dB-scaled
+  onset: boolean;
+  degraded: boolean; // engine is shrinking FFT/rate to stay in its CPU budget
+}
+
+const HEADER_BYTES = 17;
+const VERSION = 1;
+
+export function decodeAudioFrame(buffer: ArrayBuffer): AudioFrame | null {
+  if (buffer.byteLength < HEADER_BYTES) return null;
+  const view = new DataView(buffer);
+  if (view.getUint8(0) !== 0x41 || view.getUint8(1) !== 0x46 || view.getUint8(2) !== VERSION) {
+    return null;
+  }
+  const flags = view.getUint8(3);
+  const count = view.getUint8(16);
+  if (buffer.byteLength < HEADER_BYTES + count) return null;
+
+  const bands = new Array<number>(count);
+  for (let i = 0; i < count; i++) bands[i] = view.getUint8(HEADER_BYTES + i) / 255;
+
+  return {
+    seq: view.getUint32(4, true),
+    tMs: view.getUint32(8, true),
+    rms: view.getUint16(12, true) / 65535,
+    peak: view.getUint16(14, true) / 65535,
+    bands,
+    onset: (flags & 0x01) !== 0,
+    degraded: (flags & 0x02) !== 0,
+  };
+}
+
+// Collapse bands into the bass/mid/high triple the visuals use
+export function bandSummary(bands: number[]): { bass: number; mid: number; high: number } {
+  const avg = (from: number, to: number) => {
+    let sum = 0;
+    for (let i = from; i < to; i++) sum += bands[i];
+    return to > from ? sum / (to - from) : 0;
+  };
+  const n = bands.length;
+  const bassEnd = Math.max(1, Math.round(n / 4));
+  const midEnd = Math.max(bassEnd + 1, Math.round((n * 5) / 8));
+  return { bass: avg(0, bassEnd), mid: avg(bassEnd, midEnd), high: avg(midEnd, n) };
+}
@@ -0,0 +1,67 @@
+// Decoder for the web server's binary deck state frames (web/state_channel.py,
+// /ws/state?type=viewer).
+//
+// Layout, little-endian:
+//   magic 'DS' | version u8 | flags u8 (bit0 playing, bit1 loading, bit2 hand,
+//   bit3 pinching) | seq u32 | t_ms u32 | track u8 | stem i8 | fingers u8
+//   | volume u8 | stem count u8 | fx count u8 | volumes u8[] | fx counts u16[]
+
+export interface DeckState {
+  seq: number;
+  tMs: number;
+  track: number;
+  selectedStem: number;  // -1 = none
+  fingers: number;
+  volume: number;        // 0-1 (pinch volume of the selected stem)
+  stemVolumes: number[]; // 0-1
+  fxCounts: number[];    // triggers per pad so far; diff against the last frame
+  playing: boolean;
+  loading: boolean;
+  handDetected: boolean;
+  pinching: boolean;
+}
+
+const HEADER_BYTES = 18;
+const VERSION = 1;
+
+export function decodeDeckState(buffer: ArrayBuffer): DeckState | null {
+  if (buffer.byteLength < HEADER_BYTES) return null;
+  const view = new DataView(buffer);
+  if (view.getUint8(0) !== 0x44 || view.getUint8(1) !== 0x53 || view.getUint8(2) !== VERSION) {
+    return null;
+  }
+  const flags = view.getUint8(3);
+  const stems = view.getUint8(16);
+  const fx = view.getUint8(17);
+  if (buffer.byteLength < HEADER_BYTES + stems + fx * 2) return null;
+
+  const stemVolumes = new Array<number>(stems);
+  for (let i = 0; i < stems; i++) stemVolumes[i] = view.getUint8(HEADER_BYTES + i) / 255;
+  const fxCounts = new Array<number>(fx);
+  for (let i = 0; i < fx; i++) fxCounts[i] = view.getUint16(HEADER_BYTES + stems + i * 2, true);
+
+  return {
+    seq: view.getUint32(4, true),
+    tMs: view.getUint32(8, true),
+    track: view.getUint8(12),
+    selectedStem: view.getInt8(13),
+    fingers: view.getUint8(14),
+    volume: view.getUint8(15) / 255,
+    stemVolumes,
+    fxCounts,
+    playing: (flags & 0x01) !== 0,
+    loading: (flags & 0x02) !== 0,
+    handDetected: (flags & 0x04) !== 0,
+    pinching: (flags & 0x08) !== 0,
+  };
+}
+
+// Pads triggered between two frames (counters wrap at 65536)
+export function fxTriggered(prev: DeckState | null, next: DeckState): number[] {
+  const pads: number[] = [];
+  next.fxCounts.forEach((count, i) => {
+    const before = prev?.fxCounts[i] ?? 0;
+    if (count !== before) pads.push(i + 1);
+  });
+  return pads;
+}
@@ -60,7 +60,8 @@ export type AgentActionType =
   | 'change_fx'
   | 'set_filter'
   | 'set_camera_mode'
-  | 'set_color_palette';
+  | 'set_color_palette'
+  | 'set_stem';
 
 export interface AgentAction {
   type: AgentActionType;
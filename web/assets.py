@@ -0,0 +1,154 @@
+"""
+Pre-compressed, content-hashed static assets for production serving.
+
+At startup every file under static/ is hashed and, if compressible, written
+once as gzip (and brotli, when the brotli package is installed) to the
+cache directory. Each asset is then reachable under two URLs:
+
+    /static/js/main.js            revalidated (ETag, no-cache)
+    /static/js/main.3f2ac1d0.js   immutable (content hash in the name)
+
+index.html is served with its /static references rewritten to the hashed
+names, so browsers fetch each build's entry points once and never
+revalidate them. ES module imports inside JS stay relative and resolve to
+the plain names; those are answered with 304 from the in-memory metadata
+without touching the disk.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {'.js', '.mjs', '.css', '.html', '.svg', '.json', '.map', '.txt', '.wasm'}
+MIN_COMPRESS_BYTES = 512  # Smaller bodies gain nothing over the headers
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}  # Preference order
+REVALIDATE = 'no-cache'  # Plain names: cached, but checked against the ETag
+
+# Entity tags in an If-None-Match list (quoted, optionally weak) or a bare *
+ENTITY_TAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+# /static/... references in HTML attributes (an optional ?v= cache-buster is dropped)
+STATIC_REF = re.compile(r'''(["'])/static/([^"'?#]+)(?:\?[^"'#]*)?\1''')
+
+
+@dataclass
+class Asset:
+    path: Path  # Identity body
+    media_type: str
+    etag: str
+    hashed_name: str  # 'js/main.3f2ac1d0.js'
+    size: int
+    encoded: Dict[str, Tuple[Path, int]] = field(default_factory=dict)  # encoding -> (file, size)
+
+
+def hashed_name(rel: str, digest: str) -> str:
+    path = Path(rel)
+    return path.with_name(f"{path.stem}.{digest[:8]}{path.suffix}").as_posix()
+
+
+def pick_encoding(asset: Asset, accept_encoding: str) -> Optional[str]:
+    """Best pre-compressed variant the client accepts (None = identity)."""
+    accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+    for encoding in ENCODING_SUFFIXES:
+        if encoding in asset.encoded and encoding in accepted:
+            return encoding
+    return None
+
+
+def etag_matches(if_none_match: str, *etags: str) -> bool:
+    """
+    Whether an If-None-Match header matches any of `etags`: a list of
+    entity tags compared weakly (a W/ prefix is ignored), or *.
+    """
+    candidates = {etag.removeprefix('W/') for etag in etags}
+    for tag in ENTITY_TAG.findall(if_none_match):
+        if tag == '*' or tag.removeprefix('W/') in candidates:
+            return True
+    return False
+
+
+class AssetCache:
+    """Metadata and compressed variants of the static tree, built once."""
+
+    def __init__(self, static_dir: Path, cache_dir: Path):
+        """
+        Args:
+            static_dir: Served tree (static/)
+            cache_dir: Where compressed variants and the rendered index are written
+        """
+        self.static_dir = static_dir
+        self.cache_dir = cache_dir
+        self.assets: Dict[str, Asset] = {}  # plain and hashed relative names -> asset
+        self.index: Optional[Asset] = None
+
+    def build(self):
+        """Hash and compress every static file (unchanged variants are reused)."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        assets = {}
+        files = compressed = 0
+        for path in sorted(self.static_dir.rglob('*')):
+            if not path.is_file():
+                continue
+            rel = path.relative_to(self.static_dir).as_posix()
+            asset = self._asset(path, path.read_bytes(), rel)
+            files += 1
+            compressed += bool(asset.encoded)
+            assets[rel] = assets[asset.hashed_name] = asset
+        self.assets = assets
+
+        # The page itself: references rewritten to the hashed names
+        html = (self.static_dir / 'index.html').read_text(encoding='utf-8')
+        rendered = STATIC_REF.sub(self._rewrite, html).encode()
+        index_path = self.cache_dir / 'index.html'
+        if not index_path.is_file() or index_path.read_bytes() != rendered:
+            tmp = index_path.with_name(f".index.html.{os.getpid()}.tmp")
+            tmp.write_bytes(rendered)
+            tmp.replace(index_path)
+        self.index = self._asset(index_path, rendered, 'index.html')
+        print(f"[Assets] {files} files, {compressed} pre-compressed "
+              f"({', '.join(e for e in ENCODING_SUFFIXES if e != 'br' or brotli)})")
+
+    def _rewrite(self, match: re.Match) -> str:
+        quote, rel = match.group(1), match.group(2)
+        asset = self.assets.get(rel)
+        return f"{quote}/static/{asset.hashed_name if asset else rel}{quote}"
+
+    def _asset(self, path: Path, data: bytes, rel: str) -> Asset:
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        media_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        if media_type.startswith('text/') or media_type == 'application/javascript':
+            media_type += '; charset=utf-8'
+        asset = Asset(path, media_type, f'"{digest}"', hashed_name(rel, digest), len(data))
+        if path.suffix.lower() not in COMPRESSIBLE or len(data) < MIN_COMPRESS_BYTES:
+            return asset
+        for encoding, suffix in ENCODING_SUFFIXES.items():
+            if encoding == 'br' and brotli is None:
+                continue
+            target = self.cache_dir / f"{digest}{suffix}"
+            if not target.is_file():
+                body = brotli.compress(data, quality=11) if encoding == 'br' \
+                    else gzip.compress(data, compresslevel=9, mtime=0)
+                if len(body) >= len(data):
+                    continue
+                tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+                tmp.write_bytes(body)
+                tmp.replace(target)
+            asset.encoded[encoding] = (target, target.stat().st_size)
+        return asset
+
+    def get(self, rel: str) -> Tuple[Optional[Asset], bool]:
+        """(asset, immutable) for a path under /static; (None, False) if unknown."""
+        asset = self.assets.get(rel)
+        if asset is None:
+            return None, False
+        return asset, rel == asset.hashed_name
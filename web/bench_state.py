@@ -0,0 +1,131 @@
+"""
+Fan-out benchmark for the deck state channel (/ws/state).
+
+Connects N viewers and one deck publisher to a running server, publishes
+deltas at a fixed rate and reports delivered frames per second, publish to
+receive latency, and the server's drop counters:
+
+    python bench_state.py                                  # 500 viewers, localhost:8000
+    python bench_state.py --viewers 500 --slow 25 --rate 240 --duration 10
+
+--slow viewers handle one frame every 200 ms and acknowledge each one
+(ack=1), so the server holds them to a small window: they should skip frames (counted
+as dropped by the server) and stay current, without slowing the others.
+"""
+
+import argparse
+import asyncio
+import json
+import struct
+import time
+import urllib.request
+from typing import Dict, List
+
+import websockets
+
+STATE_HEADER = struct.Struct('<2sBBIIBbBBBB')
+SLOW_READ_S = 0.2
+
+
+async def viewer(url: str, latencies: List[float], counts: List[int], sent_at: Dict[int, float],
+                 slow: bool, stop: asyncio.Event, ready: asyncio.Event, index: int):
+    """Receive frames, timing those whose track value we published."""
+    async with websockets.connect(url, max_size=2 ** 16) as ws:
+        await ws.recv()  # Current snapshot on subscribe
+        ready.set()
+        while not stop.is_set():
+            try:
+                frame = await asyncio.wait_for(ws.recv(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            now = time.perf_counter()
+            header = STATE_HEADER.unpack_from(frame)
+            if header[5] in sent_at:
+                latencies.append(now - sent_at[header[5]])
+            counts[index] += 1
+            if slow:
+                await asyncio.sleep(SLOW_READ_S)
+                await ws.send(str(header[3]))
+
+
+def fetch_stats(base: str) -> dict:
+    with urllib.request.urlopen(f"{base}/api/state") as resp:
+        return json.load(resp)['stats']
+
+
+async def main(args):
+    base = args.url.rstrip('/')
+    ws_base = base.replace('http://', 'ws://').replace('https://', 'wss://')
+    latencies: List[float] = []
+    slow_latencies: List[float] = []
+    counts = [0] * args.viewers
+    sent_at: Dict[int, float] = {}  # track value -> last publish time
+    stop = asyncio.Event()
+
+    readies, tasks = [], []
+    for i in range(args.viewers):
+        ready = asyncio.Event()
+        readies.append(ready)
+        tasks.append(asyncio.create_task(viewer(
+            f"{ws_base}/ws/state?type=viewer" + ("&ack=1" if i < args.slow else ""),
+            slow_latencies if i < args.slow else latencies,
+            counts, sent_at,
+            i < args.slow, stop, ready, i)))
+    started = time.perf_counter()
+    await asyncio.wait_for(asyncio.gather(*(r.wait() for r in readies)), 60)
+    print(f"{args.viewers} viewers connected in {time.perf_counter() - started:.1f} s "
+          f"({args.slow} slow)")
+
+    before = await asyncio.to_thread(fetch_stats, base)
+    async with websockets.connect(f"{ws_base}/ws/state?type=deck") as deck:
+        published = 0
+        start = time.perf_counter()
+        next_send = start
+        while time.perf_counter() - start < args.duration:
+            track = published % 256
+            sent_at[track] = time.perf_counter()
+            await deck.send(json.dumps({'track': track, 'fingers': published % 6,
+                                        'volumes': [published % 100 / 100, 0.5, 0.25]}))
+            published += 1
+            next_send += 1.0 / args.rate
+            await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+        elapsed = time.perf_counter() - start
+    await asyncio.sleep(0.5)  # Let the last frames land
+    after = await asyncio.to_thread(fetch_stats, base)  # Drop counters live with the viewers
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    frames = after['frames'] - before['frames']
+    fast = counts[args.slow:]
+    latencies.sort()
+    slow_latencies.sort()
+
+    def pct(values: List[float], q: float) -> float:
+        return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else 0.0
+
+    print(f"Published {published} deltas in {elapsed:.1f} s ({published / elapsed:.0f}/s), "
+          f"server coalesced them into {frames} frames ({frames / elapsed:.0f}/s, "
+          f"{after['frame_bytes']} bytes each)")
+    print(f"Delivered {sum(counts)} frames ({sum(counts) / elapsed:.0f}/s fan-out)")
+    if fast:
+        print(f"  normal viewers: {sum(fast) / len(fast) / elapsed:.1f} frames/s each "
+              f"(min {min(fast) / elapsed:.1f})")
+    if args.slow:
+        slow = counts[:args.slow]
+        print(f"  slow viewers:   {sum(slow) / len(slow) / elapsed:.1f} frames/s each")
+    print(f"Latency publish -> viewer: p50 {pct(latencies, 0.5):.1f} ms, "
+          f"p99 {pct(latencies, 0.99):.1f} ms")
+    if args.slow:
+        print(f"  slow viewers (staleness of what they read): p50 {pct(slow_latencies, 0.5):.1f} ms, "
+              f"p99 {pct(slow_latencies, 0.99):.1f} ms")
+    print(f"Server skipped {after['dropped']} stale frames for backed-up viewers")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the deck state channel fan-out")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--viewers", type=int, default=500)
+    parser.add_argument("--slow", type=int, default=0, help="Viewers that read slowly")
+    parser.add_argument("--rate", type=float, default=240.0, help="Deltas per second published")
+    parser.add_argument("--duration", type=float, default=10.0)
+    asyncio.run(main(parser.parse_args()))
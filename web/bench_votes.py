@@ -0,0 +1,121 @@
+"""
+Throughput benchmark for vote ingestion (votes.py, POST /api/vote).
+
+Measures the aggregator in process, then POSTs votes to a running server
+from keep-alive connections, in batches or one per request, and reports
+accepted votes per second and request latency:
+
+    python bench_votes.py                          # in process + localhost:8000, batches of 100
+    python bench_votes.py --batch 1 --connections 64   # one vote per request, like the phones
+    python bench_votes.py --url http://host:8000 --duration 30 --users 200000
+
+Votes come from a pool of --users distinct users in turn; keep the pool
+larger than the target rate (votes/s) or the per-user rate limit rejects
+some of them, which the report shows.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+from urllib.parse import urlsplit
+
+from loadtest import Connection
+from votes import VOTE_TYPES, VoteService
+
+
+def bench_in_process(users: int, votes: int) -> float:
+    """Votes per second through VoteService.ingest alone (no HTTP)."""
+    service = VoteService(broadcast_url=None)
+    pool = [{'userId': f"user-{i % users}", 'voteType': VOTE_TYPES[i % len(VOTE_TYPES)]}
+            for i in range(votes)]
+    start = time.perf_counter()
+    for i in range(0, votes, 1000):
+        service.ingest(pool[i:i + 1000])
+    elapsed = time.perf_counter() - start
+    service.aggregation()
+    return votes / elapsed
+
+
+async def bench_http(args) -> None:
+    url = urlsplit(args.url)
+    host, port = url.hostname or 'localhost', url.port or 80
+    latencies: List[float] = []
+    totals = {'accepted': 0, 'rateLimited': 0, 'invalid': 0, 'errors': 0}
+    next_user = 0
+
+    def make_body() -> bytes:
+        nonlocal next_user
+        votes = []
+        for _ in range(args.batch):
+            votes.append({'userId': f"user-{next_user % args.users}",
+                          'voteType': VOTE_TYPES[next_user % len(VOTE_TYPES)],
+                          'sessionCode': args.session})
+            next_user += 1
+        return json.dumps(votes[0] if args.batch == 1 else {'votes': votes}).encode()
+
+    headers = {'Content-Type': 'application/json'}
+    deadline = time.perf_counter() + args.duration
+
+    async def client():
+        conn = Connection(host, port)
+        while time.perf_counter() < deadline:
+            body = make_body()
+            start = time.perf_counter()
+            try:
+                status, reply = await conn.request('/api/vote', headers, body)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                totals['errors'] += 1
+                conn.close()
+                continue
+            latencies.append(time.perf_counter() - start)
+            if args.batch > 1 and status == 200:
+                result = json.loads(reply)
+                for key in ('accepted', 'rateLimited', 'invalid'):
+                    totals[key] += result[key]
+            elif status == 200:
+                totals['accepted'] += 1
+            elif status == 429:
+                totals['rateLimited'] += 1
+            elif status == 400:
+                totals['invalid'] += 1
+            else:
+                totals['errors'] += 1
+        conn.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.connections)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def pct(q: float) -> float:
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+
+    print(f"HTTP: {args.connections} connections, {args.batch} votes per request, {elapsed:.1f} s")
+    print(f"  {len(latencies) / elapsed:.0f} requests/s, {totals['accepted'] / elapsed:.0f} votes/s accepted "
+          f"({totals['rateLimited']} rate limited, {totals['invalid']} invalid, {totals['errors']} errors)")
+    print(f"  latency p50 {pct(0.5):.2f} ms, p99 {pct(0.99):.2f} ms")
+
+    conn = Connection(host, port)
+    status, reply = await conn.request(f"/api/vote?session={args.session}", {})
+    conn.close()
+    aggregation = json.loads(reply)['aggregation']
+    print(f"  aggregation: total {aggregation['total']}, voteRate {aggregation['voteRate']:.0f}/s, "
+          f"hype spike {aggregation['isHypeSpike']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vote ingestion")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=100, help="Votes per request (1 = single votes)")
+    parser.add_argument("--users", type=int, default=100000, help="Distinct voters cycled through")
+    parser.add_argument("--session", default="bench")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--skip-http", action="store_true", help="In-process benchmark only")
+    args = parser.parse_args()
+
+    print(f"In process: {bench_in_process(args.users, 500000):.0f} votes/s")
+    if not args.skip_http:
+        asyncio.run(bench_http(args))
@@ -0,0 +1,243 @@
+"""
+Library index and track manifest for the web client.
+
+The manifest lists every track folder under the music directory with its
+stems: size, content hash, duration and decode hints (codec, sample rate,
+channels, decoded size), plus the content-addressed /media URL of each
+delivery format and the /peaks URL of its waveform pyramid. It is built
+once, kept as ready-to-send JSON, and rebuilt only when a periodic stat
+walk sees a file appear, change or disappear; unchanged files are never
+re-read.
+
+Top-level audio files are listed as single-stem tracks ('mix'); the
+effects folder is listed separately.
+"""
+
+import hashlib
+import json
+import re
+import struct
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from media import AUDIO_EXTENSIONS, BITRATES, FORMATS, MediaCache
+
+EFFECTS_FOLDER = 'effects'
+
+# MPEG audio: bitrate (kbps) by [MPEG-1?][layer III?] and index; sample rates by version
+MP3_BITRATES = {
+    True: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    False: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _natural_key(name: str):
+    """Sort key so stem2 comes before stem10."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def _probe_wav(f) -> Optional[dict]:
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        return None
+    info = {}
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunk_id, size = struct.unpack('<4sI', chunk)
+        if chunk_id == b'fmt ':
+            fmt = f.read(size)
+            tag, channels, rate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+            info = {'codec': 'pcm_float' if tag == 3 else f"pcm_s{bits}",
+                    'sample_rate': rate, 'channels': channels, '_block_align': block_align}
+            f.seek(size % 2, 1)
+        elif chunk_id == b'data':
+            if info and info['_block_align']:
+                info['frames'] = size // info['_block_align']
+            break
+        else:
+            f.seek(size + size % 2, 1)
+    info.pop('_block_align', None)
+    return info or None
+
+
+def _probe_mp3(f, size: int) -> Optional[dict]:
+    head = f.read(10)
+    start = 0
+    if head[:3] == b'ID3':
+        # ID3v2 tag: syncsafe size after a 10-byte header
+        start = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+    f.seek(start)
+    data = f.read(16384)
+    for i in range(len(data) - 4):
+        if data[i] != 0xFF or (data[i + 1] & 0xE0) != 0xE0:
+            continue
+        version = (data[i + 1] >> 3) & 0x03  # 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+        layer = (data[i + 1] >> 1) & 0x03  # 1 = layer III
+        bitrate_index = data[i + 2] >> 4
+        rate_index = (data[i + 2] >> 2) & 0x03
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+        mpeg1 = version == 3
+        kbps = MP3_BITRATES[mpeg1][bitrate_index]
+        rate = MP3_SAMPLE_RATES[version][rate_index]
+        channels = 1 if (data[i + 3] >> 6) == 3 else 2
+        samples_per_frame = 1152 if mpeg1 else 576
+        # A Xing/Info header after the side info gives the exact frame count (VBR)
+        side_info = (32 if channels == 2 else 17) if mpeg1 else (17 if channels == 2 else 9)
+        xing = i + 4 + side_info
+        if data[xing:xing + 4] in (b'Xing', b'Info') and data[xing + 7] & 0x01:
+            frames = struct.unpack('>I', data[xing + 8:xing + 12])[0] * samples_per_frame
+        else:
+            frames = int((size - start - i) * 8 / (kbps * 1000) * rate)
+        return {'codec': 'mp3', 'sample_rate': rate, 'channels': channels,
+                'frames': frames, 'bitrate_kbps': kbps}
+    return None
+
+
+def _probe_flac(f) -> Optional[dict]:
+    head = f.read(42)
+    if head[:4] != b'fLaC' or len(head) < 42:
+        return None
+    # STREAMINFO: 20-bit rate, 3-bit channels-1, 5-bit bits-1, 36-bit total samples
+    packed = int.from_bytes(head[18:26], 'big')
+    return {'codec': 'flac', 'sample_rate': packed >> 44, 'channels': ((packed >> 41) & 0x7) + 1,
+            'frames': packed & 0xFFFFFFFFF}
+
+
+def probe(path: Path) -> dict:
+    """
+    Decode hints from a file's headers (no decoding).
+
+    Returns:
+        codec, container, and where known sample_rate, channels, duration_s
+        and decoded_bytes (float32 AudioBuffer size)
+    """
+    suffix = path.suffix.lower()
+    info = None
+    try:
+        with open(path, 'rb') as f:
+            if suffix == '.wav':
+                info = _probe_wav(f)
+            elif suffix == '.mp3':
+                info = _probe_mp3(f, path.stat().st_size)
+            elif suffix == '.flac':
+                info = _probe_flac(f)
+    except (OSError, struct.error, IndexError):
+        info = None
+    info = dict(info or {'codec': suffix.lstrip('.')})
+    info['container'] = suffix.lstrip('.')
+    frames = info.pop('frames', None)
+    if frames is not None and info.get('sample_rate'):
+        info['duration_s'] = round(frames / info['sample_rate'], 3)
+        info['decoded_bytes'] = frames * info['channels'] * 4
+    return info
+
+
+class LibraryIndex:
+    """Incremental index of the music folder, rendered as a cached JSON manifest."""
+
+    def __init__(self, media: MediaCache):
+        """
+        Args:
+            media: Media cache (shares its content-hash memo; names the /media URLs)
+        """
+        self.media = media
+        self._stats: Dict[Path, Tuple[int, float]] = {}
+        self._probes: Dict[Path, Tuple[int, float, dict]] = {}
+        self.version = 0
+        self.manifest: dict = {'version': 0, 'tracks': [], 'effects': []}
+        self.published: Tuple[bytes, str] = (b'', '')  # (JSON body, ETag), swapped as one
+        self.refresh()
+
+    def _walk(self) -> Dict[Path, Tuple[int, float]]:
+        stats = {}
+        for path in self.media.music_dir.rglob('*'):
+            if path.suffix.lower() in AUDIO_EXTENSIONS and path.is_file():
+                stat = path.stat()
+                stats[path] = (stat.st_size, stat.st_mtime)
+        return stats
+
+    def _stem(self, path: Path, size: int, mtime: float) -> dict:
+        """Manifest entry for one file (header probe and hash cached by size/mtime)."""
+        known = self._probes.get(path)
+        if known and known[:2] == (size, mtime):
+            info = known[2]
+        else:
+            info = probe(path)
+            self._probes[path] = (size, mtime, info)
+        digest = self.media.source_hash(path)
+        duration = info.get('duration_s')
+        urls = {'original': {'url': f"/media/{self.media.media_name(digest, path, 'original')}",
+                             'bytes': size}}
+        if self.media.ffmpeg:
+            for fmt, (_, _, _, _, kbps) in FORMATS.items():
+                urls[fmt] = {
+                    'url': f"/media/{self.media.media_name(digest, path, fmt, kbps)}",
+                    'approx_bytes': int(kbps * 125 * duration) if duration else None,
+                }
+        return {
+            'name': path.stem.lower(),
+            'path': path.relative_to(self.media.music_dir).as_posix(),
+            'size': size,
+            'hash': digest,
+            'decode': info,
+            'urls': urls,
+            'peaks': f"/peaks/{digest}.peaks",
+        }
+
+    def refresh(self) -> bool:
+        """
+        Re-walk the library and rebuild the manifest if anything changed.
+
+        Returns:
+            True if the manifest changed
+        """
+        stats = self._walk()
+        if stats == self._stats and self.published[0]:
+            return False
+        self._stats = stats
+        for gone in set(self._probes) - set(stats):
+            del self._probes[gone]
+
+        folders: Dict[str, List[Path]] = {}
+        for path in stats:
+            rel = path.relative_to(self.media.music_dir)
+            key = rel.parts[0] if len(rel.parts) > 1 else rel.stem
+            folders.setdefault(key, []).append(path)
+
+        tracks, effects = [], []
+        for name in sorted(folders, key=_natural_key):
+            paths = sorted(folders[name], key=lambda p: _natural_key(p.name))
+            stems = [self._stem(p, *stats[p]) for p in paths]
+            if name == EFFECTS_FOLDER:
+                effects = stems
+                continue
+            if len(paths) == 1 and paths[0].parent == self.media.music_dir:
+                stems[0]['name'] = 'mix'
+            durations = [s['decode'].get('duration_s') for s in stems]
+            tracks.append({
+                'name': name,
+                'stems': stems,
+                'duration_s': max((d for d in durations if d), default=None),
+                'size': sum(s['size'] for s in stems),
+            })
+
+        self.version += 1
+        self.manifest = {
+            'version': self.version,
+            'generated_at': round(time.time(), 3),
+            'formats': {fmt: kbps for fmt, (_, _, _, _, kbps) in FORMATS.items()}
+            if self.media.ffmpeg else {},
+            'bitrates': list(BITRATES),
+            'tracks': tracks,
+            'effects': effects,
+        }
+        body = json.dumps(self.manifest, separators=(',', ':')).encode()
+        self.published = (body, f'"manifest-{hashlib.blake2b(body, digest_size=8).hexdigest()}"')
+        return True
+
+    def track(self, name: str) -> Optional[dict]:
+        return next((t for t in self.manifest['tracks'] if t['name'] == name), None)
@@ -0,0 +1,151 @@
+"""
+Load test for the DJ Booth web server.
+
+Opens keep-alive HTTP/1.1 connections against a running server and, for
+each route, reports requests per second and latency percentiles:
+
+    python loadtest.py                          # localhost:8000, 64 connections, 10 s per route
+    python loadtest.py --url http://host:8000 --connections 256 --duration 30
+
+Routes: /health, a static asset (/static/js/main.js, gzip accepted) and a
+music file (first stem in the manifest, 64 KB Range reads like a
+streaming player). Standard library only, so it runs anywhere the server
+does.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+RANGE_BYTES = 64 * 1024
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection (Content-Length bodies only; GET, or POST with a body)."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, path: str, headers: Dict[str, str],
+                      body: Optional[bytes] = None) -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        method = "GET" if body is None else "POST"
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + (body or b""))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            self.close()
+            raise ConnectionError("server closed the connection")
+        status = int(status_line.split()[1])
+        length, keep_alive = 0, True
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "connection" and value.strip().lower() == "close":
+                keep_alive = False
+        body = await self.reader.readexactly(length) if length else b""
+        if not keep_alive:
+            self.close()
+        return status, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def fetch_json(host: str, port: int, path: str) -> Optional[dict]:
+    conn = Connection(host, port)
+    try:
+        status, body = await conn.request(path, {})
+        return json.loads(body) if status == 200 else None
+    except (OSError, ValueError):
+        return None
+    finally:
+        conn.close()
+
+
+async def run_route(host: str, port: int, path: str, headers: Dict[str, str],
+                    connections: int, duration: float) -> dict:
+    """Hammer one route from `connections` clients for `duration` seconds."""
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        conn = Connection(host, port)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status, _ = await conn.request(path, headers)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                errors += 1
+                conn.close()
+                continue
+            if status >= 400:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+        conn.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def pct(q: float) -> float:
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+
+    return {'path': path, 'requests': len(latencies), 'errors': errors,
+            'rps': len(latencies) / elapsed, 'p50_ms': pct(0.50), 'p99_ms': pct(0.99)}
+
+
+async def main(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname or 'localhost', url.port or 80
+
+    routes = [('/health', {})]
+    routes.append((args.static, {'Accept-Encoding': 'br, gzip'}))
+    music = args.music
+    if music is None:
+        manifest = await fetch_json(host, port, '/api/manifest')
+        stems = [s for t in (manifest or {}).get('tracks', []) for s in t['stems']]
+        music = f"/music/{stems[0]['path']}" if stems else None
+    if music:
+        routes.append((music, {'Range': f"bytes=0-{RANGE_BYTES - 1}"}))
+    else:
+        print("No music file found (pass --music); skipping the music route")
+
+    print(f"{args.connections} connections, {args.duration:.0f} s per route against {args.url}")
+    print(f"{'route':<40} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for path, headers in routes:
+        r = await run_route(host, port, path, headers, args.connections, args.duration)
+        print(f"{r['path'][:40]:<40} {r['requests']:>9} {r['errors']:>7} "
+              f"{r['rps']:>9.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the DJ Booth web server")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per route")
+    parser.add_argument("--static", default="/static/js/main.js", help="Static asset path")
+    parser.add_argument("--music", help="Music path (default: first stem in the manifest)")
+    asyncio.run(main(parser.parse_args()))
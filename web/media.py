@@ -0,0 +1,231 @@
+"""
+Transcoded, content-addressed stem delivery for the web client.
+
+Stems are transcoded on first request to a compact format (Opus, AAC or
+MP3 at a chosen bitrate) with ffmpeg and kept in a disk cache keyed by the
+source file's content hash. A media name such as
+
+    3f2a...c1.96k.opus
+
+therefore always names the same bytes: it is served with a strong ETag and
+`Cache-Control: immutable`, and Range requests are answered from the cached
+file. Without ffmpeg on PATH every format falls back to the original file
+(still content-addressed and cacheable).
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+AUDIO_EXTENSIONS = {'.wav', '.mp3', '.ogg', '.opus', '.m4a', '.flac'}
+
+# format -> ffmpeg codec, ffmpeg muxer, file extension, MIME type, default kbps
+FORMATS = {
+    'opus': ('libopus', 'ogg', '.opus', 'audio/ogg', 96),
+    'aac': ('aac', 'mp4', '.m4a', 'audio/mp4', 128),
+    'mp3': ('libmp3lame', 'mp3', '.mp3', 'audio/mpeg', 128),
+}
+BITRATES = (48, 64, 96, 128, 160, 192, 256)  # kbps
+
+SOURCE_TYPES = {
+    '.wav': 'audio/wav', '.mp3': 'audio/mpeg', '.ogg': 'audio/ogg', '.opus': 'audio/ogg',
+    '.m4a': 'audio/mp4', '.flac': 'audio/flac',
+}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def file_hash(path: Path) -> str:
+    """Content hash of a file (hex, 32 chars)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaCache:
+    """Source hash index plus an on-disk cache of transcoded stems."""
+
+    def __init__(self, music_dir: Path, cache_dir: Path, ffmpeg: Optional[str] = None,
+                 max_jobs: Optional[int] = None):
+        """
+        Args:
+            music_dir: Root the sources are served from
+            cache_dir: Where transcoded files are stored
+            ffmpeg: ffmpeg binary (default: found on PATH; None = no transcoding)
+            max_jobs: Concurrent transcodes (default: CPU count)
+        """
+        self.music_dir = music_dir.resolve()
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self._jobs = asyncio.Semaphore(max_jobs or os.cpu_count() or 1)
+        self._hashes: Dict[Path, Tuple[int, float, str]] = {}  # path -> (size, mtime, hash)
+        self._sources: Dict[str, Path] = {}  # hash -> a file with that content
+        self._pending: Dict[str, asyncio.Task] = {}  # media name -> transcode in flight
+        self.transcodes = 0
+        if not self.ffmpeg:
+            print("[Media] ffmpeg not found - serving original files")
+
+    def resolve(self, rel_path: str) -> Path:
+        """A path under music_dir; FileNotFoundError if missing or outside it."""
+        path = (self.music_dir / rel_path).resolve()
+        if self.music_dir not in path.parents or not path.is_file() \
+                or path.suffix.lower() not in AUDIO_EXTENSIONS:
+            raise FileNotFoundError(rel_path)
+        return path
+
+    def source_hash(self, path: Path) -> str:
+        """Content hash of a source, re-hashed only when its size or mtime changes."""
+        stat = path.stat()
+        known = self._hashes.get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime:
+            return known[2]
+        digest = file_hash(path)
+        self._hashes[path] = (stat.st_size, stat.st_mtime, digest)
+        self._sources[digest] = path
+        return digest
+
+    def scan(self):
+        """Hash every source under music_dir (unchanged files cost a stat)."""
+        for path in self.music_dir.rglob('*'):
+            if path.suffix.lower() in AUDIO_EXTENSIONS and path.is_file():
+                self.source_hash(path)
+
+    def media_name(self, digest: str, source: Path, fmt: str = 'opus',
+                   bitrate: Optional[int] = None) -> str:
+        """
+        Content-addressed name of a source in a delivery format.
+
+        Raises:
+            ValueError: Unknown format or bitrate
+        """
+        if fmt != 'original' and fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt!r} (use {', '.join(FORMATS)} or original)")
+        if bitrate is not None and bitrate not in BITRATES:
+            raise ValueError(f"unsupported bitrate {bitrate} (use one of {BITRATES})")
+        if fmt == 'original' or not self.ffmpeg:
+            return f"{digest}{source.suffix.lower()}"
+        bitrate = bitrate or FORMATS[fmt][4]
+        return f"{digest}.{bitrate}k{FORMATS[fmt][2]}"
+
+    async def name_for(self, rel_path: str, fmt: str = 'opus', bitrate: Optional[int] = None) -> str:
+        """Media name for a file under music_dir (hashing off the event loop)."""
+        path = self.resolve(rel_path)
+        digest = await asyncio.to_thread(self.source_hash, path)
+        return self.media_name(digest, path, fmt, bitrate)
+
+    @staticmethod
+    def media_type(name: str) -> str:
+        suffix = Path(name).suffix
+        for _, _, ext, mime, _ in FORMATS.values():
+            if suffix == ext:
+                return mime
+        return SOURCE_TYPES.get(suffix, 'application/octet-stream')
+
+    async def check(self, name: str):
+        """
+        Confirm `name` is servable without transcoding it (for conditional requests).
+
+        Raises:
+            FileNotFoundError: As get() would
+        """
+        digest, _, variant = name.partition('.')
+        if len(digest) != 32 or not variant or '/' in name:
+            raise FileNotFoundError(name)
+        if '.' not in variant:
+            if (await self.source(digest)).suffix.lower() != f".{variant}":
+                raise FileNotFoundError(name)
+            return
+        self._encoding(variant)
+        if not (self.cache_dir / name).is_file():
+            if not self.ffmpeg:
+                raise FileNotFoundError(name)
+            await self.source(digest)
+
+    async def get(self, name: str) -> Path:
+        """
+        Path of a media file, transcoding it on first request.
+
+        Concurrent requests for the same name share one transcode.
+
+        Raises:
+            FileNotFoundError: Malformed name or unknown source hash
+            RuntimeError: ffmpeg failed
+        """
+        digest, _, variant = name.partition('.')
+        if len(digest) != 32 or not variant or '/' in name:
+            raise FileNotFoundError(name)
+
+        if '.' not in variant:
+            # Original file: served straight from the library
+            source = await self.source(digest)
+            if source.suffix.lower() != f".{variant}":
+                raise FileNotFoundError(name)
+            return source
+
+        self._encoding(variant)  # Reject names no transcode could produce
+        cached = self.cache_dir / name
+        if cached.is_file():
+            return cached
+        # The transcode runs as its own task, so a client disconnecting
+        # mid-encode doesn't cancel it for the other requests waiting on it
+        task = self._pending.get(name)
+        if task is None:
+            task = asyncio.create_task(self._produce(digest, cached))
+            self._pending[name] = task
+            task.add_done_callback(lambda _: self._pending.pop(name, None))
+        return await asyncio.shield(task)
+
+    async def _produce(self, digest: str, target: Path) -> Path:
+        await self._transcode(await self.source(digest), target, target.name.partition('.')[2])
+        return target
+
+    async def source(self, digest: str) -> Path:
+        """A library file with this content hash (FileNotFoundError if none)."""
+        source = self._sources.get(digest)
+        if source is None or not source.is_file():
+            # Not seen since startup (e.g. a URL cached by a client): index the library
+            await asyncio.to_thread(self.scan)
+            source = self._sources.get(digest)
+        if source is None or not source.is_file():
+            raise FileNotFoundError(digest)
+        return source
+
+    @staticmethod
+    def _encoding(variant: str) -> Tuple[str, str, str]:
+        """ffmpeg (codec, muxer, bitrate) for a '96k.opus' style variant."""
+        kbps, _, ext = variant.partition('.')
+        for codec, muxer, format_ext, _, _ in FORMATS.values():
+            if format_ext == f".{ext}" and kbps[:-1].isdigit() and kbps.endswith('k') \
+                    and int(kbps[:-1]) in BITRATES:
+                return codec, muxer, kbps
+        raise FileNotFoundError(variant)
+
+    async def _transcode(self, source: Path, target: Path, variant: str):
+        """Encode `source` into `target` ('96k.opus' style variant) via a temp file."""
+        if not self.ffmpeg:
+            raise FileNotFoundError(target.name)
+        codec, muxer, kbps = self._encoding(variant)
+
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        args = [self.ffmpeg, '-nostdin', '-v', 'error', '-y', '-i', str(source),
+                '-vn', '-map_metadata', '-1', '-c:a', codec, '-b:a', kbps]
+        if muxer == 'mp4':
+            args += ['-movflags', '+faststart']  # Index up front so playback can start early
+        args += ['-f', muxer, str(tmp)]
+
+        async with self._jobs:
+            proc = await asyncio.create_subprocess_exec(
+                *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+            _, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            tmp.unlink(missing_ok=True)
+            raise RuntimeError(f"ffmpeg failed for {source.name}: {stderr.decode(errors='replace')[-300:]}")
+        os.replace(tmp, target)
+        self.transcodes += 1
+        print(f"[Media] Transcoded {source.name} -> {target.name}")
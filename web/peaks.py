@@ -0,0 +1,172 @@
+"""
+Waveform peak pyramids for the web client.
+
+Min/max/RMS bins of the mono mix at power-of-two zoom levels, so a browser
+can Range-fetch the header and the one level that matches its canvas width
+instead of decoding the audio. The PEAK format is defined once, in
+demo_1/peaks_format.py, and imported from there so the booth, the server
+and waveform.js all read the same files.
+
+Pyramids are keyed by the source's content hash, built in a process pool
+(in the background after each library change, or on first request), and
+served immutable from /peaks/<hash>.peaks.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+import numpy as np
+from library import probe
+from media import MediaCache
+
+# Appended, not prepended: web modules keep precedence over demo_1's
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'demo_1'))
+from peaks_format import encode_peaks
+
+DEFAULT_RATE = 44100  # Decode rate when a header doesn't say
+
+
+def decode_pcm(source: Path, ffmpeg: Optional[str]) -> Tuple[np.ndarray, int]:
+    """
+    Decode a file to (frames, channels) int16 PCM.
+
+    16-bit WAV is read directly; anything else goes through ffmpeg (mono).
+
+    Raises:
+        FileNotFoundError: Not decodable without ffmpeg
+        RuntimeError: ffmpeg failed
+    """
+    if source.suffix.lower() == '.wav':
+        try:
+            with wave.open(str(source), 'rb') as w:
+                if w.getsampwidth() == 2:
+                    data = w.readframes(w.getnframes())
+                    pcm = np.frombuffer(data, dtype='<i2').reshape(-1, w.getnchannels())
+                    return pcm, w.getframerate()
+        except (wave.Error, EOFError):
+            pass  # Float or extensible WAV: let ffmpeg read it
+    if not ffmpeg:
+        raise FileNotFoundError(f"{source.name}: no decoder (ffmpeg not found)")
+
+    rate = probe(source).get('sample_rate') or DEFAULT_RATE
+    result = subprocess.run(
+        [ffmpeg, '-nostdin', '-v', 'error', '-i', str(source), '-vn',
+         '-ac', '1', '-ar', str(rate), '-f', 's16le', '-'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed for {source.name}: "
+                           f"{result.stderr.decode(errors='replace')[-300:]}")
+    return np.frombuffer(result.stdout, dtype='<i2').reshape(-1, 1), rate
+
+
+def build_peaks(source: str, target: str, ffmpeg: Optional[str]) -> int:
+    """Decode `source` and write its pyramid to `target` atomically (pool worker)."""
+    pcm, rate = decode_pcm(Path(source), ffmpeg)
+    data = encode_peaks(pcm, rate)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, target)
+    return len(data)
+
+
+class PeaksCache:
+    """On-disk pyramids keyed by content hash, built in worker processes."""
+
+    def __init__(self, media: MediaCache, peaks_dir: Path, max_workers: Optional[int] = None):
+        """
+        Args:
+            media: Media cache (maps hashes to source files, knows ffmpeg)
+            peaks_dir: Where pyramid files are stored
+            max_workers: Build processes (default: half the CPUs)
+        """
+        self.media = media
+        self.peaks_dir = peaks_dir
+        self.peaks_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Task] = {}  # hash -> build in flight
+        self._warming: Set[asyncio.Task] = set()
+        self.builds = 0
+
+    def path(self, digest: str) -> Path:
+        return self.peaks_dir / f"{digest}.peaks"
+
+    async def check(self, name: str):
+        """
+        Confirm a pyramid exists or can be built, without building it.
+
+        Raises:
+            FileNotFoundError: Malformed name or unknown hash
+        """
+        digest, _, ext = name.partition('.')
+        if len(digest) != 32 or ext != 'peaks' or '/' in name:
+            raise FileNotFoundError(name)
+        if not self.path(digest).is_file():
+            await self.media.source(digest)
+
+    async def get(self, name: str) -> Path:
+        """
+        Path of a '<hash>.peaks' file, building it on first request.
+
+        Concurrent requests for the same hash share one build.
+
+        Raises:
+            FileNotFoundError: Malformed name, unknown hash or undecodable source
+            RuntimeError: Decoding failed
+        """
+        digest, _, ext = name.partition('.')
+        if len(digest) != 32 or ext != 'peaks' or '/' in name:
+            raise FileNotFoundError(name)
+        target = self.path(digest)
+        if target.is_file():
+            return target
+        task = self._pending.get(digest)
+        if task is None:
+            task = asyncio.create_task(self._build(digest, target))
+            self._pending[digest] = task
+            task.add_done_callback(lambda _: self._pending.pop(digest, None))
+        return await asyncio.shield(task)
+
+    async def _build(self, digest: str, target: Path) -> Path:
+        source = await self.media.source(digest)
+        if self._pool is None:
+            # Spawned workers: forking a process with a running event loop is unsafe
+            self._pool = ProcessPoolExecutor(self.max_workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(self._pool, build_peaks, str(source), str(target),
+                                              self.media.ffmpeg)
+        except BrokenProcessPool as e:
+            self._pool = None  # A worker died (e.g. OOM): start a fresh pool next time
+            print(f"[Peaks] {source.name}: {e}")
+            raise RuntimeError(f"peaks build failed for {source.name}") from e
+        except (OSError, RuntimeError) as e:
+            print(f"[Peaks] {source.name}: {e}")
+            raise
+        self.builds += 1
+        print(f"[Peaks] Built {source.name} ({size / 1024:.0f} KB)")
+        return target
+
+    def warm(self, digests: Iterable[str]):
+        """Start background builds for hashes that have no pyramid yet."""
+        for digest in digests:
+            if digest in self._pending or self.path(digest).is_file():
+                continue
+            task = asyncio.create_task(self.get(f"{digest}.peaks"))
+            self._warming.add(task)
+            task.add_done_callback(self._warming.discard)
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())  # Logged by _build
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
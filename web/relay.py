@@ -0,0 +1,84 @@
+"""
+Cross-worker relay: small JSON messages between the server's worker processes.
+
+Each worker binds a Unix datagram socket named after its pid in a shared
+directory and sends to every other socket there. Delivery is best effort:
+a message to a backed-up or vanished peer is dropped, so senders relay
+state that the next message supersedes, or tolerate the loss.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+PEER_REFRESH_S = 1.0  # How often the socket directory is re-listed
+
+
+class Relay:
+    """One worker's endpoint in a relay directory."""
+
+    def __init__(self, directory: Path, on_message: Callable[[dict], None]):
+        """
+        Args:
+            directory: Shared socket directory (one per channel)
+            on_message: Called on the event loop with each message from a peer
+        """
+        self.directory = directory
+        self.on_message = on_message
+        self._sock: Optional[socket.socket] = None
+        self._path = directory / f"{os.getpid()}.sock"
+        self._peers: List[str] = []
+        self._peers_at = 0.0
+
+    def open(self):
+        """Bind and start receiving (call from the event loop)."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._path.unlink(missing_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(self._path))
+        sock.setblocking(False)
+        self._sock = sock
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._receive)
+
+    def close(self):
+        if self._sock is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        self._path.unlink(missing_ok=True)
+
+    def _receive(self):
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(message, dict):
+                self.on_message(message)
+
+    def send(self, message: dict):
+        """Send to every other worker (dropped for peers that are backed up or gone)."""
+        if self._sock is None:
+            return
+        now = time.monotonic()
+        if now - self._peers_at > PEER_REFRESH_S:
+            self._peers = [str(p) for p in self.directory.glob('*.sock') if p != self._path]
+            self._peers_at = now
+        data = json.dumps(message, separators=(',', ':')).encode()
+        for peer in self._peers:
+            try:
+                self._sock.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                Path(peer).unlink(missing_ok=True)  # Worker gone
+                self._peers_at = 0.0
+            except BlockingIOError:
+                pass
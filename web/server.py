@@ -1,16 +1,109 @@
 """
 FastAPI server for the DJ Booth web frontend.
-Serves static files and music tracks.
+Serves static files and music tracks; stems are delivered transcoded and
+content-addressed through /stream and /media (see media.py), and listed in
+a watched track manifest at /api/manifest (see library.py). Waveform peak
+pyramids are served from /peaks (see peaks.py), browser deck state is
+relayed to viewers over /ws/state (see state_channel.py), and crowd votes
+are ingested and aggregated at /api/vote (see votes.py).
+
+    python server.py                  development: one worker, files as-is
+    python server.py --production     all cores, pre-compressed hashed assets
+
+Production mode runs several worker processes (uvloop/httptools when
+installed) and serves static/ from a cache built at startup (see
+assets.py).
 """
 
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI
+from typing import Optional, Set
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+from assets import REVALIDATE, AssetCache, etag_matches, pick_encoding
+from library import LibraryIndex
+from media import IMMUTABLE, MediaCache
+from peaks import PeaksCache
+from state_channel import StateHub
+from votes import MAX_BATCH, VoteService
+
+LIBRARY_POLL_S = 2.0  # Manifest watcher: stat walk period
+PRODUCTION = os.getenv("DJ_BOOTH_PRODUCTION") == "1"  # Set by --production for the workers
+
+
+def _library_hashes():
+    for entry in library.manifest['tracks']:
+        yield from (stem['hash'] for stem in entry['stems'])
+    yield from (stem['hash'] for stem in library.manifest['effects'])
+
+
+async def watch_library():
+    """Rebuild the manifest when files in the music folder change."""
+    while True:
+        await asyncio.sleep(LIBRARY_POLL_S)
+        try:
+            if await asyncio.to_thread(library.refresh):
+                print(f"[Library] Manifest v{library.version}: "
+                      f"{len(library.manifest['tracks'])} tracks")
+                peaks.warm(_library_hashes())
+        except OSError as e:
+            print(f"[Library] Refresh failed: {e}")
+
+
+def _claim_builds() -> bool:
+    """
+    True in one worker process only: the one that warms the peaks cache.
+
+    Holds an exclusive lock on a file in the cache for the process lifetime;
+    every worker still builds on demand.
+    """
+    global _build_lock
+    try:
+        import fcntl
+    except ImportError:
+        return True
+    _build_lock = open(CACHE_DIR / ".builds.lock", "w")
+    try:
+        fcntl.flock(_build_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        _build_lock.close()
+        _build_lock = None
+        return False
+    return True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global media, library, peaks, assets
+    # Built per serving process, not on import: spawned peaks and uvicorn
+    # workers re-run this module as __mp_main__ and must not redo this
+    media = MediaCache(MUSIC_DIR, CACHE_DIR / "media")
+    library = LibraryIndex(media)
+    peaks = PeaksCache(media, CACHE_DIR / "peaks")
+    if PRODUCTION:
+        assets = AssetCache(STATIC_DIR, CACHE_DIR / "static")
+        assets.build()  # Reuses the compressed variants the launcher wrote
+    if _claim_builds():
+        peaks.warm(_library_hashes())
+    watcher = asyncio.create_task(watch_library())
+    ticker = asyncio.create_task(state_hub.run())
+    broadcaster = asyncio.create_task(vote_service.run())
+    yield
+    watcher.cancel()
+    ticker.cancel()
+    broadcaster.cancel()
+    peaks.close()
 
-app = FastAPI(title="DJ Booth")
+
+app = FastAPI(title="DJ Booth", lifespan=lifespan)
 
 # Enable CORS for development
 app.add_middleware(
@@ -25,18 +118,238 @@ app.add_middleware(
 BASE_DIR = Path(__file__).parent
 STATIC_DIR = BASE_DIR / "static"
 MUSIC_DIR = BASE_DIR.parent / "music"
+CACHE_DIR = BASE_DIR / "cache"
+
+media: MediaCache  # These four are set up in lifespan
+library: LibraryIndex
+peaks: PeaksCache
+assets: AssetCache  # Production only
+_warming: Set[asyncio.Task] = set()  # Prefetch transcodes, referenced until done
+_build_lock = None
+# Workers share deck state through relay sockets; one process needs none
+state_hub = StateHub(relay_dir=CACHE_DIR / "state" if PRODUCTION else None)
+vote_service = VoteService(relay_dir=CACHE_DIR / "votes" if PRODUCTION else None)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+if not PRODUCTION:
+    app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 app.mount("/music", StaticFiles(directory=str(MUSIC_DIR)), name="music")
 
 
+def _not_modified(request: Request, *etags: str) -> bool:
+    """True if the request's If-None-Match matches one of `etags`."""
+    return etag_matches(request.headers.get("if-none-match", ""), *etags)
+
+
+def _asset_response(asset, immutable: bool, request: Request) -> Response:
+    """A pre-compressed asset in the client's best encoding; 304 from metadata alone."""
+    encoding = pick_encoding(asset, request.headers.get("accept-encoding", ""))
+    # One strong ETag per representation; any of them matches on revalidation
+    etag = f'{asset.etag[:-1]}-{encoding}"' if encoding else asset.etag
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE if immutable else REVALIDATE,
+               "Vary": "Accept-Encoding"}
+    representations = [f'{asset.etag[:-1]}-{e}"' for e in asset.encoded]
+    if _not_modified(request, asset.etag, *representations):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return FileResponse(asset.encoded[encoding][0], media_type=asset.media_type,
+                            headers=headers)
+    return FileResponse(asset.path, media_type=asset.media_type, headers=headers)
+
+
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Serve the main HTML page."""
+    if PRODUCTION:
+        return _asset_response(assets.index, False, request)
     return FileResponse(STATIC_DIR / "index.html")
 
 
+if PRODUCTION:
+    @app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+    async def static_file(path: str, request: Request):
+        """Serve a static asset; content-hashed names are immutable."""
+        asset, immutable = assets.get(path)
+        if asset is None:
+            raise HTTPException(status_code=404, detail=f"no static file {path}")
+        return _asset_response(asset, immutable, request)
+
+
+@app.get("/api/manifest")
+async def manifest(request: Request):
+    """Track/stem listing with sizes, durations, hashes, decode hints and media URLs."""
+    body, etag = library.published
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/prefetch/{track}")
+async def prefetch(track: str, format: str = "opus", bitrate: Optional[int] = None,
+                   stems: int = 0):
+    """
+    Warm a track's stems for an upcoming switch.
+
+    Starts any missing transcodes in the background and returns the media
+    URLs in fetch-priority order (manifest order; the first `stems` only if
+    given), so a client can fetch them in parallel before it needs them.
+    """
+    entry = library.track(track)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"no track {track}")
+    selected = entry["stems"][:stems] if stems > 0 else entry["stems"]
+    try:
+        names = [media.media_name(s["hash"], Path(s["path"]), format, bitrate) for s in selected]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for name in names:
+        task = asyncio.create_task(media.get(name))
+        _warming.add(task)
+        task.add_done_callback(_warming.discard)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())  # Logged on fetch
+    return {"track": track, "urls": [f"/media/{name}" for name in names],
+            "bytes": sum(s["size"] for s in selected)}
+
+
+@app.get("/api/state")
+async def deck_state():
+    """Current deck state (as last relayed) and channel counters."""
+    return {"state": state_hub.state, "stats": state_hub.stats()}
+
+
+@app.websocket("/ws/state")
+async def state_socket(websocket: WebSocket, type: str = "viewer", ack: bool = False):
+    """
+    Deck state channel.
+
+    type=deck: the browser DJ sends JSON deltas of its deck/gesture state.
+    type=viewer: receives a binary snapshot per tick with changes, skipping
+    stale ones when it reads slower than they are produced. With ack=1 the
+    viewer sends back the seq of each frame it has handled, and at most a
+    couple of frames are in flight to it.
+    """
+    await websocket.accept()
+    if type == "deck":
+        try:
+            while True:
+                try:
+                    delta = json.loads(await websocket.receive_text())
+                except ValueError:
+                    continue
+                if isinstance(delta, dict):
+                    state_hub.apply(delta)
+        except WebSocketDisconnect:
+            return
+
+    subscriber = state_hub.subscribe(websocket.send_bytes, acks=ack)
+    sender = asyncio.create_task(subscriber.run())
+    sender.add_done_callback(lambda t: t.cancelled() or t.exception())  # Ends on disconnect
+    try:
+        # Viewers only send acks; receiving is also how the disconnect is noticed
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text", "").isdigit():
+                subscriber.ack(int(message["text"]))
+    finally:
+        state_hub.unsubscribe(subscriber)
+        sender.cancel()
+
+
+@app.get("/api/vote")
+async def vote_aggregation(session: Optional[str] = None):
+    """Sliding-window aggregation and recent votes (same shape as the Next.js route)."""
+    return {"aggregation": vote_service.aggregation(session),
+            "recentVotes": vote_service.recent_votes(session)}
+
+
+@app.post("/api/vote")
+async def cast_votes(request: Request):
+    """
+    Cast one vote ({userId, voteType, voteValue?, sessionCode?}) or a batch
+    ({"votes": [...]}).
+
+    A single vote answers like the Next.js route (400 invalid, 429 rate
+    limited). A batch answers with per-outcome counts; batching clients
+    (e.g. a proxy in front of many phones) skip a round trip per vote.
+    """
+    try:
+        body = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if isinstance(body, dict) and isinstance(body.get("votes"), list):
+        batch = body["votes"]
+        if len(batch) > MAX_BATCH:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} votes per batch")
+        records, limited, invalid = vote_service.ingest(batch)
+        return {"accepted": len(records) - limited - invalid, "rateLimited": limited,
+                "invalid": invalid}
+
+    records, limited, invalid = vote_service.ingest([body])
+    if invalid:
+        raise HTTPException(status_code=400, detail="Missing or invalid userId or voteType")
+    if limited:
+        raise HTTPException(status_code=429, detail="Too fast — wait a moment between votes")
+    session = body.get("sessionCode")
+    return {"success": True, "voteId": records[0]["id"],
+            "aggregation": vote_service.aggregation(session)}
+
+
+@app.get("/stream/{path:path}")
+async def stream(path: str, format: str = "opus", bitrate: Optional[int] = None):
+    """
+    Redirect to the cacheable media URL of a file under /music.
+
+    Args:
+        path: File path relative to the music folder (e.g. track1/stem1.wav)
+        format: opus, aac, mp3 or original
+        bitrate: kbps (default per format)
+    """
+    try:
+        name = await media.name_for(path, format, bitrate)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"no audio file {path}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The redirect follows the file's content, so it must be revalidated
+    return RedirectResponse(f"/media/{name}", status_code=307,
+                            headers={"Cache-Control": "no-cache"})
+
+
+@app.api_route("/media/{name}", methods=["GET", "HEAD"])
+async def media_file(name: str, request: Request):
+    """Serve a content-addressed media file (transcoded on first request), with Range support."""
+    headers = {"ETag": f'"{name}"', "Cache-Control": IMMUTABLE}
+    try:
+        await media.check(name)  # Unknown names are 404, not 304
+        if _not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        path = await media.get(name)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"unknown media {name}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return FileResponse(path, media_type=media.media_type(name), headers=headers)
+
+
+@app.api_route("/peaks/{name}", methods=["GET", "HEAD"])
+async def peaks_file(name: str, request: Request):
+    """Serve a waveform pyramid by content hash (built on first request), with Range support."""
+    headers = {"ETag": f'"{name}"', "Cache-Control": IMMUTABLE}
+    try:
+        await peaks.check(name)
+        if _not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        path = await peaks.get(name)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"no peaks for {name}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return FileResponse(path, media_type="application/octet-stream", headers=headers)
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint."""
@@ -44,8 +357,31 @@ async def health():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DJ Booth web server")
+    parser.add_argument("--production", action="store_true",
+                        help="Multiple workers, pre-compressed content-hashed static assets")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes in production mode (default: CPU count)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
     print("Starting DJ Booth server...")
     print(f"Static files: {STATIC_DIR}")
     print(f"Music files: {MUSIC_DIR}")
-    print("Open http://localhost:8000 in your browser")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    print(f"Open http://localhost:{args.port} in your browser")
+    # Deck state frames are a few dozen bytes: per-message deflate costs more than it saves
+    if not args.production:
+        uvicorn.run(app, host=args.host, port=args.port, ws_per_message_deflate=False)
+    else:
+        # Workers import the app fresh and read the mode from the environment.
+        # The launcher only compresses the static files; each worker's
+        # lifespan then just hashes them and reuses the compressed variants
+        os.environ["DJ_BOOTH_PRODUCTION"] = "1"
+        AssetCache(STATIC_DIR, CACHE_DIR / "static").build()
+        loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+        http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+        print(f"Production mode: {args.workers} workers, {loop} loop, {http} parser")
+        uvicorn.run("server:app", app_dir=str(BASE_DIR), host=args.host, port=args.port,
+                    workers=args.workers, loop=loop, http=http, access_log=False,
+                    ws_per_message_deflate=False)
@@ -0,0 +1,240 @@
+"""
+Deck state channel: browser gesture/deck deltas in, binary snapshots out.
+
+The browser DJ sends small JSON deltas (only the fields that changed) as
+often as it likes over /ws/state?type=deck. The hub merges them into one
+state and, once per tick, encodes the state once as a compact binary frame
+and offers it to every subscriber (/ws/state?type=viewer: agent, projector).
+
+Each subscriber has a one-frame slot drained by its own sender: a frame
+that arrives before the previous one went out replaces it, so a slow
+client skips stale snapshots instead of buffering them. Frames are full
+snapshots and effect triggers are counters, so nothing is lost by skipping.
+
+The socket only pushes back once the kernel buffers are full, which for
+frames this small is minutes of stale state. A viewer that connects with
+ack=1 and acknowledges frames (a text message with the frame's seq, e.g.
+after rendering it) is held to ACK_WINDOW unacknowledged frames instead,
+so what it reads is never more than a frame or two old.
+
+Frame layout (little-endian):
+    magic 'DS' | version u8 | flags u8 (bit0 playing, bit1 loading,
+    bit2 hand detected, bit3 pinching) | seq u32 | t_ms u32 | track u8
+    | selected stem i8 (-1 = none) | fingers u8 | volume u8 (pinch, 0-255)
+    | stem count u8 | fx count u8 | stem volumes u8[] | fx trigger counts u16[]
+
+With several server workers, a worker whose state changed locally sends
+it (and any effect triggers) to the others once per tick (see relay.py),
+so publishers and subscribers may land on different workers.
+"""
+
+import asyncio
+import struct
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Set
+from relay import Relay
+
+STATE_MAGIC = b'DS'
+STATE_VERSION = 1
+STATE_HEADER = struct.Struct('<2sBBIIBbBBBB')
+STATE_TICK_HZ = 60
+MAX_STEMS = 8
+MAX_FX = 8
+ACK_WINDOW = 2  # Frames in flight for viewers that acknowledge
+
+FLAG_FIELDS = ('playing', 'loading', 'hand', 'pinching')  # bit order
+
+
+def _clamp(value, lo, hi):
+    if value != value:
+        return lo  # NaN (the json module accepts it)
+    return lo if value < lo else hi if value > hi else value
+
+
+class Subscriber:
+    """One viewer: the newest unsent frame and the task that sends it."""
+
+    def __init__(self, send: Callable[[bytes], Awaitable[None]], window: Optional[int] = None):
+        """
+        Args:
+            send: Coroutine sending one frame (blocks while the socket is backed up)
+            window: Unacknowledged frames allowed in flight (None = viewer doesn't ack)
+        """
+        self.send = send
+        self.window = window
+        self.pending: Optional[bytes] = None
+        self.pending_seq = 0
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.sent_seq = 0
+        self.dropped = 0
+        self.in_flight = 0
+        self.acked = asyncio.Event()
+
+    def offer(self, frame: bytes, seq: int):
+        if self.pending is not None:
+            self.dropped += 1  # Superseded before the socket took it
+        self.pending = frame
+        self.pending_seq = seq
+        self.ready.set()
+
+    def ack(self, seq: int):
+        """The viewer has handled the frame with this seq (and so all before it)."""
+        if self.window is None:
+            return  # Not flow-controlled: stray acks are ignored
+        self.in_flight = min(self.in_flight, (self.sent_seq - seq) & 0xFFFFFFFF)
+        self.acked.set()
+
+    async def run(self):
+        """Send frames until the socket fails (the caller closes it)."""
+        while True:
+            await self.ready.wait()
+            while self.window is not None and self.in_flight >= self.window:
+                self.acked.clear()
+                await self.acked.wait()  # Newer frames keep replacing the pending one
+            frame, seq, self.pending = self.pending, self.pending_seq, None
+            self.ready.clear()
+            await self.send(frame)
+            self.sent += 1
+            self.sent_seq = seq
+            self.in_flight += 1
+
+
+class StateHub:
+    """Merged deck state, coalesced per tick and fanned out to subscribers."""
+
+    def __init__(self, tick_hz: float = STATE_TICK_HZ, relay_dir: Optional[Path] = None):
+        """
+        Args:
+            tick_hz: Frames per second at most (one per tick with changes)
+            relay_dir: Directory for the cross-worker relay sockets (None = single process)
+        """
+        self.tick_s = 1.0 / tick_hz
+        self.relay = Relay(relay_dir, lambda delta: self.apply(delta, relay=False)) \
+            if relay_dir is not None else None
+        self.state = {'track': 0, 'stem': -1, 'fingers': 0, 'volume': 0.0,
+                      'playing': False, 'loading': False, 'hand': False, 'pinching': False,
+                      'volumes': [], 'fx': []}
+        self.subscribers: Set[Subscriber] = set()
+        self.frame = self.encode(0)
+        self.seq = 0
+        self.deltas = 0
+        self.frames = 0
+        self._dirty = False
+        self._relay_due = False  # Local changes not yet relayed
+        self._relay_fx: List[int] = []  # Local effect triggers not yet relayed
+        self._started = time.monotonic()
+
+    def apply(self, delta: dict, relay: bool = True):
+        """
+        Merge a delta; unknown keys and bad values are ignored.
+
+        `fx` is an effect trigger (1-based pad number, or a list of them) and
+        increments that pad's counter; every other key replaces its value.
+        """
+        state = self.state
+        changed = {}
+        for key, value in delta.items():
+            try:
+                if key in FLAG_FIELDS:
+                    value = bool(value)
+                elif key in ('track', 'fingers'):
+                    value = _clamp(int(value), 0, 255)
+                elif key == 'stem':
+                    value = _clamp(int(value), -1, MAX_STEMS - 1)
+                elif key == 'volume':
+                    value = _clamp(float(value), 0.0, 1.0)
+                elif key == 'volumes':
+                    value = [_clamp(float(v), 0.0, 1.0) for v in value[:MAX_STEMS]]
+                elif key == 'fx':
+                    pads = [int(p) for p in (value if isinstance(value, list) else [value])]
+                    pads = [p for p in pads if 1 <= p <= MAX_FX]
+                    if not pads:
+                        continue
+                    counts = state['fx'] + [0] * (max(pads) - len(state['fx']))
+                    for pad in pads:
+                        counts[pad - 1] = (counts[pad - 1] + 1) & 0xFFFF
+                    state['fx'] = counts
+                    changed.setdefault('fx', []).extend(pads)
+                    continue
+                else:
+                    continue
+            except (TypeError, ValueError):
+                continue
+            if state[key] != value:
+                state[key] = value
+                changed[key] = value
+        if not changed:
+            return
+        self.deltas += 1
+        self._dirty = True
+        if relay and self.relay is not None:
+            self._relay_due = True
+            self._relay_fx.extend(changed.get('fx', ()))
+
+    def encode(self, seq: int) -> bytes:
+        state = self.state
+        flags = sum(1 << i for i, key in enumerate(FLAG_FIELDS) if state[key])
+        t_ms = int((time.monotonic() - self._started) * 1000) & 0xFFFFFFFF if seq else 0
+        volumes, fx = state['volumes'], state['fx']
+        return STATE_HEADER.pack(
+            STATE_MAGIC, STATE_VERSION, flags, seq, t_ms, state['track'], state['stem'],
+            state['fingers'], round(state['volume'] * 255), len(volumes), len(fx),
+        ) + bytes(round(v * 255) for v in volumes) + struct.pack(f'<{len(fx)}H', *fx)
+
+    def subscribe(self, send: Callable[[bytes], Awaitable[None]], acks: bool = False) -> Subscriber:
+        """Register a viewer (acks: it acknowledges frames); it gets the current snapshot first."""
+        subscriber = Subscriber(send, ACK_WINDOW if acks else None)
+        subscriber.offer(self.frame, self.seq)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def tick(self):
+        """Encode and fan out the state if anything changed since the last tick."""
+        if self._relay_due:
+            # The whole state, so a datagram a peer missed heals on the next one
+            delta = {key: value for key, value in self.state.items() if key != 'fx'}
+            if self._relay_fx:
+                delta['fx'] = self._relay_fx
+            self.relay.send(delta)
+            self._relay_due = False
+            self._relay_fx = []
+        if not self._dirty:
+            return
+        self._dirty = False
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        self.frame = self.encode(self.seq)
+        self.frames += 1
+        for subscriber in self.subscribers:
+            subscriber.offer(self.frame, self.seq)
+
+    async def run(self):
+        """Tick forever (cancel to stop)."""
+        if self.relay is not None:
+            self.relay.open()
+        try:
+            next_tick = time.monotonic()
+            while True:
+                next_tick += self.tick_s
+                await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+                if next_tick < time.monotonic() - self.tick_s:
+                    next_tick = time.monotonic()  # Fell behind: don't burst to catch up
+                self.tick()
+        finally:
+            if self.relay is not None:
+                self.relay.close()
+
+    def stats(self) -> dict:
+        return {
+            'seq': self.seq,
+            'deltas': self.deltas,
+            'frames': self.frames,
+            'subscribers': len(self.subscribers),
+            'sent': sum(s.sent for s in self.subscribers),
+            'dropped': sum(s.dropped for s in self.subscribers),
+            'frame_bytes': len(self.frame),
+        }
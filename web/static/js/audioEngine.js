@@ -2,10 +2,30 @@
  * Audio engine with stem-based playback.
  * Each track folder has N stems (stem1..stemN.mp3/wav).
  * All stems run in sync; selection targets a layer for volume control.
+ * Stems are listed by the server's manifest (/api/manifest) and loaded in
+ * parallel; the next track is prefetched at low priority after each load.
  */
 
 import { CONFIG } from './config.js';
 
+const FORMAT_MIME = {
+    opus: 'audio/ogg; codecs=opus',
+    aac: 'audio/mp4; codecs="mp4a.40.2"',
+    mp3: 'audio/mpeg',
+};
+
+// First configured delivery format this browser can decode
+function pickStreamFormat() {
+    const probe = document.createElement('audio');
+    const format = CONFIG.STREAM_FORMATS.find((f) => probe.canPlayType(FORMAT_MIME[f]) !== '');
+    return format || 'original';
+}
+
+// Transcoded, cacheable URL for a file under /music (see web/media.py)
+function streamUrl(path, format) {
+    return `/stream/${path}?format=${format}&bitrate=${CONFIG.STREAM_BITRATE}`;
+}
+
 export class AudioEngine {
     constructor() {
         this.currentTrackIndex = 0;
@@ -19,6 +39,56 @@ export class AudioEngine {
         this.isStarted = false;
         this.isTrackLoading = false;
         this.effects = []; // Array of Tone.Player for one-shot FX
+        this.streamFormat = pickStreamFormat();
+        this.manifest = null;  // Server track listing (null = probe by convention)
+        this.trackFolders = CONFIG.TRACK_FOLDERS;
+        this.prefetchedTrack = null;
+        this.startedAt = 0;  // Tone time the looping stems started
+    }
+
+    async _loadManifest() {
+        try {
+            const resp = await fetch('/api/manifest');
+            if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+            this.manifest = await resp.json();
+        } catch (e) {
+            console.warn('Manifest unavailable, probing stems by name:', e);
+            return;
+        }
+        // Configured folders keep their order; without any, play everything listed
+        const listed = this.manifest.tracks.map((t) => t.name);
+        const configured = CONFIG.TRACK_FOLDERS.filter((name) => listed.includes(name));
+        this.trackFolders = configured.length ? configured : listed;
+        console.log(`Manifest v${this.manifest.version}: ${listed.length} tracks`);
+    }
+
+    _manifestTrack(folder) {
+        return this.manifest ? this.manifest.tracks.find((t) => t.name === folder) : null;
+    }
+
+    // Media URL of a manifest entry in this browser's delivery format
+    _mediaUrl(entry) {
+        return (entry.urls[this.streamFormat] || entry.urls.original).url;
+    }
+
+    // Warm the HTTP cache with the next track's stems (immutable URLs)
+    async _prefetchNext() {
+        const folder = this.trackFolders[(this.currentTrackIndex + 1) % this.trackFolders.length];
+        if (!this._manifestTrack(folder) || folder === this.currentTrackFolder
+                || folder === this.prefetchedTrack) return;
+        this.prefetchedTrack = folder;
+        try {
+            const resp = await fetch(`/api/prefetch/${encodeURIComponent(folder)}`
+                + `?format=${this.streamFormat}&bitrate=${CONFIG.STREAM_BITRATE}`
+                + `&stems=${CONFIG.STEMS_PER_TRACK}`);
+            if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+            const { urls } = await resp.json();
+            await Promise.all(urls.map((url) => fetch(url, { priority: 'low' }).then((r) => r.arrayBuffer())));
+            console.log(`Prefetched ${folder} (${urls.length} stems)`);
+        } catch (e) {
+            this.prefetchedTrack = null;
+            console.warn(`Prefetch of ${folder} failed:`, e);
+        }
     }
 
     async initialize() {
@@ -29,6 +99,7 @@ export class AudioEngine {
         this.masterVolume = new Tone.Volume(0).toDestination();
 
         // Load first track's stems
+        await this._loadManifest();
         await this._loadTrack(0);
         await this._loadEffects();
 
@@ -52,32 +123,40 @@ export class AudioEngine {
         this.stemVolumes = [];
         this.isStarted = false;
 
-        const folder = CONFIG.TRACK_FOLDERS[trackIndex];
+        const folder = this.trackFolders[trackIndex];
         this.currentTrackIndex = trackIndex;
         this.currentTrackFolder = folder;
 
         console.log(`Loading track: ${folder}`);
 
-        // Load all configured stems
+        // Load all configured stems in parallel: from the manifest when the
+        // track is listed, else by probing stem1..N
+        const entry = this._manifestTrack(folder);
+        const loads = [];
         for (let i = 1; i <= CONFIG.STEMS_PER_TRACK; i++) {
-            const stem = await this._loadStem(folder, i);
-            this.stems.push(stem);
-            this.stemVolumes.push(0);
+            const listed = entry ? entry.stems[i - 1] : null;
+            const paths = entry
+                ? (listed ? [this._mediaUrl(listed)] : [])
+                : [
+                    streamUrl(`${folder}/stem${i}.mp3`, this.streamFormat),
+                    streamUrl(`${folder}/stem${i}.wav`, this.streamFormat),
+                ];
+            loads.push(this._loadStem(paths, i));
         }
+        this.stems = await Promise.all(loads);
+        this.stemVolumes = this.stems.map(() => 0);
 
         console.log(`Loaded ${this.stems.filter(s => s !== null).length} stems from ${folder}`);
 
         // Start all available stems at zero gain to keep them in sync
         this._startAllStems();
         this._applyStemGains();
-    }
 
-    async _loadStem(folder, stemNumber) {
-        const paths = [
-            `/music/${folder}/stem${stemNumber}.mp3`,
-            `/music/${folder}/stem${stemNumber}.wav`,
-        ];
+        // Not awaited: the next track downloads while this one plays
+        this._prefetchNext();
+    }
 
+    async _loadStem(paths, stemNumber) {
         for (const path of paths) {
             const player = await this._createPlayer(path, { loop: true, timeoutMs: 10000 });
             if (player) {
@@ -94,18 +173,21 @@ export class AudioEngine {
     }
 
     async _loadEffects() {
-        this.effects = [];
+        const loads = [];
         for (let i = 1; i <= CONFIG.EFFECTS_PER_HAND; i++) {
-            const effect = await this._loadEffect(i);
-            this.effects.push(effect);
+            loads.push(this._loadEffect(i));
         }
+        this.effects = await Promise.all(loads);
         console.log(`Loaded ${this.effects.filter(e => e !== null).length} effects`);
     }
 
     async _loadEffect(effectNumber) {
-        const paths = [
-            `/music/effects/effect${effectNumber}.mp3`,
-            `/music/effects/effect${effectNumber}.wav`,
+        const listed = this.manifest
+            ? this.manifest.effects.find((e) => e.name === `effect${effectNumber}`)
+            : null;
+        const paths = listed ? [this._mediaUrl(listed)] : [
+            streamUrl(`effects/effect${effectNumber}.mp3`, this.streamFormat),
+            streamUrl(`effects/effect${effectNumber}.wav`, this.streamFormat),
         ];
 
         for (const path of paths) {
@@ -154,6 +236,7 @@ export class AudioEngine {
     _startAllStems() {
         if (this.isStarted) return;
         const startTime = Tone.now() + 0.05;
+        this.startedAt = startTime;
         for (const stem of this.stems) {
             if (!stem) continue;
             try { stem.player.start(startTime); } catch (e) { console.error('Start error:', e); }
@@ -249,7 +332,7 @@ export class AudioEngine {
 
             // Load next track
             let nextIndex = this.currentTrackIndex + 1;
-            if (nextIndex >= CONFIG.TRACK_FOLDERS.length) nextIndex = 0;
+            if (nextIndex >= this.trackFolders.length) nextIndex = 0;
 
             await this._loadTrack(nextIndex);
 
@@ -281,9 +364,29 @@ export class AudioEngine {
             volume: this.selectedStem >= 0 ? this.stemVolumes[this.selectedStem] || 0 : 0,
             stemCount: this.stems.filter(s => s !== null).length,
             availableStems: this.stems.map(s => s !== null),
+            peaksUrls: this._peaksUrls(),
+            progress: this._loopProgress(),
         };
     }
 
+    // Waveform pyramids of the current track's loaded stems (manifest only)
+    _peaksUrls() {
+        const entry = this._manifestTrack(this.currentTrackFolder);
+        if (!entry || this.isTrackLoading) return [];
+        return entry.stems.slice(0, CONFIG.STEMS_PER_TRACK)
+            .filter((s, i) => this.stems[i] && s.peaks)
+            .map((s) => s.peaks);
+    }
+
+    // Position within the loop, 0..1 (stems start together and loop)
+    _loopProgress() {
+        const stem = this.stems.find((s) => s !== null);
+        const duration = stem ? stem.player.buffer.duration : 0;
+        if (!this.isStarted || !duration) return 0;
+        const elapsed = Math.max(0, Tone.now() - this.startedAt);
+        return (elapsed % duration) / duration;
+    }
+
     isReady() {
         return this.isInitialized;
     }
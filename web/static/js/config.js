@@ -11,6 +11,10 @@ export const CONFIG = {
     TRACK_FOLDERS: ['track1', 'track2'],
     STEMS_PER_TRACK: 3,
 
+    // Stem delivery: server-side transcode (first format the browser plays)
+    STREAM_FORMATS: ['opus', 'aac', 'mp3'],
+    STREAM_BITRATE: 96,  // kbps
+
     // Gesture thresholds
     PINCH_THRESHOLD: 0.08,
     FIST_THRESHOLD: 0.12,
@@ -7,6 +7,7 @@ import { HandTracker } from './handTracker.js';
 import { AudioEngine } from './audioEngine.js';
 import { DJController } from './djController.js';
 import { UIRenderer } from './uiRenderer.js';
+import { StateChannel } from './stateChannel.js';
 
 class DJBoothApp {
     constructor() {
@@ -23,6 +24,7 @@ class DJBoothApp {
         this.audioEngine = new AudioEngine();
         this.djController = new DJController(this.audioEngine);
         this.uiRenderer = new UIRenderer(this.canvas, this.video);
+        this.stateChannel = new StateChannel();
 
         this.isRunning = false;
     }
@@ -66,6 +68,7 @@ class DJBoothApp {
             this._hideOverlays();
 
             this.isRunning = true;
+            this.stateChannel.connect();
             this._loop();
 
             console.log('DJ Booth started!');
@@ -87,6 +90,7 @@ class DJBoothApp {
             const audioState = this.audioEngine.getState();
 
             this.uiRenderer.render(hands, gestureState, audioState);
+            this.stateChannel.update(gestureState, audioState);
 
             // Debug: log hands detected every second
             if (!this._lastLog || timestamp - this._lastLog > 1000) {
@@ -0,0 +1,81 @@
+/**
+ * Publishes the browser deck/gesture state to the server's state channel
+ * (/ws/state?type=deck, see web/state_channel.py) for the agent and
+ * projector.
+ *
+ * Called every frame; only fields that changed since the last send go out.
+ * While the socket is backed up, changes accumulate into one pending delta
+ * instead of queueing messages. Effect triggers are sent as events and
+ * counted by the server.
+ */
+
+const MAX_BUFFERED = 16 * 1024;  // Bytes; above this, hold changes for the next frame
+const RECONNECT_MIN_MS = 500;
+const RECONNECT_MAX_MS = 10000;
+
+export class StateChannel {
+    constructor(url) {
+        this.url = url || `${location.protocol === 'https:' ? 'wss' : 'ws'}://${location.host}/ws/state?type=deck`;
+        this.ws = null;
+        this.sent = {};  // Last value the server has, per field
+        this.pending = {};  // Changes not yet sent
+        this.pendingFx = [];
+        this.retryMs = RECONNECT_MIN_MS;
+    }
+
+    connect() {
+        const ws = new WebSocket(this.url);
+        ws.onopen = () => {
+            this.retryMs = RECONNECT_MIN_MS;
+            this.sent = {};  // A fresh server connection gets the full state
+        };
+        ws.onclose = () => {
+            this.ws = null;
+            setTimeout(() => this.connect(), this.retryMs);
+            this.retryMs = Math.min(this.retryMs * 2, RECONNECT_MAX_MS);
+        };
+        ws.onerror = () => {};  // onclose follows
+        this.ws = ws;
+    }
+
+    update(gestureState, audioState) {
+        if (!audioState) return;
+        const fields = {
+            track: audioState.trackIndex,
+            stem: audioState.selectedStem,
+            playing: audioState.isPlaying,
+            loading: audioState.isTrackLoading,
+            volume: Math.round((audioState.volume || 0) * 255) / 255,
+            volumes: (audioState.stemVolumes || []).map((v) => Math.round(v * 255) / 255),
+        };
+        if (gestureState) {
+            fields.hand = !!gestureState.handDetected;
+            fields.fingers = gestureState.fingerCount || 0;
+            fields.pinching = !!gestureState.isPinching;
+            // effectTrigger is the pad number on the frame it fires, else 0;
+            // triggers while disconnected are stale by reconnect and dropped
+            if (gestureState.effectTrigger > 0 && this.ws && this.ws.readyState === WebSocket.OPEN) {
+                this.pendingFx.push(gestureState.effectTrigger);
+            }
+        }
+
+        for (const [key, value] of Object.entries(fields)) {
+            if (JSON.stringify(value) !== JSON.stringify(this.sent[key])) {
+                this.pending[key] = value;
+            }
+        }
+        this._flush();
+    }
+
+    _flush() {
+        const ws = this.ws;
+        if (!ws || ws.readyState !== WebSocket.OPEN || ws.bufferedAmount > MAX_BUFFERED) return;
+        const delta = { ...this.pending };
+        if (this.pendingFx.length) delta.fx = this.pendingFx;
+        if (!Object.keys(delta).length) return;
+        ws.send(JSON.stringify(delta));
+        Object.assign(this.sent, this.pending);
+        this.pending = {};
+        this.pendingFx = [];
+    }
+}
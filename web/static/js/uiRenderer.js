@@ -3,6 +3,7 @@
  */
 
 import { CONFIG } from './config.js';
+import { WaveformView } from './waveform.js';
 
 export class UIRenderer {
     constructor(canvas, video) {
@@ -11,6 +12,8 @@ export class UIRenderer {
         this.video = video;
         this.statusMessage = 'Show your hand';
         this.meterLevels = [0, 0, 0];
+        const waveformCanvas = document.getElementById('waveform');
+        this.waveform = waveformCanvas ? new WaveformView(waveformCanvas) : null;
 
         // DOM elements
         this.elements = {
@@ -99,6 +102,12 @@ export class UIRenderer {
             ctx.fillText('Show your hand', canvas.width / 2, 50);
         }
 
+        // Track overview (loads once per track, then a blit per frame)
+        if (this.waveform && audioState) {
+            this.waveform.setTrack(audioState.peaksUrls || []);
+            this.waveform.draw(audioState.progress || 0);
+        }
+
         // Update DJ booth display
         this.statusMessage = this._updateDisplay(gestureState, audioState);
         const compactStatus = this.statusMessage.startsWith('Selected stem');
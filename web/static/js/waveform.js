@@ -0,0 +1,120 @@
+/**
+ * Track overview waveform drawn from server peak pyramids (see web/peaks.py).
+ *
+ * A pyramid holds min/max/RMS bins at power-of-two zoom levels. The view
+ * Range-fetches the header, then only the level whose bins are just finer
+ * than a pixel, so a track costs a few KB and no audio decoding. The
+ * envelope is rendered once per track; each frame only blits it and draws
+ * the playhead.
+ */
+
+const HEADER_PROBE = 512;  // Bytes covering the header and level table
+const HEADER_SIZE = 32;
+const LEVEL_ENTRY = 8;
+const BIN_SIZE = 3;  // min i8, max i8, rms u8
+
+async function fetchRange(url, start, end) {
+    const resp = await fetch(url, { headers: { Range: `bytes=${start}-${end}` } });
+    if (!resp.ok) throw new Error(`HTTP ${resp.status} for ${url}`);
+    // A 200 carries the whole file: slice the range out of it
+    const buf = await resp.arrayBuffer();
+    return resp.status === 206 ? buf : buf.slice(start, end + 1);
+}
+
+// The level of one pyramid with at most `columns` bins per track (or level 0)
+async function fetchLevel(url, columns) {
+    const head = new DataView(await fetchRange(url, 0, HEADER_PROBE - 1));
+    const magic = String.fromCharCode(head.getUint8(0), head.getUint8(1), head.getUint8(2), head.getUint8(3));
+    if (magic !== 'PEAK') throw new Error(`${url}: not a peaks file`);
+    const frames = Number(head.getBigUint64(12, true));
+    const base = head.getUint32(20, true);
+    const levels = head.getUint32(24, true);
+    const peak = head.getFloat32(28, true);
+
+    const spp = Math.max(frames / columns, 1);
+    const level = Math.min(Math.max(Math.floor(Math.log2(Math.max(spp / base, 1))), 0), levels - 1);
+    const offset = head.getUint32(HEADER_SIZE + level * LEVEL_ENTRY, true);
+    const bins = head.getUint32(HEADER_SIZE + level * LEVEL_ENTRY + 4, true);
+    const data = new Int8Array(await fetchRange(url, offset, offset + bins * BIN_SIZE - 1));
+    return { data, bins, binFrames: base * 2 ** level, frames, peak };
+}
+
+export class WaveformView {
+    constructor(canvas) {
+        this.canvas = canvas;
+        this.ctx = canvas.getContext('2d');
+        this.image = document.createElement('canvas');  // Rendered envelope of the current track
+        this.key = '';
+        this.ready = false;
+    }
+
+    // Load the pyramids of a track's stems (no-op if unchanged)
+    async setTrack(urls) {
+        const key = `${urls.join('|')}@${this.canvas.clientWidth}`;
+        if (key === this.key) return;
+        this.key = key;
+        this.ready = false;
+        if (!urls.length) return;
+
+        const dpr = window.devicePixelRatio || 1;
+        const width = Math.max(1, Math.round(this.canvas.clientWidth * dpr));
+        const height = Math.max(1, Math.round(this.canvas.clientHeight * dpr));
+        try {
+            const levels = (await Promise.all(urls.map((url) => fetchLevel(url, width).catch(() => null))))
+                .filter((l) => l !== null);
+            if (key !== this.key || !levels.length) return;  // Superseded while loading
+            this._renderEnvelope(levels, width, height);
+            this.canvas.width = width;
+            this.canvas.height = height;
+            this.ready = true;
+        } catch (e) {
+            console.warn('Waveform unavailable:', e);
+        }
+    }
+
+    // Outer min/max envelope of all stems, one pass over `width` columns
+    _renderEnvelope(levels, width, height) {
+        const frames = Math.max(...levels.map((l) => l.frames));
+        const spp = frames / width;
+        const lo = new Float32Array(width);
+        const hi = new Float32Array(width);
+        for (const { data, bins, binFrames, peak } of levels) {
+            const scale = peak / 127;
+            for (let x = 0; x < width; x++) {
+                const first = Math.floor((x * spp) / binFrames);
+                const last = Math.min(Math.ceil(((x + 1) * spp) / binFrames), bins);
+                for (let b = first; b < last; b++) {
+                    lo[x] = Math.min(lo[x], data[b * BIN_SIZE] * scale);
+                    hi[x] = Math.max(hi[x], data[b * BIN_SIZE + 1] * scale);
+                }
+            }
+        }
+
+        let full = 1e-6;
+        for (let x = 0; x < width; x++) full = Math.max(full, -lo[x], hi[x]);
+        const mid = height / 2;
+        const gain = (mid - 1) / full;
+
+        this.image.width = width;
+        this.image.height = height;
+        const ctx = this.image.getContext('2d');
+        ctx.fillStyle = 'rgba(97, 247, 255, 0.75)';
+        for (let x = 0; x < width; x++) {
+            const top = mid - hi[x] * gain;
+            ctx.fillRect(x, top, 1, Math.max(1, (hi[x] - lo[x]) * gain));
+        }
+    }
+
+    // Blit the envelope and the playhead (progress 0..1)
+    draw(progress) {
+        const { ctx, canvas } = this;
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        if (!this.ready) return;
+        ctx.drawImage(this.image, 0, 0);
+        const x = Math.round(progress * canvas.width);
+        ctx.fillStyle = 'rgba(0, 0, 0, 0.45)';
+        ctx.fillRect(0, 0, x, canvas.height);  // Played part dimmed
+        ctx.fillStyle = '#ff6b35';
+        ctx.fillRect(x, 0, 2, canvas.height);
+    }
+}
@@ -0,0 +1,317 @@
+"""
+Crowd vote ingestion and sliding-window aggregation.
+
+Votes arrive one at a time or in batches (POST /api/vote). Each passes a
+per-user token bucket and is counted into its session's window: a ring of
+BUCKET_S time buckets holding per-type counts, with running totals updated
+as buckets enter and leave the window. Ingest is O(1) per vote, and the
+aggregation the agent polls (counts, voteRate, avgRate, isHypeSpike,
+dominantVote, energyBias: the fields of the Next.js aggregator) is computed
+from the totals in O(vote types), however many votes are in the window.
+
+Each user may vote once per second, as in the Next.js route (a second vote
+within the second is a 429). Rate limiter buckets and session windows are
+kept in least-recently-used order; one idle long enough to be
+indistinguishable from a new one (a refilled bucket, a window whose votes
+and rate history have all expired) is evicted, so memory is O(1) per active
+user and session.
+
+Instead of one broadcast per vote, each session with new votes is sent to
+the WS server's /broadcast once per BROADCAST_INTERVAL_S as a single
+'vote_update' message. With several server workers, workers relay their
+new counts to each other (see relay.py), so every worker reports the
+whole crowd; rate limits stay per worker.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+import urllib.request
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from relay import Relay
+
+VOTE_TYPES = ('energy_up', 'energy_down', 'genre_switch', 'drop_request',
+              'viz_style', 'speed_up', 'speed_down')
+TYPE_INDEX = {name: i for i, name in enumerate(VOTE_TYPES)}
+UP, DOWN = TYPE_INDEX['energy_up'], TYPE_INDEX['energy_down']
+
+WINDOW_S = 30  # Votes counted in the aggregation
+BUCKET_S = 1.0  # Window resolution
+RATE_HISTORY = 20  # Seconds of voteRate samples averaged into avgRate
+HYPE_FACTOR = 2.0  # isHypeSpike: voteRate above this multiple of avgRate
+RATE_PER_USER = 1.0  # Votes per second each user may sustain
+BURST_PER_USER = 1.0  # Votes a user may cast back to back (1 = strictly RATE_PER_USER)
+RECENT_VOTES = 20
+MAX_BATCH = 5000  # Votes per request
+BROADCAST_INTERVAL_S = 0.25
+SESSION_IDLE_S = WINDOW_S + RATE_HISTORY  # No votes for this long: the window reads as new
+DEFAULT_SESSION = '__global__'
+WS_SERVER_HTTP_URL = os.getenv('WS_SERVER_HTTP_URL', 'http://localhost:8080')
+
+
+class TokenBuckets:
+    """Per-user token buckets with idle eviction (least recently used first)."""
+
+    def __init__(self, rate: float = RATE_PER_USER, burst: float = BURST_PER_USER):
+        self.rate = rate
+        self.burst = burst
+        self.idle_s = burst / rate  # A bucket idle this long is full again
+        self._buckets: 'OrderedDict[str, List[float]]' = OrderedDict()  # user -> [tokens, t]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def allow(self, user: str, now: float) -> bool:
+        """Take a token for `user` if one is available."""
+        buckets = self._buckets
+        bucket = buckets.get(user)
+        if bucket is None:
+            bucket = buckets[user] = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            buckets.move_to_end(user)
+        # Evict a couple of refilled buckets per call: amortized O(1)
+        for _ in range(2):
+            oldest = next(iter(buckets.values()))
+            if now - oldest[1] < self.idle_s:
+                break
+            buckets.popitem(last=False)
+        if bucket[0] < 1.0:
+            return False
+        bucket[0] -= 1.0
+        return True
+
+
+class VoteWindow:
+    """One session's sliding window of per-type counts in a ring of time buckets."""
+
+    def __init__(self, now: float):
+        self.size = int(math.ceil(WINDOW_S / BUCKET_S))
+        self.buckets = [[0] * len(VOTE_TYPES) for _ in range(self.size)]
+        self.totals = [0] * len(VOTE_TYPES)
+        self.total = 0
+        self.tick = int(now / BUCKET_S)  # Absolute index of the newest bucket
+        self.rates: deque = deque(maxlen=RATE_HISTORY)  # Only samples taken, as in Next.js
+        self.recent: deque = deque(maxlen=RECENT_VOTES)
+        self.unsent: List[dict] = []  # Votes accepted here since the last broadcast
+        self.last_vote = now  # Accepted here or relayed
+        self.dirty = False  # New votes accepted here; relayed votes are broadcast by their worker
+
+    def advance(self, now: float):
+        """Expire buckets that left the window (O(types) per elapsed bucket)."""
+        tick = int(now / BUCKET_S)
+        steps = tick - self.tick
+        if steps <= 0:
+            return
+        for step in range(min(steps, self.size)):
+            # avgRate samples the rate at each bucket boundary
+            self.rates.append(self.total / WINDOW_S)
+            bucket = self.buckets[(self.tick + step + 1) % self.size]
+            for i, count in enumerate(bucket):
+                if count:
+                    self.totals[i] -= count
+                    self.total -= count
+                    bucket[i] = 0
+        if steps > self.size:
+            # Idle longer than the window: everything expired, rates decay to zero
+            self.rates.extend([0.0] * min(steps - self.size, RATE_HISTORY))
+        self.tick = tick
+
+    def add(self, index: int, count: int = 1):
+        self.buckets[self.tick % self.size][index] += count
+        self.totals[index] += count
+        self.total += count
+
+    def aggregation(self, now: float) -> dict:
+        self.advance(now)
+        total = self.total
+        vote_rate = total / WINDOW_S
+        # Like vote-aggregator.ts, the average includes the current rate, so a
+        # new session's first votes don't read as a spike
+        avg_rate = (sum(self.rates) + vote_rate) / (len(self.rates) + 1)
+        best = max(range(len(VOTE_TYPES)), key=self.totals.__getitem__)
+        return {
+            'counts': {name: n for name, n in zip(VOTE_TYPES, self.totals) if n},
+            'total': total,
+            'voteRate': vote_rate,
+            'avgRate': avg_rate,
+            'isHypeSpike': vote_rate > avg_rate * HYPE_FACTOR and total > 2,
+            'dominantVote': [VOTE_TYPES[best], self.totals[best]] if total else None,
+            'energyBias': (self.totals[UP] - self.totals[DOWN]) / max(total, 1),
+            'timestamp': int(time.time() * 1000),
+        }
+
+
+class VoteService:
+    """Rate-limited vote ingest, per-session windows and coalesced broadcasts."""
+
+    def __init__(self, broadcast_url: Optional[str] = WS_SERVER_HTTP_URL,
+                 relay_dir: Optional[Path] = None):
+        """
+        Args:
+            broadcast_url: WS server base URL for /broadcast (None = don't broadcast)
+            relay_dir: Directory for the cross-worker relay sockets (None = single process)
+        """
+        self.broadcast_url = broadcast_url
+        self.limiter = TokenBuckets()
+        self.sessions: 'OrderedDict[str, VoteWindow]' = OrderedDict()  # Least recently voted first
+        self.relay = Relay(relay_dir, self._merge_relayed) if relay_dir is not None else None
+        self._relay_counts: Dict[str, List[int]] = {}  # session -> per-type counts to relay
+        self._next_id = 0
+        self._id_prefix = f"{os.getpid():x}{int(time.time()):x}"
+        self.accepted = 0
+        self.limited = 0
+        self.invalid = 0
+        self.broadcasts = 0
+        self._broadcast_failing = False
+
+    def window(self, session: Optional[str], now: float) -> VoteWindow:
+        """The session's window for new votes (created if needed)."""
+        session = session or DEFAULT_SESSION
+        sessions = self.sessions
+        window = sessions.get(session)
+        if window is None:
+            window = sessions[session] = VoteWindow(now)
+        else:
+            sessions.move_to_end(session)
+        window.last_vote = now
+        # Evict a couple of idle windows per call: amortized O(1)
+        for _ in range(2):
+            oldest = next(iter(sessions.values()))
+            if now - oldest.last_vote < SESSION_IDLE_S:
+                break
+            sessions.popitem(last=False)
+        return window
+
+    def ingest(self, votes: List[dict], now: Optional[float] = None) -> Tuple[List[Optional[dict]], int, int]:
+        """
+        Count a batch of votes ({userId, voteType, voteValue?, sessionCode?}).
+
+        Returns:
+            (accepted vote records, None where rejected), rate-limited count, invalid count
+        """
+        now = time.monotonic() if now is None else now
+        stamp = int(time.time() * 1000)
+        allow = self.limiter.allow
+        results: List[Optional[dict]] = []
+        limited = invalid = 0
+        window, window_session = None, object()
+        for vote in votes:
+            try:
+                user, index = vote['userId'], TYPE_INDEX[vote['voteType']]
+            except (KeyError, TypeError):
+                invalid += 1
+                results.append(None)
+                continue
+            session = vote.get('sessionCode') or DEFAULT_SESSION
+            if not user or not isinstance(user, str) or not isinstance(session, str):
+                invalid += 1
+                results.append(None)
+                continue
+            if not allow(user, now):
+                limited += 1
+                results.append(None)
+                continue
+            if session != window_session:
+                window, window_session = self.window(session, now), session
+                window.advance(now)
+            window.add(index)
+            window.dirty = True
+            self._next_id += 1
+            record = {'id': f"{self._id_prefix}-{self._next_id}", 'userId': user,
+                      'voteType': VOTE_TYPES[index], 'timestamp': stamp}
+            if vote.get('voteValue'):
+                record['voteValue'] = str(vote['voteValue'])
+            window.recent.append(record)
+            window.unsent.append(record)
+            if self.relay is not None:
+                counts = self._relay_counts.get(session)
+                if counts is None:
+                    counts = self._relay_counts[session] = [0] * len(VOTE_TYPES)
+                counts[index] += 1
+            results.append(record)
+        accepted = len(results) - limited - invalid
+        self.accepted += accepted
+        self.limited += limited
+        self.invalid += invalid
+        return results, limited, invalid
+
+    def aggregation(self, session: Optional[str] = None) -> dict:
+        now = time.monotonic()
+        window = self.sessions.get(session or DEFAULT_SESSION) or VoteWindow(now)  # Reads don't create sessions
+        return window.aggregation(now)
+
+    def recent_votes(self, session: Optional[str] = None) -> List[dict]:
+        window = self.sessions.get(session or DEFAULT_SESSION)
+        return list(window.recent) if window else []
+
+    def stats(self) -> dict:
+        return {'accepted': self.accepted, 'rate_limited': self.limited, 'invalid': self.invalid,
+                'active_users': len(self.limiter), 'sessions': len(self.sessions),
+                'broadcasts': self.broadcasts}
+
+    def _merge_relayed(self, message: dict):
+        """Votes another worker accepted: counted into the current bucket, not re-broadcast."""
+        now = time.monotonic()
+        for session, counts in message.get('counts', {}).items():
+            window = self.window(session, now)
+            window.advance(now)
+            for index, count in enumerate(counts[:len(VOTE_TYPES)]):
+                if isinstance(count, int) and count > 0:
+                    window.add(index, count)
+        for record in message.get('votes', []):
+            if isinstance(record, dict):
+                self.window(record.pop('session', None), now).recent.append(record)
+
+    async def run(self):
+        """Relay and broadcast once per interval (cancel to stop)."""
+        if self.relay is not None:
+            self.relay.open()
+        try:
+            while True:
+                await asyncio.sleep(BROADCAST_INTERVAL_S)
+                now = time.monotonic()
+                if self._relay_counts:
+                    # Peers get the counts plus the recent votes for their recentVotes lists
+                    votes = [dict(r, session=s) for s, w in self.sessions.items()
+                             for r in w.unsent[-RECENT_VOTES:]]
+                    self.relay.send({'counts': self._relay_counts, 'votes': votes})
+                    self._relay_counts = {}
+                for session, window in list(self.sessions.items()):
+                    if not window.dirty:
+                        continue
+                    window.dirty = False
+                    message = {
+                        'source': 'votes',
+                        'type': 'vote_update',
+                        'data': {'session': session, 'aggregation': window.aggregation(now),
+                                 'votes': window.unsent[-RECENT_VOTES:]},
+                        'timestamp': int(time.time() * 1000),
+                    }
+                    window.unsent = []
+                    if self.broadcast_url:
+                        await self._broadcast(message)
+        finally:
+            if self.relay is not None:
+                self.relay.close()
+
+    async def _broadcast(self, message: dict):
+        request = urllib.request.Request(
+            f"{self.broadcast_url}/broadcast", data=json.dumps(message).encode(),
+            headers={'Content-Type': 'application/json'}, method='POST')
+        try:
+            await asyncio.to_thread(urllib.request.urlopen, request, timeout=2)
+        except OSError as e:
+            if not self._broadcast_failing:
+                print(f"[Votes] Broadcast to {self.broadcast_url} failed: {e}")
+            self._broadcast_failing = True
+            return
+        if self._broadcast_failing:
+            print("[Votes] Broadcasts resumed")
+        self._broadcast_failing = False
+        self.broadcasts += 1